@@ -1,13 +1,21 @@
-import requests
-from bs4 import BeautifulSoup
-import google.generativeai as genai
-import os
-import time
+import logging
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from paralelo import IA_MAX_CONCORRENCIA, executar_em_paralelo
+from roteamento_ia import roteador_ia
+from lotes_ia import PROMPT_LOTE, agrupar_em_lotes, executar_lote
+from parser_html import criar_soup, clonar_soup
+from regras import MotorRegras
+from imagens import agrupar_semelhantes, preparar_imagem
+from midia import MIDIA_MAX_BYTES_IMAGEM, buscador_midia
+from videos import gerenciador_videos
+from analise_video import PROMPT_ANALISE_VIDEO, ler_analise
+from pacotes_css import compilar_css
+from provedores_ia import provedor_ia
 
 load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+
+logger = logging.getLogger(__name__)
 
 #Funções testes (versão beta)
 
@@ -20,13 +28,13 @@ def aplicar_correcoes_base(soup):
     Aplica correções universais.
     (Corrige o 'outline' de foco).
     """
-    print("Aplicando correções de base...")
+    logger.info("Aplicando correções de base...")
     
     # corrige o 'outline: none' que quebra a navegação por teclado
     style_tag = soup.find('style')
     if style_tag and 'outline: none' in style_tag.string:
         style_tag.decompose()
-        print("Corrigido (Base): CSS do Outline removido.")
+        logger.info("Corrigido (Base): CSS do Outline removido.")
         
     return soup
 
@@ -37,44 +45,47 @@ def aplicar_correcoes_base(soup):
 
 def aplicar_perfil_cego(soup):
     """Corrige problemas de navegação e alt text para leitores de tela."""
-    print("Aplicando Perfil Cego...")
+    logger.info("Aplicando Perfil Cego...")
     
     soup = aplicar_correcoes_base(soup)
 
-    # corrigir imagens sem 'alt'
-    api_call_count = 0
-    for img in soup.find_all('img'):
-        if not img.get('alt'): # Se não tiver 'alt'
-            
-            if api_call_count > 0:
-                print(f"Aguardando 31 segundos para evitar limite de taxa (Erro 429)...")
-                time.sleep(31)
+    # Todas as correções entram no motor de regras: uma única varredura do documento
+    motor = MotorRegras()
+    imagens_sem_alt = []
 
-            img_url = img.get('src')
-            alt_text = get_alt_text_from_ai(img_url) 
-            img['alt'] = alt_text
-            api_call_count += 1
-            print(f"Corrigido: alt='{alt_text}'")
+    # corrigir imagens sem 'alt' (coletadas aqui, geradas em paralelo depois)
+    motor.registrar("alt_text", ['img'], imagens_sem_alt.append,
+                    condicao=lambda img: img.get('src') and not img.get('alt'))
 
     # corrigir BOTÃO-DIV
-    botao_div = soup.find('div', class_='btn-primary')
-    if botao_div:
-        botao_div['role'] = 'button'
-        botao_div['tabindex'] = '0'
-        print("Corrigido: Botão-Div")
+    motor.registrar("botao_div", ['div'], corrigir_botao_div,
+                    condicao=lambda div: 'btn-primary' in div.get('class', []), limite=1)
 
     # corrigir formulário sem label
-    for input_tag in soup.find_all(['input', 'textarea']):
-        if not input_tag.has_attr('aria-label') and input_tag.get('placeholder'):
-            placeholder = input_tag.get('placeholder')
-            input_tag['aria-label'] = placeholder
-            print(f"Corrigido: aria-label='{placeholder}'")
+    motor.registrar("aria_label", ['input', 'textarea'], corrigir_aria_label,
+                    condicao=lambda campo: not campo.has_attr('aria-label') and campo.get('placeholder'))
+
+    motor.aplicar(soup)
+
+    # (todas de uma vez, em lotes; o limite de taxa (Erro 429) fica a cargo do token
+    #  bucket configurado por IA_REQUISICOES_POR_MINUTO, em vez de esperar 31s entre imagens)
+    gerar_alt_texts_em_lote(imagens_sem_alt)
     
     return soup
 
+def corrigir_botao_div(botao_div):
+    botao_div['role'] = 'button'
+    botao_div['tabindex'] = '0'
+    logger.info("Corrigido: Botão-Div")
+
+def corrigir_aria_label(input_tag):
+    placeholder = input_tag.get('placeholder')
+    input_tag['aria-label'] = placeholder
+    logger.info("Corrigido: aria-label='%s'", placeholder)
+
 def aplicar_perfil_dislexia(soup):
     """Muda fonte e simplifica texto para dificuldade cognitiva."""
-    print("Aplicando Perfil Dislexia...")
+    logger.info("Aplicando Perfil Dislexia...")
     
     soup = aplicar_correcoes_base(soup)
 
@@ -82,7 +93,7 @@ def aplicar_perfil_dislexia(soup):
     head = soup.find('head')
     if head:
         new_style = soup.new_tag('style')
-        new_style.string = """
+        new_style.string = compilar_css("""
         html { 
             font-size: 140% !important; 
         }
@@ -90,7 +101,7 @@ def aplicar_perfil_dislexia(soup):
             font-family: 'Verdana', sans-serif !important; 
             line-height: 1.6 !important; 
         }
-        """
+        """)
         head.append(new_style)
     
     # simplificar texto
@@ -98,14 +109,15 @@ def aplicar_perfil_dislexia(soup):
     if paragrafo and paragrafo.string:
         texto_original = paragrafo.string
         texto_simplificado = get_simplified_text_from_ai(texto_original)
-        paragrafo.string = texto_simplificado
-        print("Corrigido: Texto simplificado")
+        if texto_simplificado is not None:
+            paragrafo.string = texto_simplificado
+            logger.info("Corrigido: Texto simplificado")
         
     return soup
 
 def aplicar_perfil_alto_contraste(soup):
     """Aplica um CSS de Alto Contraste (Modo Escuro) melhorado e corrigido."""
-    print("Aplicando Perfil Alto Contraste (Versão 2.0)...")
+    logger.info("Aplicando Perfil Alto Contraste (Versão 2.0)...")
     
     soup = aplicar_correcoes_base(soup)
     
@@ -114,7 +126,7 @@ def aplicar_perfil_alto_contraste(soup):
         new_style = soup.new_tag('style')
         
         # --- NOVO CSS DE ALTO CONTRASTE ---
-        new_style.string = """
+        new_style.string = compilar_css("""
         /* Fundo principal e cor de texto base (Branco no Preto) */
         body, .container, .card, .modal-content, .modal-body { 
             background-color: #000 !important; 
@@ -161,15 +173,15 @@ def aplicar_perfil_alto_contraste(soup):
         .border-bottom, .border-top {
             border-color: #444 !important;
         }
-        """
+        """)
         head.append(new_style)
-        print("Corrigido (Alto Contraste): CSS v2.0 injetado.")
+        logger.info("Corrigido (Alto Contraste): CSS v2.0 injetado.")
         
     return soup
 
 def aplicar_perfil_surdo(soup):
     """Procura por tags <video> e injeta uma transcrição de texto abaixo delas."""
-    print("Aplicando Perfil Surdo (Transcrição de Áudio)...")
+    logger.info("Aplicando Perfil Surdo (Transcrição de Áudio)...")
 
     soup = aplicar_correcoes_base(soup)
     
@@ -179,6 +191,8 @@ def aplicar_perfil_surdo(soup):
             video_url = source_tag.get('src')
             
             transcription_text = get_transcription_from_ai(video_url)
+            if transcription_text is None:
+                continue
             
             transcription_div = soup.new_tag('div')
             transcription_div['class'] = 'alert alert-info mt-2' 
@@ -197,13 +211,13 @@ def aplicar_perfil_surdo(soup):
             video_parent_div = video_tag.parent
             if video_parent_div:
                 video_parent_div.insert_after(transcription_div)
-                print(f"Corrigido: Transcrição adicionada para {video_url}")
+                logger.info("Corrigido: Transcrição adicionada para %s", video_url)
     
     return soup
 
 def aplicar_perfil_narracao_cegos(soup):
     """Procura por <video> e injeta uma DESCRIÇÃO VISUAL (audiodescrição)."""
-    print("Aplicando Perfil Narração para Cegos (Audio Description)...")
+    logger.info("Aplicando Perfil Narração para Cegos (Audio Description)...")
     
     soup = aplicar_correcoes_base(soup)
     
@@ -213,6 +227,8 @@ def aplicar_perfil_narracao_cegos(soup):
             video_url = source_tag.get('src')
             
             description_text = get_visual_description_from_ai(video_url)
+            if description_text is None:
+                continue
             
             desc_div = soup.new_tag('div')
             desc_div['class'] = 'alert alert-warning mt-2' 
@@ -231,7 +247,7 @@ def aplicar_perfil_narracao_cegos(soup):
             video_parent_div = video_tag.parent
             if video_parent_div:
                 video_parent_div.insert_after(desc_div)
-                print(f"Corrigido: Narração adicionada para {video_url}")
+                logger.info("Corrigido: Narração adicionada para %s", video_url)
     
     return soup
 
@@ -239,7 +255,7 @@ def aplicar_perfil_visao_limitada(soup, tipo_necessidade):
     """
     Aplica filtros de CSS baseados na necessidade do usuário (Tamanho ou Daltonismo).
     """
-    print(f"Aplicando Perfil Visão Limitada: {tipo_necessidade}")
+    logger.info("Aplicando Perfil Visão Limitada: %s", tipo_necessidade)
     
     soup = aplicar_correcoes_base(soup)
     
@@ -257,7 +273,7 @@ def aplicar_perfil_visao_limitada(soup, tipo_necessidade):
             font-size: 140% !important; 
         }
         """
-        print("Corrigido (Visão): Texto aumentado (proporcionalmente).")
+        logger.info("Corrigido (Visão): Texto aumentado (proporcionalmente).")
         
     elif tipo_necessidade == "protanopia":
         css_string = """
@@ -266,7 +282,7 @@ def aplicar_perfil_visao_limitada(soup, tipo_necessidade):
             border-color: #FFA500 !important;
         }
         """
-        print("Corrigido (Visão): Filtro Protanopia (Verde -> Laranja) aplicado.")
+        logger.info("Corrigido (Visão): Filtro Protanopia (Verde -> Laranja) aplicado.")
 
     elif tipo_necessidade == "deuteranopia":
         css_string = """
@@ -276,9 +292,9 @@ def aplicar_perfil_visao_limitada(soup, tipo_necessidade):
             color: #000 !important; /* Texto preto no botão amarelo */
         }
         """
-        print("Corrigido (Visão): Filtro Deuteranopia (Verde -> Amarelo) aplicado.")
+        logger.info("Corrigido (Visão): Filtro Deuteranopia (Verde -> Amarelo) aplicado.")
 
-    new_style.string = css_string
+    new_style.string = compilar_css(css_string)
     head.append(new_style)
     return soup
 
@@ -287,119 +303,168 @@ def aplicar_perfil_visao_limitada(soup, tipo_necessidade):
 ### SEÇÃO 3: FUNÇÕES DE IA
 ####################################################
 
-def get_alt_text_from_ai(image_url):
-    """Usa o Gemini 2.5 Pro para descrever uma imagem a partir de uma URL."""
-    try:
-        response = requests.get(image_url)
-        response.raise_for_status() 
-        image_part = {
-            "mime_type": response.headers['Content-Type'],
-            "data": response.content
-        }
-        model = genai.GenerativeModel('models/gemini-2.5-pro') 
-        
-        prompt = """Descreva esta imagem para um usuário de leitor de tela cego. 
+PROMPT_ALT_TEXT = """Descreva esta imagem para um usuário de leitor de tela cego. 
                     Seja conciso, no máximo 10 palavras. Responda em português.
                     NÃO inclua nenhuma frase de confirmação ou introdução. 
                     Forneça APENAS a descrição."""
-        
-        response = model.generate_content([prompt, image_part])
-        
-        print(f"API de Visão OK: {response.text.strip()}")
-        return response.text.strip()
+
+def baixar_imagem(image_url):
+    """
+    Baixa a imagem (pool de conexões, timeout, limite de bytes e revalidação
+    com o cache de mídia) e a reduz para a IA (ver imagens.preparar_imagem).
+    """
+    midia = buscador_midia.baixar(image_url, MIDIA_MAX_BYTES_IMAGEM)
+    return preparar_imagem(midia.dados, midia.mime_type)
+
+def descrever_imagem(imagem):
+    """
+    Descreve uma imagem já baixada e reduzida. A chave do cache é a
+    'chave_cache' da imagem (hash perceptual + assinatura do conteúdo, não a
+    URL nem os bytes), então variantes da mesma foto dividem a mesma descrição.
+    O modelo sai da rota de "alt_text" (ver roteamento_ia.py).
+    """
+    def _gerar(modelo):
+        return provedor_ia.descrever_imagem(modelo, PROMPT_ALT_TEXT, imagem.como_part())
+
+    return roteador_ia.chamar("alt_text", roteador_ia.rota("alt_text"), PROMPT_ALT_TEXT, imagem.chave_cache, _gerar)
+
+def descrever_imagens_em_lote(imagens):
+    """
+    Descreve várias imagens num único pedido multimodal, com resposta em lista JSON.
+    Cada descrição vai para o cache com a mesma chave de descrever_imagem, e
+    imagens que outra requisição já está descrevendo não são pedidas de novo.
+    Lança exceção se a resposta não puder ser lida.
+    """
+    def _descrever(modelo, indices):
+        prompt = PROMPT_LOTE.format(quantidade=len(indices), instrucoes=PROMPT_ALT_TEXT)
+        descricoes = provedor_ia.descrever_imagens(modelo, prompt, [imagens[i].como_part() for i in indices])
+        logger.info("API de Visão OK: %s imagens descritas em um único pedido.", len(indices))
+        return descricoes
+    return roteador_ia.chamar_varios(
+        "alt_text", roteador_ia.rota("alt_text"), PROMPT_ALT_TEXT, [imagem.chave_cache for imagem in imagens], _descrever)
+
+def get_alt_text_from_ai(image_url):
+    """Descreve uma imagem a partir de uma URL. Retorna None se falhar."""
+    try:
+        alt_text = descrever_imagem(baixar_imagem(image_url))
+        logger.info("API de Visão OK: %s", alt_text)
+        return alt_text
 
     except Exception as e:
-        print(f"ERRO na API de Visão para {image_url}: {e}")
-        return "Erro ao gerar descrição pela IA"
+        logger.error("ERRO na API de Visão para %s: %s", image_url, e)
+        return None
 
-def get_simplified_text_from_ai(text):
-    """Usa o Gemini 2.5 Flash para simplificar um texto."""
+def gerar_alt_texts_em_lote(imagens):
+    """
+    Gera o alt text de várias <img>: baixa e reduz todas ao mesmo tempo, junta as
+    quase idênticas (hash perceptual + miniatura em cores), agrupa em lotes
+    (IA_LOTE_MAX_IMAGENS / IA_LOTE_MAX_BYTES), envia os lotes em paralelo e escreve cada descrição em
+    todas as <img> do grupo. Lotes ilegíveis voltam ao modo individual.
+    Imagens que não puderam ser baixadas ou descritas ficam sem 'alt'.
+    """
+    baixadas = []
+    if imagens:
+        with ThreadPoolExecutor(max_workers=min(IA_MAX_CONCORRENCIA, len(imagens))) as executor:
+            preparadas = executor.map(lambda img: _baixar_ou_nada(img.get('src')), imagens)
+            for img, imagem in zip(imagens, preparadas):
+                if imagem is not None:
+                    baixadas.append((img, imagem))
+
+    # Cada grupo de imagens semelhantes vai uma única vez para a IA
+    grupos = agrupar_semelhantes(baixadas, imagem_de=lambda par: par[1])
+    if len(grupos) < len(baixadas):
+        logger.info("%s imagens repetidas reaproveitam a mesma descrição.", len(baixadas) - len(grupos))
+
+    lotes = agrupar_em_lotes(grupos, tamanho=lambda grupo: len(grupo[0][1].dados))
+    def _descrever_lote(lote):
+        return executar_lote([grupo[0][1] for grupo in lote],
+                             descrever_imagens_em_lote, _descrever_ou_nada)
+
+    for lote, descricoes in executar_em_paralelo(lotes, _descrever_lote):
+        for grupo, alt_text in zip(lote, descricoes):
+            if alt_text is None:
+                continue
+            for img, _ in grupo:
+                img['alt'] = alt_text
+            logger.info("Corrigido: alt='%s'", alt_text)
+
+def _baixar_ou_nada(image_url):
     try:
-        model = genai.GenerativeModel('models/gemini-2.5-flash')
-        prompt = f"Simplifique o texto a seguir para uma pessoa com dislexia ou dificuldade cognitiva. Use frases curtas e diretas. Responda em português. Texto original: '{text}'"
-        response = model.generate_content(prompt)
-        
-        print(f"API de Texto OK: Texto simplificado.")
-        return response.text.strip()
-        
+        return baixar_imagem(image_url)
     except Exception as e:
-        print(f"ERRO na API de Texto: {e}")
-        return text 
+        logger.error("ERRO ao baixar imagem %s: %s", image_url, e)
+        return None
 
-def get_video_ai_response(video_url, task_prompt):
-    """Função genérica para Download, Upload, Processamento de Vídeo e Limpeza."""
-    local_filename = f"temp_video_{int(time.time())}.mp4"
-    video_file = None 
+def _descrever_ou_nada(imagem):
+    try:
+        return descrever_imagem(imagem)
+    except Exception as e:
+        logger.error("ERRO na API de Visão: %s", e)
+        return None
 
+def get_simplified_text_from_ai(text):
+    """Simplifica um texto (rota de "simplificacao", Flash por padrão). Retorna None se falhar."""
     try:
-        # DOWNLOAD
-        print(f"Baixando vídeo para tarefa: {video_url} ...")
-        with requests.get(video_url, stream=True) as r:
-            r.raise_for_status()
-            with open(local_filename, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192): 
-                    f.write(chunk)
-        print("Download concluído.")
-
-        # UPLOAD E ESPERA
-        print("Enviando vídeo para a IA...")
-        video_file = genai.upload_file(path=local_filename, display_name="Hackathon Video")
-        print(f"Upload iniciado. ID: {video_file.name}. Aguardando processamento...")
-
-        while video_file.state.name == "PROCESSING":
-            print("Vídeo ainda está processando... aguardando 5 segundos.")
-            time.sleep(5)
-            video_file = genai.get_file(video_file.name)
-
-        if video_file.state.name != "ACTIVE":
-            raise Exception(f"Processamento do arquivo falhou no servidor. Estado: {video_file.state.name}")
-        
-        print("Vídeo está 'ACTIVE'. Solicitando IA...")
+        prompt = f"Simplifique o texto a seguir para uma pessoa com dislexia ou dificuldade cognitiva. Use frases curtas e diretas. Responda em português. Texto original: '{text}'"
 
-        # CHAMADA DA API
-        model = genai.GenerativeModel('models/gemini-2.5-pro')
-        response = model.generate_content([task_prompt, video_file])
+        def _gerar(modelo):
+            return provedor_ia.simplificar_texto(modelo, prompt, text)
 
-        # LIMPEZA
-        print("Limpando arquivos temporários...")
-        genai.delete_file(video_file.name) 
-        os.remove(local_filename) 
+        texto_simplificado = roteador_ia.chamar("simplificacao", roteador_ia.rota("simplificacao"), prompt, text, _gerar)
+        logger.info("API de Texto OK: Texto simplificado.")
+        return texto_simplificado
         
-        print(f"API de Vídeo OK: Texto gerado.")
-        return response.text.strip()
-
     except Exception as e:
-        print(f"ERRO GIGANTE na API de Vídeo: {e}")
-        if os.path.exists(local_filename):
-            os.remove(local_filename)
-        if video_file and video_file.name:
-             try:
-                 genai.delete_file(video_file.name)
-             except Exception as cleanup_e:
-                 pass
-        return "Erro ao processar o vídeo."
+        logger.error("ERRO na API de Texto: %s", e)
+        return None
+
+def analisar_video(video_url):
+    """
+    Analisa o vídeo uma única vez (fala, sons e narração visual, com tempos) e
+    devolve um AnaliseVideo. Transcrição e audiodescrição saem da mesma resposta,
+    que fica no cache. Só respostas que podem ser lidas vão para o cache.
+    Lança exceção se a análise falhar.
+    """
+    def _gerar(modelo):
+        texto = _processar_video_com_ia(modelo, video_url, PROMPT_ANALISE_VIDEO)
+        ler_analise(texto)
+        return texto
+
+    return ler_analise(roteador_ia.chamar("video", roteador_ia.rota("video"), PROMPT_ANALISE_VIDEO, video_url, _gerar))
+
+def _processar_video_com_ia(modelo, video_url, task_prompt):
+    """
+    Pede à IA a análise do vídeo. O download, o upload e a limpeza ficam com o
+    gerenciador_videos: o mesmo vídeo é enviado uma única vez e reaproveitado.
+    Com o provedor simulado, o vídeo não é baixado nem enviado.
+    """
+    if provedor_ia.nome != "gemini":
+        return provedor_ia.analisar_video(modelo, task_prompt, video_url)
+
+    video_file = gerenciador_videos.obter_arquivo(video_url)
+    try:
+        logger.info("Vídeo está 'ACTIVE'. Solicitando IA...")
+        texto = provedor_ia.analisar_video(modelo, task_prompt, video_file)
+        logger.info("API de Vídeo OK: Texto gerado.")
+        return texto
+    finally:
+        gerenciador_videos.liberar(video_file.name)
 
 def get_transcription_from_ai(video_url):
-    """Pede à IA para OUVIR e TRANSCREVER o vídeo."""
-    
-    prompt = """Ouça o áudio deste vídeo e transcreva exatamente o que é dito. 
-                Se não houver fala, descreva os sons (ex: '[música instrumental]'). 
-                Responda em português.
-                NÃO inclua nenhuma frase de confirmação ou introdução.
-                Forneça APENAS a transcrição."""
-                
-    return get_video_ai_response(video_url, prompt)
+    """Transcrição (fala e sons) do vídeo, tirada da análise combinada. Retorna None se falhar."""
+    try:
+        return analisar_video(video_url).texto_transcricao()
+    except Exception as e:
+        logger.error("ERRO GIGANTE na API de Vídeo: %s", e)
+        return None
 
 def get_visual_description_from_ai(video_url):
-    """Pede à IA para ASSISTIR e DESCREVER o vídeo."""
-    
-    prompt = """Você é um narrador de audiodescrição para uma pessoa cega. 
-                Assista a este vídeo e descreva apenas as informações visuais que não são óbvias pelo som. 
-                O que está acontecendo visualmente? Responda em português.
-                NÃO inclua nenhuma frase de confirmação ou introdução.
-                Forneça APENAS a descrição."""
-                
-    return get_video_ai_response(video_url, prompt)
+    """Audiodescrição (só o que não é óbvio pelo som), tirada da análise combinada. Retorna None se falhar."""
+    try:
+        return analisar_video(video_url).texto_narracao()
+    except Exception as e:
+        logger.error("ERRO GIGANTE na API de Vídeo: %s", e)
+        return None
 
 
 ####################################################
@@ -407,11 +472,13 @@ def get_visual_description_from_ai(video_url):
 ####################################################
 
 if __name__ == "__main__":
-    
+    # Mostra no console o que cada perfil corrigiu
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     # carrega o arquivo "quebrado"
     try:
         with open('antes.html', 'r', encoding='utf-8') as f:
-            soup_original = BeautifulSoup(f, 'html.parser')
+            soup_original = criar_soup(f)
         print("Arquivo 'antes.html' carregado com sucesso.")
     except FileNotFoundError:
         print("\n!!! ERRO CRÍTICO !!!")
@@ -420,9 +487,11 @@ if __name__ == "__main__":
         print("Lembre-se que 'antes.html' deve conter o <video>.\n")
         exit()
 
+    # cada perfil recebe uma cópia da árvore original (sem serializar e re-parsear)
+
     # roda o perfil 1 (cego)
     print("\n--- INICIANDO PERFIL 1: CEGO ---")
-    soup_para_cego = BeautifulSoup(str(soup_original), 'html.parser') 
+    soup_para_cego = clonar_soup(soup_original) 
     soup_corrigido_cego = aplicar_perfil_cego(soup_para_cego)
     with open('depois_perfil_cego.html', 'w', encoding='utf-8') as f:
         f.write(str(soup_corrigido_cego))
@@ -430,7 +499,7 @@ if __name__ == "__main__":
 
     # roda o perfil 2 (dislexia)
     print("--- INICIANDO PERFIL 2: DISLEXIA ---")
-    soup_para_dislexia = BeautifulSoup(str(soup_original), 'html.parser')
+    soup_para_dislexia = clonar_soup(soup_original)
     soup_corrigido_dislexia = aplicar_perfil_dislexia(soup_para_dislexia)
     with open('depois_perfil_dislexia.html', 'w', encoding='utf-8') as f:
         f.write(str(soup_corrigido_dislexia))
@@ -438,7 +507,7 @@ if __name__ == "__main__":
 
     # roda o perfil 3 (alto contraste)
     print("--- INICIANDO PERFIL 3: ALTO CONTRASTE ---")
-    soup_para_contraste = BeautifulSoup(str(soup_original), 'html.parser')
+    soup_para_contraste = clonar_soup(soup_original)
     soup_corrigido_contraste = aplicar_perfil_alto_contraste(soup_para_contraste)
     with open('depois_perfil_alto_contraste.html', 'w', encoding='utf-8') as f:
         f.write(str(soup_corrigido_contraste))
@@ -446,7 +515,7 @@ if __name__ == "__main__":
 
     # roda o perfil 4 (surdo)
     print("--- INICIANDO PERFIL 4: SURDO (TRANSCRIÇÃO) ---")
-    soup_para_surdo = BeautifulSoup(str(soup_original), 'html.parser')
+    soup_para_surdo = clonar_soup(soup_original)
     soup_corrigido_surdo = aplicar_perfil_surdo(soup_para_surdo)
     with open('depois_perfil_surdo.html', 'w', encoding='utf-8') as f:
         f.write(str(soup_corrigido_surdo))
@@ -454,7 +523,7 @@ if __name__ == "__main__":
 
     # roda o perfil 5 (narração cegos)
     print("--- INICIANDO PERFIL 5: NARRAÇÃO CEGOS ---")
-    soup_para_narracao = BeautifulSoup(str(soup_original), 'html.parser')
+    soup_para_narracao = clonar_soup(soup_original)
     soup_corrigido_narracao = aplicar_perfil_narracao_cegos(soup_para_narracao)
     with open('depois_perfil_narracao_cegos.html', 'w', encoding='utf-8') as f:
         f.write(str(soup_corrigido_narracao))
@@ -463,21 +532,21 @@ if __name__ == "__main__":
     # roda o perfil 6 (visão limitada - 3 simulações)
     
     print("--- INICIANDO PERFIL 6a: AUMENTAR TEXTO ---")
-    soup_aumentar_texto = BeautifulSoup(str(soup_original), 'html.parser')
+    soup_aumentar_texto = clonar_soup(soup_original)
     soup_aumentar_texto = aplicar_perfil_visao_limitada(soup_aumentar_texto, "aumentar_texto")
     with open('depois_perfil_aumentar_texto.html', 'w', encoding='utf-8') as f:
         f.write(str(soup_aumentar_texto))
     print("Arquivo 'depois_perfil_aumentar_texto.html' salvo!\n")
 
     print("--- INICIANDO PERFIL 6b: DALTONISMO (PROTANOPIA) ---")
-    soup_protanopia = BeautifulSoup(str(soup_original), 'html.parser')
+    soup_protanopia = clonar_soup(soup_original)
     soup_protanopia = aplicar_perfil_visao_limitada(soup_protanopia, "protanopia")
     with open('depois_perfil_protanopia.html', 'w', encoding='utf-8') as f:
         f.write(str(soup_protanopia))
     print("Arquivo 'depois_perfil_protanopia.html' salvo!\n")
     
     print("--- INICIANDO PERFIL 6c: DALTONISMO (DEUTERANOPIA) ---")
-    soup_deuteranopia = BeautifulSoup(str(soup_original), 'html.parser')
+    soup_deuteranopia = clonar_soup(soup_original)
     soup_deuteranopia = aplicar_perfil_visao_limitada(soup_deuteranopia, "deuteranopia")
     with open('depois_perfil_deuteranopia.html', 'w', encoding='utf-8') as f:
         f.write(str(soup_deuteranopia))
@@ -0,0 +1,290 @@
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from paralelo import IA_RAJADA, IA_REQUISICOES_POR_MINUTO, TokenBucket
+from metricas import CIRCUITO_REJEITADAS, NOVAS_TENTATIVAS_IA, span
+from prazo import PrazoEsgotado, tempo_restante_ia, verificar_prazo
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuração pelo .env
+# Taxa por modelo: IA_REQUISICOES_POR_MINUTO_PRO / IA_REQUISICOES_POR_MINUTO_FLASH
+# (o sufixo é o fim do nome do modelo); sem elas, vale IA_REQUISICOES_POR_MINUTO.
+IA_TENTATIVAS = int(os.getenv("IA_TENTATIVAS", "3"))
+IA_RECUO_INICIAL = float(os.getenv("IA_RECUO_INICIAL", "1"))
+IA_RECUO_MAXIMO = float(os.getenv("IA_RECUO_MAXIMO", "30"))
+IA_CIRCUITO_FALHAS = int(os.getenv("IA_CIRCUITO_FALHAS", "5"))
+IA_CIRCUITO_PAUSA = float(os.getenv("IA_CIRCUITO_PAUSA", "30"))
+
+# Prioridades (menor = antes): requisições com o usuário esperando vs. jobs e trabalho de fundo
+PRIORIDADE_INTERATIVA = 0
+PRIORIDADE_FUNDO = 1
+
+_prioridade_atual = ContextVar("prioridade_ia", default=PRIORIDADE_INTERATIVA)
+
+def prioridade_atual():
+    return _prioridade_atual.get()
+
+@contextmanager
+def prioridade(nivel):
+    """Chamadas de IA feitas dentro do bloco (inclusive nas threads de IA) usam esta prioridade."""
+    token = _prioridade_atual.set(nivel)
+    try:
+        yield
+    finally:
+        _prioridade_atual.reset(token)
+
+####################################################
+### SEÇÃO 1: LIMITADOR POR MODELO COM PRIORIDADE
+####################################################
+
+class LimitadorPrioritario(TokenBucket):
+    """
+    Token bucket em que as threads esperam numa fila de prioridade: um token
+    só vai para a primeira da fila (interativas antes das de fundo, depois por
+    ordem de chegada). pausar() segura a fila inteira (ex: Retry-After de um 429).
+    """
+
+    def __init__(self, taxa_por_segundo, capacidade):
+        super().__init__(taxa_por_segundo, capacidade)
+        self._condicao = threading.Condition(self._lock)
+        self._fila = []
+        self._chegada = itertools.count()
+        self._pausado_ate = 0.0
+
+    def _reabastecer(self):
+        agora = time.monotonic()
+        if agora < self._pausado_ate:
+            # Em pausa, nada reabastece
+            self._ultimo_reabastecimento = agora
+            return
+        super()._reabastecer()
+
+    def pausar(self, segundos):
+        """Nenhum token sai nos próximos 'segundos'; o balde volta vazio depois da pausa."""
+        with self._condicao:
+            self._pausado_ate = max(self._pausado_ate, time.monotonic() + segundos)
+            self._tokens = 0.0
+            self._condicao.notify_all()
+
+    def adquirir(self, tokens=1, timeout=None, prioridade=PRIORIDADE_INTERATIVA):
+        """
+        Bloqueia até a vez desta thread e haver `tokens` disponíveis.
+        Retorna False se o `timeout` (em segundos) estourar antes disso.
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._condicao:
+            senha = (prioridade, next(self._chegada))
+            heapq.heappush(self._fila, senha)
+            try:
+                while True:
+                    agora = time.monotonic()
+                    espera = None
+                    if self._fila[0] == senha:
+                        self._reabastecer()
+                        if agora >= self._pausado_ate and self._tokens >= tokens:
+                            self._tokens -= tokens
+                            return True
+                        espera = max(self._pausado_ate - agora, (tokens - self._tokens) / self.taxa_por_segundo)
+                    if limite is not None:
+                        if agora + (espera or 0) > limite:
+                            return False
+                        espera = limite - agora if espera is None else espera
+                    self._condicao.wait(espera)
+            finally:
+                self._fila.remove(senha)
+                heapq.heapify(self._fila)
+                self._condicao.notify_all()
+
+####################################################
+### SEÇÃO 2: CIRCUIT BREAKER
+####################################################
+
+class CircuitoAberto(Exception):
+    """O modelo falhou demais seguidamente: as chamadas estão suspensas por um tempo."""
+
+
+class Circuito:
+    """
+    Circuit breaker de um modelo.
+    - fechado: tudo passa; 'falhas_para_abrir' falhas transitórias seguidas abrem o circuito;
+    - aberto: nada passa por 'pausa' segundos (a cota não é gasta com um serviço fora do ar);
+    - meio-aberto: depois da pausa, uma chamada de teste passa. Sucesso fecha, falha reabre.
+    """
+
+    def __init__(self, falhas_para_abrir=IA_CIRCUITO_FALHAS, pausa=IA_CIRCUITO_PAUSA):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.pausa = pausa
+        self.falhas = 0
+        self._aberto_ate = 0.0
+        self._testando = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        if self.falhas < self.falhas_para_abrir:
+            return "fechado"
+        return "aberto" if time.monotonic() < self._aberto_ate else "meio-aberto"
+
+    def permitir(self):
+        with self._lock:
+            estado = self.estado
+            if estado == "fechado":
+                return True
+            if estado == "aberto" or self._testando:
+                return False
+            self._testando = True
+            return True
+
+    def liberar(self):
+        """Devolve a vaga da chamada de teste quando ela desistiu antes de chegar ao modelo."""
+        with self._lock:
+            self._testando = False
+
+    def sucesso(self):
+        with self._lock:
+            self.falhas = 0
+            self._testando = False
+
+    def falha(self):
+        with self._lock:
+            self.falhas += 1
+            self._testando = False
+            if self.falhas >= self.falhas_para_abrir:
+                self._aberto_ate = time.monotonic() + self.pausa
+                return True
+        return False
+
+####################################################
+### SEÇÃO 3: AGENDADOR (TAXA, NOVAS TENTATIVAS E CIRCUITO)
+####################################################
+
+# Erros que valem uma nova tentativa: cota (429), timeouts e falhas do servidor
+CODIGOS_TRANSITORIOS = {408, 429, 500, 502, 503, 504}
+NOMES_TRANSITORIOS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "GatewayTimeout", "ConnectionError", "Timeout", "ReadTimeout",
+}
+
+def eh_transitoria(erro):
+    """True se o erro é de cota, rede ou servidor (vale tentar de novo); False se é do pedido."""
+    if isinstance(erro, (TimeoutError, ConnectionError)):
+        return True
+    codigo = getattr(erro, "code", None)
+    if isinstance(codigo, int):
+        return codigo in CODIGOS_TRANSITORIOS
+    return any(classe.__name__ in NOMES_TRANSITORIOS for classe in type(erro).__mro__)
+
+def dica_de_espera(erro):
+    """
+    Segundos que o provedor pediu para esperar (Retry-After), ou None.
+    Procura um atributo 'retry_after', o cabeçalho HTTP e o texto do erro do Gemini
+    ("retry_delay { seconds: 31 }" / "Please retry in 31.5s").
+    """
+    valor = getattr(erro, "retry_after", None)
+    if valor is None:
+        resposta = getattr(erro, "response", None)
+        valor = getattr(resposta, "headers", {}).get("Retry-After") if resposta is not None else None
+    if valor is None:
+        achado = (re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", str(erro))
+                  or re.search(r"retry in ([\d.]+)\s*s", str(erro), re.IGNORECASE))
+        valor = achado.group(1) if achado else None
+    try:
+        return max(0.0, float(valor)) if valor is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class AgendadorIA:
+    """
+    Todas as chamadas aos modelos do processo passam por aqui:
+    - um limitador por modelo (pro e flash têm cotas diferentes), com prioridade
+      para as requisições interativas sobre os jobs e o trabalho de fundo;
+    - erros transitórios são tentados de novo com recuo exponencial com jitter,
+      respeitando o Retry-After (que também pausa o limitador do modelo para todos);
+    - um circuit breaker por modelo corta as chamadas quando ele falha seguidamente;
+    - com prazo na requisição (ver prazo.py), nenhuma espera passa dele: a chamada
+      que não cabe lança PrazoEsgotado e fica para depois.
+    Quem chama recebe o resultado ou a última exceção: falhas nunca viram resposta.
+    """
+
+    def __init__(self, tentativas=IA_TENTATIVAS, recuo_inicial=IA_RECUO_INICIAL, recuo_maximo=IA_RECUO_MAXIMO):
+        self.tentativas = max(1, tentativas)
+        self.recuo_inicial = recuo_inicial
+        self.recuo_maximo = recuo_maximo
+        self._modelos = {}
+        self._lock = threading.Lock()
+
+    def _do_modelo(self, modelo):
+        """(limitador, circuito) do modelo, criados no primeiro uso."""
+        with self._lock:
+            if modelo not in self._modelos:
+                sufixo = re.sub(r'\W', '_', modelo.rsplit("-", 1)[-1]).upper()
+                por_minuto = float(os.getenv(f"IA_REQUISICOES_POR_MINUTO_{sufixo}", IA_REQUISICOES_POR_MINUTO))
+                self._modelos[modelo] = (LimitadorPrioritario(por_minuto / 60.0, IA_RAJADA), Circuito())
+            return self._modelos[modelo]
+
+    def recuo(self, tentativa, dica=None):
+        """Espera antes da tentativa seguinte: jitter total sobre o recuo exponencial, nunca menos que a dica."""
+        teto = min(self.recuo_maximo, self.recuo_inicial * 2 ** tentativa)
+        return max(dica or 0.0, random.uniform(0, teto))
+
+    def executar(self, modelo, funcao, prioridade=None):
+        """Executa funcao() (uma chamada ao 'modelo') com limite de taxa, novas tentativas e circuito."""
+        prioridade = _prioridade_atual.get() if prioridade is None else prioridade
+        limitador, circuito = self._do_modelo(modelo)
+
+        for tentativa in range(self.tentativas):
+            verificar_prazo(f"Chamada a {modelo}")
+            if not circuito.permitir():
+                CIRCUITO_REJEITADAS.incrementar(modelo=modelo)
+                raise CircuitoAberto(f"Circuito do modelo {modelo} aberto: chamadas suspensas por até {circuito.pausa:g}s")
+            try:
+                with span("espera_limitador", modelo=modelo, prioridade=prioridade):
+                    if not limitador.adquirir(timeout=tempo_restante_ia(), prioridade=prioridade):
+                        raise PrazoEsgotado(f"Chamada a {modelo} adiada: a cota do modelo não libera antes do prazo")
+            except BaseException:
+                # Não chegou ao modelo: sem isso, um circuito meio-aberto ficaria esperando para sempre
+                circuito.liberar()
+                raise
+            try:
+                resultado = funcao()
+            except Exception as e:
+                if not eh_transitoria(e):
+                    # O serviço respondeu (o erro é do pedido): não conta contra o circuito
+                    circuito.sucesso()
+                    raise
+                if circuito.falha():
+                    logger.warning("Circuito do modelo %s aberto após %d falhas seguidas.", modelo, circuito.falhas)
+                dica = dica_de_espera(e)
+                if dica:
+                    limitador.pausar(dica)
+                if tentativa == self.tentativas - 1:
+                    raise
+                espera = self.recuo(tentativa, dica)
+                restante = tempo_restante_ia()
+                if restante is not None and espera >= restante:
+                    # A próxima tentativa não cabe no prazo desta requisição: a tarefa fica
+                    # adiada (e quem esperava esta chamada no single-flight tenta por conta própria)
+                    raise PrazoEsgotado(f"Chamada a {modelo} adiada: a nova tentativa não cabe no prazo ({e})") from e
+                logger.warning("Chamada a %s falhou (%s). Tentativa %d de %d em %.1fs.",
+                               modelo, e, tentativa + 2, self.tentativas, espera)
+                NOVAS_TENTATIVAS_IA.incrementar(modelo=modelo)
+                time.sleep(espera)
+            else:
+                circuito.sucesso()
+                return resultado
+
+
+# Instância única do processo: todas as requisições dividem as mesmas cotas
+agendador_ia = AgendadorIA()
@@ -0,0 +1,120 @@
+import json
+
+# Uma única passada da IA pelo vídeo serve o perfil surdo (transcrição e sons)
+# e o de narração para cegos (audiodescrição).
+PROMPT_ANALISE_VIDEO = """Assista e ouça este vídeo para gerar recursos de acessibilidade em português.
+                Responda APENAS com um objeto JSON no formato:
+                {"transcricao": [{"inicio": 0.0, "fim": 4.2, "texto": "fala exatamente como é dita"}],
+                 "sons": [{"inicio": 4.2, "fim": 6.0, "texto": "música instrumental"}],
+                 "narracao": [{"inicio": 0.0, "fim": 5.0, "texto": "o que acontece na imagem"}]}
+                - "transcricao": o que é falado, em trechos curtos.
+                - "sons": sons relevantes que não são fala (música, aplausos, silêncio).
+                - "narracao": audiodescrição para uma pessoa cega, só com as informações
+                  visuais que não são óbvias pelo som.
+                "inicio" e "fim" são segundos desde o começo do vídeo. Use listas vazias se não houver nada.
+                NÃO inclua nenhuma frase de confirmação ou introdução."""
+
+# Sem tempos na resposta, cada trecho dura o tempo de leitura estimado
+PALAVRAS_POR_SEGUNDO = 2.5
+DURACAO_MINIMA_TRECHO = 2.0
+
+
+class Trecho:
+    """Um trecho temporizado (em segundos) da análise."""
+
+    def __init__(self, inicio, fim, texto):
+        self.inicio = inicio
+        self.fim = fim
+        self.texto = texto
+
+
+class AnaliseVideo:
+    """
+    Resultado estruturado da análise de um vídeo: fala, sons e narração visual.
+    Gera o texto corrido de cada perfil e as faixas WebVTT (legendas e audiodescrição).
+    """
+
+    def __init__(self, transcricao, sons, narracao):
+        self.transcricao = transcricao
+        self.sons = sons
+        self.narracao = narracao
+
+    def legendas(self):
+        """Fala e sons (entre colchetes, como em captions.vtt) na ordem do vídeo."""
+        sons = [Trecho(t.inicio, t.fim, f"[{t.texto}]") for t in self.sons]
+        return sorted(self.transcricao + sons, key=lambda t: t.inicio)
+
+    def texto_transcricao(self):
+        return "\n".join(trecho.texto for trecho in self.legendas())
+
+    def texto_narracao(self):
+        return " ".join(trecho.texto for trecho in self.narracao)
+
+    def para_webvtt(self, tipo="captions"):
+        """Faixa WebVTT: 'captions' (fala + sons) ou 'descriptions' (narração)."""
+        trechos = self.legendas() if tipo == "captions" else self.narracao
+        blocos = ["WEBVTT"]
+        for trecho in trechos:
+            blocos.append(f"{formatar_tempo_vtt(trecho.inicio)} --> {formatar_tempo_vtt(trecho.fim)}\n"
+                          f"{escapar_vtt(trecho.texto)}")
+        return "\n\n".join(blocos) + "\n"
+
+
+def formatar_tempo_vtt(segundos):
+    """12.5 -> '00:00:12.500'."""
+    milissegundos = int(round(segundos * 1000))
+    horas, milissegundos = divmod(milissegundos, 3600 * 1000)
+    minutos, milissegundos = divmod(milissegundos, 60 * 1000)
+    segundos, milissegundos = divmod(milissegundos, 1000)
+    return f"{horas:02d}:{minutos:02d}:{segundos:02d}.{milissegundos:03d}"
+
+def escapar_vtt(texto):
+    """Texto de uma deixa WebVTT: '&', '<' e '>' viram entidades e linhas em branco somem."""
+    texto = texto.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return "\n".join(linha for linha in texto.splitlines() if linha.strip())
+
+def _ler_trechos(itens, campo):
+    if not isinstance(itens, list):
+        raise ValueError(f"'{campo}' deveria ser uma lista")
+
+    trechos, fim_anterior = [], 0.0
+    for item in itens:
+        if isinstance(item, str):
+            item = {"texto": item}
+        texto = item.get("texto") if isinstance(item, dict) else None
+        if not isinstance(texto, str) or not texto.strip():
+            continue
+        texto = texto.strip()
+
+        # Tempos são opcionais: sem eles, o trecho começa onde o anterior terminou
+        inicio, fim = item.get("inicio"), item.get("fim")
+        inicio = float(inicio) if isinstance(inicio, (int, float)) else fim_anterior
+        duracao = max(DURACAO_MINIMA_TRECHO, len(texto.split()) / PALAVRAS_POR_SEGUNDO)
+        fim = float(fim) if isinstance(fim, (int, float)) and fim > inicio else inicio + duracao
+
+        trechos.append(Trecho(inicio, fim, texto))
+        fim_anterior = fim
+    return trechos
+
+def ler_analise(texto):
+    """
+    Lê a resposta da IA (objeto JSON, com ou sem cercas de código) como AnaliseVideo.
+    Lança ValueError se a resposta não puder ser usada.
+    """
+    texto = texto.strip()
+    if texto.startswith("```"):
+        texto = texto.strip("`")
+        texto = texto[texto.index("\n") + 1:] if "\n" in texto else texto
+
+    dados = json.loads(texto)
+    if not isinstance(dados, dict):
+        raise ValueError("Esperava um objeto JSON com transcricao, sons e narracao")
+
+    analise = AnaliseVideo(
+        _ler_trechos(dados.get("transcricao", []), "transcricao"),
+        _ler_trechos(dados.get("sons", []), "sons"),
+        _ler_trechos(dados.get("narracao", []), "narracao"),
+    )
+    if not (analise.transcricao or analise.sons or analise.narracao):
+        raise ValueError("Análise do vídeo veio vazia")
+    return analise
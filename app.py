@@ -1,16 +1,39 @@
-import requests
-from bs4 import BeautifulSoup
-import google.generativeai as genai
+import functools
+import json
+import logging
 import os
 import time
-from flask import Flask, request, jsonify
+from contextlib import contextmanager
+from flask import Flask, Response, request, jsonify, make_response, send_file, stream_with_context
 from dotenv import load_dotenv
 from flask_cors import CORS
-
-# Carrega a chave de API e configura o Gemini
+from lotes_ia import PROMPT_LOTE
+from cache_respostas import cache_respostas, gerar_chave_resposta
+from jobs import FilaJobs, validar_callback_url
+from parser_html import criar_soup, criar_fragmento
+from contexto import ContextoAdaptacao, TarefaIA, estagio_de_perfil
+from analise_video import PROMPT_ANALISE_VIDEO, ler_analise
+from estaticos import ESTATICOS_MAX_AGE, TIPOS_MIME, repositorio_estatico
+from videos import gerenciador_videos
+from provedores_ia import provedor_ia
+from agendador_ia import PRIORIDADE_FUNDO, prioridade
+from roteamento_ia import ROTAS, registrar_provisorios, roteador_ia, validar_roteamento
+from prazo import PrazoEsgotado, com_prazo, ler_prazo_ms
+from metricas import (
+    DURACAO_PERFIL, DURACAO_REQUISICAO, observar_etapas, rastrear, registro_metricas, span,
+)
+from patches import (
+    patch_atributo, patch_texto, patch_anexar_html,
+    patch_inserir_html_inicio, patch_remover, patch_remover_atributo,
+)
+
+# Carrega a chave de API. O Gemini só é importado e configurado no primeiro uso (ver modelos.py)
 load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+
+# Logs no console (LOG_NIVEL=DEBUG também mostra o rastro completo de cada requisição)
+logging.basicConfig(level=os.getenv("LOG_NIVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
@@ -21,73 +44,171 @@ CORS(app)
 ### SEÇÃO 1: FUNÇÃO DE CORREÇÃO BASE E UTILITÁRIAS
 ####################################################
 
-def aplicar_correcoes_base(soup):
+def aplicar_correcoes_base(soup, ctx):
     """
     Aplica correções universais.
-    (Corrige o 'outline' de foco).
+    (Corrige o 'outline' de foco: remove a primeira <style> se ela tiver 'outline: none').
+    Com vários perfis, roda só uma vez por documento.
     """
-    style_tag = soup.find('style')
-    if style_tag and 'outline: none' in style_tag.string:
-        style_tag.decompose() 
+    if not ctx.correcoes_base_aplicadas:
+        ctx.correcoes_base_aplicadas = True
+        ctx.registrar_regra("outline", ['style'], lambda tag: remover_estilo_outline(tag, ctx), limite=1)
     return soup
 
-def modulo_aplicar_estilos_base(soup, new_styles):
-    """Função utilitária para injetar estilos CSS no <head>."""
-    head = soup.find('head')
-    if head:
-        new_style_tag = soup.new_tag('style')
-        new_style_tag.string = new_styles
-        head.append(new_style_tag)
+def remover_estilo_outline(style_tag, ctx):
+    if 'outline: none' in (style_tag.string or ''):
+        ctx.registrar_patch(style_tag, patch_remover())
+        style_tag.decompose()
+
+def modulo_aplicar_estilos_base(soup, new_styles, ctx):
+    """
+    Função utilitária para os estilos CSS de um perfil: o CSS é acumulado no
+    contexto e injetado numa única folha de estilo ao final (ver ContextoAdaptacao.finalizar).
+    """
+    ctx.adicionar_estilos(new_styles)
     return soup
 
 # Funções de IA simplificadas para foco na lógica.
+# As respostas passam pelo cache_ia (memória + SQLite): a mesma imagem, texto ou
+# vídeo com o mesmo prompt e modelo não volta ao Gemini.
+# Os pedidos vão para o provedor_ia (Gemini ou o simulado, ver IA_PROVEDOR), pelo
+# agendador_ia (cota por modelo, novas tentativas e circuit breaker).
+# O modelo sai da rota de cada tarefa (pro, flash ou escalonado, ver roteamento_ia.py).
+# Se a IA falhar, as funções retornam None: nada vai para o cache nem para a página.
+# PrazoEsgotado sobe para a tarefa ficar como adiada, não como falha (ver prazo.py).
+
+PROMPT_ALT_TEXT = "Descreva esta imagem para uma pessoa cega, de forma concisa e útil, para ser usada como alt text. Responda APENAS com a descrição, sem introdução ou frase final."
 
-def get_alt_text_from_ai(image_url):
+def get_alt_text_from_ai(image_url, rota=None):
     try:
-        response = genai.GenerativeModel('models/gemini-2.5-pro').generate_content(
-            [f"Descreva esta imagem para uma pessoa cega, de forma concisa e útil, para ser usada como alt text. Responda APENAS com a descrição, sem introdução ou frase final.", image_url]
-        )
-        return response.text.strip()
+        return roteador_ia.chamar("alt_text", rota or roteador_ia.rota("alt_text"), PROMPT_ALT_TEXT, image_url,
+                                  lambda modelo: provedor_ia.descrever_imagem(modelo, PROMPT_ALT_TEXT, image_url))
+    except PrazoEsgotado:
+        raise
     except Exception as e:
-        return "Descrição gerada por IA falhou."
+        logger.error("ERRO na API de Visão para %s: %s", image_url, e)
+        return None
+
+def get_alt_texts_em_lote_from_ai(image_urls, rota=None):
+    """
+    Descreve várias imagens num único pedido, com resposta em lista JSON.
+    Cada descrição vai para o cache com a mesma chave do pedido individual, e
+    imagens que outra requisição já está descrevendo não são pedidas de novo.
+    Lança exceção se a resposta não puder ser lida (quem chama volta ao modo individual).
+    """
+    def _descrever(modelo, indices):
+        prompt = PROMPT_LOTE.format(quantidade=len(indices), instrucoes=PROMPT_ALT_TEXT)
+        descricoes = provedor_ia.descrever_imagens(modelo, prompt, [image_urls[i] for i in indices])
+        logger.info("API de Visão OK: %d imagens descritas em um único pedido.", len(indices))
+        return descricoes
+    return roteador_ia.chamar_varios(
+        "alt_text", rota or roteador_ia.rota("alt_text"), PROMPT_ALT_TEXT, image_urls, _descrever)
+
+# Uma função de lote por rota: tarefas com a mesma rota são agrupadas (ver TarefaIA.gerar_lote)
+LOTES_ALT_TEXT = {rota: functools.partial(get_alt_texts_em_lote_from_ai, rota=rota) for rota in ROTAS}
     
-def get_simplified_text_from_ai(text):
+def get_simplified_text_from_ai(text, rota=None):
     try:
         prompt = f"Simplifique o seguinte texto para o nível de leitura de uma criança, mantendo o significado principal. Responda APENAS com o texto simplificado. Texto original: '{text}'"
-        response = genai.GenerativeModel('models/gemini-2.5-flash').generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return "Simplificação gerada por IA falhou."
-
-def get_video_transcript_from_ai(video_source):
-    try:
-        prompt = f"Gere uma transcrição concisa (máx 3 frases) deste vídeo para acessibilidade. Responda APENAS com a transcrição. URL: {video_source}"
-        response = genai.GenerativeModel('models/gemini-2.5-pro').generate_content(prompt)
-        return response.text.strip()
+        return roteador_ia.chamar("simplificacao", rota or roteador_ia.rota("simplificacao"), prompt, text,
+                                  lambda modelo: provedor_ia.simplificar_texto(modelo, prompt, text))
+    except PrazoEsgotado:
+        raise
     except Exception as e:
-        return "Transcrição gerada por IA falhou."
+        logger.error("ERRO na API de Texto: %s", e)
+        return None
 
-def get_visual_description_from_ai(video_url):
+def get_video_analysis_from_ai(video_source, rota=None):
+    """
+    Análise combinada do vídeo (fala, sons e narração com tempos), como AnaliseVideo.
+    Só respostas que podem ser lidas vão para o cache. Retorna None se falhar.
+    """
+    prompt = f"{PROMPT_ANALISE_VIDEO}\nURL: {video_source}"
+    def _gerar(modelo):
+        texto = provedor_ia.analisar_video(modelo, prompt, video_source)
+        ler_analise(texto)
+        return texto
     try:
-        prompt = "Você é um narrador de audiodescrição para uma pessoa cega. Descreva as informações visuais que não são óbvias pelo som. APENAS a descrição em português."
-        response = genai.GenerativeModel('models/gemini-2.5-pro').generate_content(prompt)
-        return response.text.strip()
+        return ler_analise(roteador_ia.chamar("video", rota or roteador_ia.rota("video"), prompt, video_source, _gerar))
+    except PrazoEsgotado:
+        raise
     except Exception as e:
-        return "Descrição visual do vídeo da IA falhou."
+        logger.error("ERRO na análise do vídeo: %s", e)
+        return None
+
+# Tarefas de IA: cada uma sabe chamar a IA e aplicar o resultado no soup.
+# Os perfis só agendam; o contexto executa todas em paralelo (ou em streaming).
+# Tarefas sem resultado (None) não são aplicadas: o elemento fica como estava.
+
+def tarefa_alt_text(img, rota):
+    def aplicar(alt_text):
+        img['alt'] = alt_text
+        logger.info("Alt Text Gerado para: %s", img.get('src'))
+        return patch_atributo('alt', alt_text)
+    return TarefaIA("alt_text", img, lambda: get_alt_text_from_ai(img.get('src'), rota), aplicar,
+                    entrada=img.get('src'), gerar_lote=LOTES_ALT_TEXT[rota])
+
+def criar_caixa_transcricao(transcricao_texto):
+    """Caixa de texto com a transcrição, logo abaixo do vídeo."""
+    transcricao_div = criar_fragmento(
+        '<div style="background-color: #e0f7fa; border: 1px solid #00bcd4; padding: 15px; margin-top: 15px; border-radius: 5px;" aria-live="polite">'
+        '<strong>Transcrição (Gerada por IA):</strong><p></p></div>').div
+    transcricao_div.find('p').string = transcricao_texto
+    return transcricao_div
+
+def criar_faixa(kind, label, url):
+    """<track> WebVTT em português para o <video>."""
+    track = criar_fragmento('<track>').track
+    track.attrs.update({'kind': kind, 'srclang': 'pt', 'label': label, 'src': url})
+    return track
+
+def tarefa_transcricao(video_tag, video_source, rota):
+    """
+    Análise do vídeo -> faixas WebVTT de legendas e de audiodescrição, publicadas
+    como arquivos estáticos (nome = hash do conteúdo, cache de longa duração)
+    e ligadas ao <video> por <track>; mais a caixa com a transcrição em texto.
+    Retorna uma lista de (elemento, patch).
+    """
+    def aplicar(analise):
+        operacoes = []
+        faixas = [("captions", "Legendas (IA)", analise.legendas()),
+                  ("descriptions", "Audiodescrição (IA)", analise.narracao)]
+        for kind, label, trechos in faixas:
+            if not trechos:
+                continue
+            url = repositorio_estatico.publicar(analise.para_webvtt(kind), "vtt")
+            track = criar_faixa(kind, label, url)
+            video_tag.append(track)
+            operacoes.append((video_tag, patch_anexar_html(str(track))))
+
+        caixa = criar_caixa_transcricao(analise.texto_transcricao())
+        video_tag.parent.append(caixa)
+        operacoes.append((video_tag.parent, patch_anexar_html(str(caixa))))
+        logger.info("Módulo: Transcrição e faixas WebVTT (Surdez Total) aplicadas.")
+        return operacoes
+    return TarefaIA("transcricao", video_tag.parent, lambda: get_video_analysis_from_ai(video_source, rota), aplicar)
+
+def tarefa_simplificacao(paragrafo, texto_original, rota):
+    def aplicar(simplified_text):
+        paragrafo.string = simplified_text
+        logger.info("Módulo: Simplificação de Texto (Dislexia) aplicado.")
+        return patch_texto(simplified_text)
+    return TarefaIA("simplificacao", paragrafo, lambda: get_simplified_text_from_ai(texto_original, rota), aplicar)
 
 ####################################################
 ### SEÇÃO 2: FUNÇÕES DE PERFIL FINAL E MODULAR
 ####################################################
 
-def aplicar_perfil_visual(soup, config):
+@estagio_de_perfil
+def aplicar_perfil_visual(soup, config, ctx):
     """
     PERFIL VISUAL (Configuração Modular)
     Implementa: Baixa Visão, Cegueira Total, Daltonismo, Hipersensibilidade Visual.
     """
     
     # 1. ESTILOS BASE (CSS)
-    print(f"--- INICIANDO PERFIL VISUAL (MODULAR) ---")
-    soup = aplicar_correcoes_base(soup)
+    logger.info("--- INICIANDO PERFIL VISUAL (MODULAR) ---")
+    soup = aplicar_correcoes_base(soup, ctx)
     head = soup.find('head')
     if not head: return soup
 
@@ -100,7 +221,7 @@ def aplicar_perfil_visual(soup, config):
         tamanho_escala = ESCALAS[escala]
         # Aplica o aumento na fonte raiz para escalar tudo
         new_styles += f"html {{ font-size: {tamanho_escala} !important; }}"
-        print(f"Módulo: Baixa Visão (Escala {escala}) aplicado.")
+        logger.info("Módulo: Baixa Visão (Escala %s) aplicado.", escala)
 
     # B. Ajustes de Cores (Daltonismo ou Hipersensibilidade)
     daltonismo_tipo = config.get("daltonismo_tipo")
@@ -123,77 +244,71 @@ def aplicar_perfil_visual(soup, config):
             /* Reintrodução de Foco Acessível (Branco sobre Preto) */
             .btn-primary, .btn-success { background-color: #555 !important; border: 3px solid #00FFFF !important; color: white !important; }
         """
-        print("Módulo: Hipersensibilidade Visual (Neutralização Extrema) ativado.")
+        logger.info("Módulo: Hipersensibilidade Visual (Neutralização Extrema) ativado.")
 
     # C. Daltonismo (Se não houver hipersensibilidade ativa)
     elif daltonismo_tipo == "protanopia":
         new_styles += ".btn-primary, .btn-success { background-color: #000080 !important; border-color: #000080 !important; color: white !important; }"
         new_styles += "body { filter: hue-rotate(180deg); }"
-        print("Módulo: Daltonismo (Protanopia) aplicado.")
+        logger.info("Módulo: Daltonismo (Protanopia) aplicado.")
     
     # Injeta estilos no <head>
     if new_styles:
-        soup = modulo_aplicar_estilos_base(soup, new_styles)
+        soup = modulo_aplicar_estilos_base(soup, new_styles, ctx)
 
     # 2. ALT-TEXT PARA IMAGENS (Cegueira Total)
     if config.get("cegueira_total"):
-        img_tags = soup.find_all('img')
-        for img in img_tags:
-            img_src = img.get('src')
-            if img_src and not img.get('alt'):
-                alt_text = get_alt_text_from_ai(img_src)
-                img['alt'] = alt_text
-                print(f"Alt Text Gerado para: {img_src}")
-        print("Módulo: Alt Text (Cegueira Total) aplicado.")
+        # Todas as imagens sem 'alt' são enviadas à IA de uma vez (limitadas por taxa)
+        rota = roteador_ia.rota("alt_text", config)
+        ctx.registrar_regra("alt_text", ['img'], lambda img: ctx.agendar_ia(tarefa_alt_text(img, rota)),
+                            condicao=lambda img: img.get('src') and not img.get('alt'))
+        logger.info("Módulo: Alt Text (Cegueira Total) agendado.")
 
     return soup
 
-def aplicar_perfil_auditivo(soup, config):
+@estagio_de_perfil
+def aplicar_perfil_auditivo(soup, config, ctx):
     """
     PERFIL AUDITIVO (Configuração Modular)
     Implementa: Transcrição de Vídeo e Desativar Autoplay.
     """
     
-    # 1. TRANSCRIÇÃO DE VÍDEO (Surdez Total)
+    # 1. TRANSCRIÇÃO DE VÍDEO (Surdez Total) - primeiro <video> da página
     if config.get("transcricao_surdez"):
-        video_tag = soup.find('video')
-        if video_tag:
-            source_tag = video_tag.find('source')
-            if source_tag and source_tag.get('src'):
-                video_source = source_tag.get('src')
-                print(f"Gerando transcrição para: {video_source}")
-                
-                # Chamada da IA
-                transcricao_texto = get_video_transcript_from_ai(video_source)
-                
-                # Injeta a transcrição como uma caixa de texto
-                transcricao_html = f"""
-                <div style="background-color: #e0f7fa; border: 1px solid #00bcd4; padding: 15px; margin-top: 15px; border-radius: 5px;" aria-live="polite">
-                    <strong>Transcrição (Gerada por IA):</strong>
-                    <p>{transcricao_texto}</p>
-                </div>
-                """
-                video_tag.parent.append(BeautifulSoup(transcricao_html, 'html.parser'))
-                print("Módulo: Transcrição (Surdez Total) aplicada.")
+        rota = roteador_ia.rota("video", config)
+        ctx.registrar_regra("transcricao", ['video'], lambda video_tag: agendar_transcricao(video_tag, ctx, rota), limite=1)
 
     # 2. DESATIVAR AUTOPLAY (Hiperacusia ou Distração)
     if config.get("desativar_autoplay"):
-        video_tag = soup.find('video')
-        if video_tag:
-            if video_tag.get('autoplay'):
-                del video_tag['autoplay']
-                print("Módulo: Autoplay desativado.")
-            video_tag['preload'] = 'metadata'
+        ctx.registrar_regra("autoplay", ['video'], lambda video_tag: desativar_autoplay(video_tag, ctx), limite=1)
             
     return soup
 
-def aplicar_perfil_cognitivo(soup, config):
+def agendar_transcricao(video_tag, ctx, rota):
+    source_tag = video_tag.find('source')
+    if source_tag and source_tag.get('src'):
+        video_source = source_tag.get('src')
+        logger.info("Gerando transcrição para: %s", video_source)
+        
+        # Chamada da IA (agendada)
+        ctx.agendar_ia(tarefa_transcricao(video_tag, video_source, rota))
+
+def desativar_autoplay(video_tag, ctx):
+    if video_tag.get('autoplay'):
+        del video_tag['autoplay']
+        ctx.registrar_patch(video_tag, patch_remover_atributo('autoplay'))
+        logger.info("Módulo: Autoplay desativado.")
+    video_tag['preload'] = 'metadata'
+    ctx.registrar_patch(video_tag, patch_atributo('preload', 'metadata'))
+
+@estagio_de_perfil
+def aplicar_perfil_cognitivo(soup, config, ctx):
     """
     PERFIL COGNITIVO (Configuração Modular)
     Implementa: Simplificação de Texto (Dislexia), Barra de Progresso (TDAH) e Estilos de Foco.
     """
-    print("--- INICIANDO PERFIL COGNITIVO (MODULAR) ---")
-    soup = aplicar_correcoes_base(soup)
+    logger.info("--- INICIANDO PERFIL COGNITIVO (MODULAR) ---")
+    soup = aplicar_correcoes_base(soup, ctx)
     head = soup.find('head')
     if not head: return soup
     
@@ -203,15 +318,10 @@ def aplicar_perfil_cognitivo(soup, config):
     
     # 2. SIMPLIFICAÇÃO DE TEXTO (IA)
     if config.get("simplificar_texto"):
-        hero_section = soup.find('div', class_='col-lg-6')
-        if hero_section:
-            lead_paragraph = hero_section.find('p', class_='lead')
-            if lead_paragraph:
-                original_text = lead_paragraph.get_text().strip()
-                if original_text:
-                    simplified_text = get_simplified_text_from_ai(original_text)
-                    lead_paragraph.string = simplified_text
-                    print("Módulo: Simplificação de Texto (Dislexia) aplicado.")
+        # Primeiro <p class="lead"> dentro da seção principal (div.col-lg-6)
+        rota = roteador_ia.rota("simplificacao", config)
+        ctx.registrar_regra("simplificacao", ['p'], lambda p: agendar_simplificacao(p, ctx, rota),
+                            condicao=eh_paragrafo_principal, limite=1)
                     
     # 3. ESTILOS GERAIS
     css_estilos = ""
@@ -220,19 +330,19 @@ def aplicar_perfil_cognitivo(soup, config):
     if escala in ESCALAS:
         tamanho_escala = ESCALAS[escala]
         css_estilos += f"html {{ font-size: {tamanho_escala} !important; }}"
-        print(f"Módulo: Escala (Cognitivo) aplicado em {tamanho_escala}.")
+        logger.info("Módulo: Escala (Cognitivo) aplicado em %s.", tamanho_escala)
     
     # B. Outros estilos cognitivos
     if config.get("destaque_botoes"):
         css_estilos += "button, .btn { border: 10px solid red !important; box-shadow: 0 0 15px red !important; }"
-        print("Módulo: Destaque de Botões aplicado.")
+        logger.info("Módulo: Destaque de Botões aplicado.")
         
     if config.get("diminuir_espacamento"):
         css_estilos += "body { letter-spacing: normal !important; line-height: 1.2 !important; }"
-        print("Módulo: Espaçamento de linha diminuído.")
+        logger.info("Módulo: Espaçamento de linha diminuído.")
 
     if css_estilos:
-        soup = modulo_aplicar_estilos_base(soup, css_estilos)
+        soup = modulo_aplicar_estilos_base(soup, css_estilos, ctx)
 
 
     # 4. BARRA DE PROGRESSO (TDAH) - Lógica de injeção HTML
@@ -244,63 +354,440 @@ def aplicar_perfil_cognitivo(soup, config):
                 <div style="width: 33%; height: 100%; background-color: #4CAF50;"></div>
             </div>
             """
-            progress_bar_soup = BeautifulSoup(progress_bar_html, 'html.parser').find('div')
+            progress_bar_soup = criar_fragmento(progress_bar_html).find('div')
             body.insert(0, progress_bar_soup)
-            print("Módulo: Barra de progresso estática adicionada.")
+            ctx.registrar_patch(body, patch_inserir_html_inicio(str(progress_bar_soup)))
+            logger.info("Módulo: Barra de progresso estática adicionada.")
 
     return soup
 
+def eh_paragrafo_principal(tag):
+    return 'lead' in tag.get('class', []) and tag.find_parent('div', class_='col-lg-6') is not None
+
+def agendar_simplificacao(lead_paragraph, ctx, rota):
+    original_text = lead_paragraph.get_text().strip()
+    if original_text:
+        ctx.agendar_ia(tarefa_simplificacao(lead_paragraph, original_text, rota))
+
 ####################################################
 ### SEÇÃO 3: ROTEAMENTO PRINCIPAL (O ENDPOINT /adaptar)
 ####################################################
 
+FORMATOS = ("html", "patches")
+
+# Cada perfil é um estágio que recebe (soup, config, ctx)
+PERFIS = {
+    "visual": aplicar_perfil_visual,
+    "auditivo": aplicar_perfil_auditivo,
+    "cognitivo": aplicar_perfil_cognitivo,
+}
+
+def extrair_perfis(data):
+    """
+    Lê os perfis do payload como uma lista de (perfil, config).
+    Aceita o formato combinado {"profiles": [{"profile": ..., "config": {...}}, ...]}
+    e o formato antigo {"profile": ..., "config": {...}}.
+    Cada config pode ter 'roteamento_ia' (ver roteamento_ia.validar_roteamento).
+    Lança ValueError se algum perfil ou rota for desconhecido.
+    """
+    if data.get("profiles"):
+        itens = data["profiles"]
+        if not isinstance(itens, list) or not all(isinstance(item, dict) for item in itens):
+            raise ValueError("'profiles' deve ser uma lista de objetos {\"profile\": ..., \"config\": {...}}")
+    else:
+        itens = [data]
+
+    perfis = []
+    for item in itens:
+        perfil, config = item.get("profile"), item.get("config")
+        if not isinstance(perfil, str) or perfil not in PERFIS:
+            raise ValueError(f"Perfil '{perfil}' desconhecido")
+        if config is not None and not isinstance(config, dict):
+            raise ValueError(f"A 'config' do perfil '{perfil}' deve ser um objeto")
+        config = config or {}
+        validar_roteamento(config.get("roteamento_ia"))
+        perfis.append((perfil, config))
+    return perfis
+
+def extrair_html(data):
+    """Lê o 'html_content' do payload. Lança ValueError se faltar ou não for texto."""
+    html = data.get("html_content")
+    if not html:
+        raise ValueError("Faltando 'html_content' no payload (Verifique Finished.html).")
+    if not isinstance(html, str):
+        raise ValueError("'html_content' deve ser uma string com o HTML da página")
+    return html
+
+def ler_payload():
+    """Corpo JSON da requisição como dict, ou None se não for um objeto JSON válido."""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+# Resposta para corpo ausente, que não é JSON ou não é um objeto
+ERRO_PAYLOAD = {"erro": "O corpo da requisição deve ser um objeto JSON com 'html_content'."}
+
+# Etapas medidas em cada adaptação (cabeçalho Server-Timing do /adaptar)
+ETAPAS = ("parse", "transformacoes", "ia", "serializacao")
+
+@contextmanager
+def cronometrar(tempos, etapa):
+    """
+    Registra o bloco como um span no rastro da requisição e soma o tempo em
+    tempos[etapa] (segundos). Com tempos=None, só o span é registrado.
+    """
+    inicio = time.perf_counter()
+    try:
+        with span(etapa):
+            yield
+    finally:
+        if tempos is not None:
+            tempos[etapa] = tempos.get(etapa, 0.0) + time.perf_counter() - inicio
+
+def formatar_server_timing(tempos):
+    """{'parse': 0.0123, ...} -> 'parse;dur=12.3, ...' (milissegundos, como pede o Server-Timing)."""
+    return ", ".join(f"{etapa};dur={segundos * 1000:.1f}" for etapa, segundos in tempos.items())
+
+def preparar_adaptacao(html_quebrado, perfis, registrar_patches=False, tempos=None):
+    """
+    Um único parse, correções base uma vez e todos os perfis pedidos como
+    estágios sobre o mesmo soup. As correções com IA ficam pendentes no contexto.
+    Com 'registrar_patches', cada mudança também vira uma operação de DOM
+    com seletor relativo ao documento original.
+    """
+    with cronometrar(tempos, "parse"):
+        soup = criar_soup(html_quebrado)
+
+    with cronometrar(tempos, "transformacoes"):
+        ctx = ContextoAdaptacao(soup)
+        if registrar_patches:
+            ctx.indexar_seletores()
+        aplicar_correcoes_base(soup, ctx)
+
+        for perfil, config in perfis:
+            with span("perfil", DURACAO_PERFIL, perfil=perfil):
+                PERFIS[perfil](soup, config, ctx)
+            logger.info("--- PERFIL %s APLICADO ---", perfil.upper())
+
+        # Uma única varredura do documento aplica as regras de todos os perfis
+        with span("regras", regras=len(ctx.motor_regras)):
+            ctx.aplicar_regras()
+    return ctx
+
+def concluir_adaptacao(ctx, tempos=None):
+    """Mesmo que ctx.concluir(), medindo a IA e a injeção do CSS separadamente."""
+    with cronometrar(tempos, "ia"):
+        for _ in ctx.executar_tarefas_ia():
+            pass
+    with cronometrar(tempos, "transformacoes"):
+        return ctx.finalizar()
+
+def adaptar_html(html_quebrado, perfis, tempos=None, falhas=None, adiadas=None):
+    """
+    Núcleo do /adaptar: prepara a adaptação, executa toda a IA em paralelo,
+    injeta o CSS numa única folha de estilo e serializa uma única vez.
+    Se 'tempos' for um dict, recebe a duração de cada etapa (ver ETAPAS).
+    Se 'falhas' for uma lista, recebe o tipo de cada tarefa de IA que falhou;
+    'adiadas', o das que não couberam no prazo da requisição (ver prazo.py).
+    """
+    ctx = preparar_adaptacao(html_quebrado, perfis, tempos=tempos)
+    soup_corrigido = concluir_adaptacao(ctx, tempos)
+    if falhas is not None:
+        falhas.extend(ctx.falhas_ia)
+    if adiadas is not None:
+        adiadas.extend(ctx.adiadas_ia)
+    with cronometrar(tempos, "serializacao"):
+        return str(soup_corrigido)
+
+def adaptar_em_patches(html_quebrado, perfis, tempos=None, falhas=None, adiadas=None):
+    """
+    Formato de saída "patches": em vez do HTML inteiro, retorna só a lista de
+    operações de DOM (set_attr, remove_attr, set_text, append_html, prepend_html,
+    remove, append_stylesheet com 'css' ou 'href'). Os seletores se referem ao documento enviado pelo
+    cliente; todos devem ser resolvidos antes de aplicar a primeira operação.
+    O soup não é serializado.
+    """
+    ctx = preparar_adaptacao(html_quebrado, perfis, registrar_patches=True, tempos=tempos)
+    concluir_adaptacao(ctx, tempos)
+    if falhas is not None:
+        falhas.extend(ctx.falhas_ia)
+    if adiadas is not None:
+        adiadas.extend(ctx.adiadas_ia)
+    return ctx.patches
+
+def adaptar_html_em_etapas(html_quebrado, perfis):
+    """
+    Versão em etapas do adaptar_html, para o modo streaming.
+    Gera ("html", pagina) logo com as correções sem IA (CSS, autoplay, barra...)
+    e depois ("patch", operacao) para cada resultado da IA que chegar.
+    Por último, gera ("fim", (html_completo, falhas_ia)) com a página final.
+    """
+    ctx = preparar_adaptacao(html_quebrado, perfis)
+    soup = ctx.finalizar()
+
+    # Os seletores dos patches se referem à página já enviada ao cliente
+    ctx.indexar_seletores()
+
+    yield "html", str(soup)
+    for tarefa, patch in ctx.executar_tarefas_ia():
+        yield "patch", patch
+    yield "fim", (str(soup), ctx.falhas_ia)
+
 @app.route("/adaptar", methods=["POST"])
 def handle_adaptation():
-    print("\n--- REQUISIÇÃO RECEBIDA NO ENDPOINT /adaptar ---")
+    logger.info("--- REQUISIÇÃO RECEBIDA NO ENDPOINT /adaptar ---")
     
     try:
-        data = request.json
-        perfil = data.get("profile")
-        config = data.get("config", {}) 
+        data = ler_payload()
+        if data is None:
+            return jsonify(ERRO_PAYLOAD), 400
+
+        try:
+            html_quebrado = extrair_html(data)
+            perfis = extrair_perfis(data)
+        except ValueError as e:
+            return jsonify({"erro": str(e)}), 400
+        perfil = "+".join(p for p, _ in perfis)
+
+        # "html" (padrão): página inteira; "patches": só as operações de DOM
+        formato = data.get("format", "html")
+        if formato not in FORMATOS:
+            return jsonify({"erro": f"Formato '{formato}' desconhecido (use 'html' ou 'patches')"}), 400
+
+        # Prazo da resposta: as correções sem IA sempre entram; a IA que não couber fica para depois
+        try:
+            prazo_ms = ler_prazo_ms(data.get("deadline_ms", request.headers.get("X-Deadline-Ms")))
+        except ValueError as e:
+            return jsonify({"erro": str(e)}), 400
+
+        # Cache de resposta: mesma página + perfis + configs => mesmo HTML corrigido.
+        # A chave também é a ETag, para o cliente revalidar com If-None-Match.
+        chave = gerar_chave_resposta(html_quebrado, perfis, formato)
+        if chave in request.if_none_match and cache_respostas.contem(chave):
+            logger.info("--- REQUISIÇÃO CONCLUÍDA (Perfil: %s) --- [304 Not Modified]", perfil)
+            response = make_response("", 304)
+            response.set_etag(chave)
+            return response
+
+        tempos, falhas, adiadas = {}, [], []
+        with rastrear("adaptar", perfis=perfil, formato=formato, bytes_html=len(html_quebrado)) as rastro, \
+                registrar_provisorios() as provisorios, com_prazo(prazo_ms):
+            with cronometrar(tempos, "cache"):
+                resultado = cache_respostas.obter(chave)
+            status_cache = "HIT"
+            if resultado is None:
+                status_cache = "MISS"
+                if formato == "patches":
+                    patches = adaptar_em_patches(html_quebrado, perfis, tempos, falhas, adiadas)
+                    with cronometrar(tempos, "serializacao"):
+                        resultado = json.dumps(patches, ensure_ascii=False)
+                else:
+                    resultado = adaptar_html(html_quebrado, perfis, tempos, falhas, adiadas)
+                # Página com correções de IA faltando (falhas ou fora do prazo) ou provisórias
+                # (modelo rápido) não vai para o cache: a próxima tenta de novo ou já pega a versão do Pro
+                if not falhas and not adiadas and not provisorios:
+                    cache_respostas.guardar(chave, resultado)
+            rastro.atributos["cache"] = status_cache
+        observar_etapas(tempos)
+        DURACAO_REQUISICAO.observar(sum(tempos.values()), formato=formato, cache=status_cache)
         
-        html_quebrado = data.get("html_content") 
-
-        if not html_quebrado:
-             return jsonify({"erro": "Faltando 'html_content' no payload (Verifique Finished.html)."}), 400
-
-        soup = BeautifulSoup(html_quebrado, 'html.parser') 
-        soup = aplicar_correcoes_base(soup)
-        
-        soup_corrigido = soup
-
-        # Roteamento dos Perfis
-        if perfil == "visual":
-            soup_corrigido = aplicar_perfil_visual(soup, config)
-            print(f"--- INICIANDO PERFIL VISUAL (MODULAR) ---")
-        elif perfil == "auditivo":
-            soup_corrigido = aplicar_perfil_auditivo(soup, config)
-            print(f"--- INICIANDO PERFIL AUDITIVO (MODULAR) ---\n")
-        elif perfil == "cognitivo":
-            soup_corrigido = aplicar_perfil_cognitivo(soup, config)
-            print(f"--- INICIANDO PERFIL COGNITIVO (MODULAR) ---")
-        else:
-            return jsonify({"erro": f"Perfil '{perfil}' desconhecido"}), 400
-        
-        html_corrigido = str(soup_corrigido)
-        
-        print(f"--- REQUISIÇÃO CONCLUÍDA (Perfil: {perfil}) ---")
-        return jsonify({"html_corrigido": html_corrigido})
+        logger.info("--- REQUISIÇÃO CONCLUÍDA (Perfil: %s) --- [cache %s]", perfil, status_cache)
+        corpo = {"patches": json.loads(resultado)} if formato == "patches" else {"html_corrigido": resultado}
+        if falhas:
+            corpo["falhas_ia"] = falhas
+        if adiadas:
+            # As chamadas já iniciadas terminam em segundo plano e vão para o cache de IA:
+            # repetir a requisição depois traz essas correções
+            corpo["ia_adiada"] = adiadas
+        if provisorios:
+            # Correções feitas pelo modelo rápido; a versão do Pro chega nas próximas visitas
+            corpo["ia_provisoria"] = sorted(set(provisorios))
+        response = jsonify(corpo)
+        if not falhas and not adiadas and not provisorios:
+            response.set_etag(chave)
+        response.headers["X-Cache"] = status_cache
+        response.headers["X-Rastro"] = rastro.id
+        response.headers["Server-Timing"] = formatar_server_timing(tempos)
+        return response
 
     except Exception as e:
-        # Imprime o erro no console do Flask para diagnóstico
-        print(f"ERRO 500 - FALHA GERAL NO PROCESSAMENTO: {e}")
+        # Registra o erro (com o traceback) no log do servidor para diagnóstico
+        logger.exception("ERRO 500 - FALHA GERAL NO PROCESSAMENTO: %s", e)
         return jsonify({"erro": f"Erro interno do servidor: {e}"}), 500
 
+####################################################
+### SEÇÃO 3.1: JOBS ASSÍNCRONOS (PERFIS LENTOS)
+####################################################
+
+def executar_job(payload):
+    """Executa um job da fila com a mesma lógica (e o mesmo cache) do /adaptar."""
+    html_quebrado = payload["html_content"]
+    perfis = extrair_perfis(payload)
+
+    chave = gerar_chave_resposta(html_quebrado, perfis)
+    html_corrigido = cache_respostas.obter(chave)
+    if html_corrigido is None:
+        tempos, falhas = {}, []
+        # Jobs cedem a cota da IA para as requisições interativas
+        with rastrear("job", perfis="+".join(p for p, _ in perfis)), prioridade(PRIORIDADE_FUNDO):
+            html_corrigido = adaptar_html(html_quebrado, perfis, tempos, falhas)
+        observar_etapas(tempos)
+        if not falhas:
+            cache_respostas.guardar(chave, html_corrigido)
+    return html_corrigido
+
+fila_jobs = FilaJobs(executar=executar_job)
+
+@app.route("/adaptar/jobs", methods=["POST"])
+def handle_job_submission():
+    """
+    Versão assíncrona do /adaptar: responde na hora com o id do job (202).
+    O cliente consulta GET /adaptar/jobs/<id> ou recebe o resultado em 'callback_url'.
+    """
+    data = ler_payload()
+    if data is None:
+        return jsonify(ERRO_PAYLOAD), 400
+
+    try:
+        html_quebrado = extrair_html(data)
+        perfis = extrair_perfis(data)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    perfil = "+".join(p for p, _ in perfis)
+    callback_url = data.get("callback_url")
+    if callback_url is not None:
+        try:
+            validar_callback_url(callback_url)
+        except ValueError as e:
+            return jsonify({"erro": str(e)}), 400
+
+    payload = {
+        "html_content": html_quebrado,
+        "profiles": [{"profile": p, "config": c} for p, c in perfis],
+    }
+    job_id = fila_jobs.enviar(payload, callback_url=callback_url)
+    logger.info("--- JOB %s ENFILEIRADO (Perfil: %s) ---", job_id, perfil)
+
+    status_url = f"/adaptar/jobs/{job_id}"
+    response = jsonify({"job_id": job_id, "status": "pendente", "status_url": status_url})
+    response.headers["Location"] = status_url
+    return response, 202
+
+@app.route("/adaptar/jobs/<job_id>", methods=["GET"])
+def handle_job_status(job_id):
+    estado = fila_jobs.consultar(job_id)
+    if estado is None:
+        return jsonify({"erro": f"Job '{job_id}' não encontrado"}), 404
+    return jsonify(estado)
+
+####################################################
+### SEÇÃO 3.2: MODO STREAMING (SERVER-SENT EVENTS)
+####################################################
+
+def evento_sse(evento, dados):
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+@app.route("/adaptar/stream", methods=["POST"])
+def handle_adaptation_stream():
+    """
+    Mesmo payload do /adaptar, mas a resposta é um fluxo SSE:
+    - event: html  -> {"html_corrigido": ...} com as correções imediatas (sem IA);
+    - event: patch -> {"selector", "op", ...} para cada resultado da IA;
+    - event: fim   -> {"patches": n, "falhas_ia": [tipos das tarefas de IA que falharam]};
+    - event: erro  -> {"erro": ...} se a adaptação quebrar depois de o fluxo começar.
+    A ETag só vai quando a página já está no cache de respostas: nos outros casos
+    os cabeçalhos saem antes de se saber se o resultado pode ser guardado.
+    """
+    data = ler_payload()
+    if data is None:
+        return jsonify(ERRO_PAYLOAD), 400
+
+    try:
+        html_quebrado = extrair_html(data)
+        perfis = extrair_perfis(data)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+
+    chave = gerar_chave_resposta(html_quebrado, perfis)
+    html_em_cache = cache_respostas.obter(chave)
+
+    def gerar_eventos():
+        # Página já adaptada antes: vai inteira no primeiro evento
+        if html_em_cache is not None:
+            yield evento_sse("html", {"html_corrigido": html_em_cache})
+            yield evento_sse("fim", {"patches": 0})
+            return
+
+        total_patches = 0
+        try:
+            with rastrear("stream", perfis="+".join(p for p, _ in perfis)), registrar_provisorios() as provisorios:
+                for tipo, conteudo in adaptar_html_em_etapas(html_quebrado, perfis):
+                    if tipo == "html":
+                        yield evento_sse("html", {"html_corrigido": conteudo})
+                    elif tipo == "patch":
+                        total_patches += 1
+                        yield evento_sse("patch", conteudo)
+                    else:
+                        html_final, falhas = conteudo
+                        if not falhas and not provisorios:
+                            cache_respostas.guardar(chave, html_final)
+                        yield evento_sse("fim", {"patches": total_patches, "falhas_ia": falhas,
+                                                 "ia_provisoria": sorted(set(provisorios))})
+        except Exception as e:
+            # O status 200 já foi enviado: o erro vai como evento, para o cliente não esperar à toa
+            logger.exception("ERRO NO STREAM depois de %d patches: %s", total_patches, e)
+            yield evento_sse("erro", {"erro": f"Erro interno do servidor: {e}"})
+            return
+        logger.info("--- STREAM CONCLUÍDO (%d patches) ---", total_patches)
+
+    response = Response(stream_with_context(gerar_eventos()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    if html_em_cache is not None:
+        response.set_etag(chave)
+    return response
+
+@app.route("/estaticos/<nome>", methods=["GET"])
+def handle_estatico(nome):
+    """
+    Arquivos gerados (faixas WebVTT...). O nome é o hash do conteúdo, então a
+    resposta é imutável: quem já baixou a faixa não volta ao servidor (nem à IA).
+    """
+    caminho = repositorio_estatico.caminho(nome)
+    if caminho is None:
+        return jsonify({"erro": "Arquivo não encontrado"}), 404
+    extensao = nome.rsplit('.', 1)[1]
+    response = send_file(caminho, mimetype=TIPOS_MIME.get(extensao, "application/octet-stream"),
+                         max_age=ESTATICOS_MAX_AGE, conditional=True, etag=nome)
+    response.headers["Cache-Control"] = f"public, max-age={ESTATICOS_MAX_AGE}, immutable"
+    return response
+
+@app.route("/adaptar/cache", methods=["GET"])
+def handle_cache_stats():
+    """Contadores do cache de respostas (hits, misses, tamanho)."""
+    return jsonify(cache_respostas.estatisticas())
+
+@app.route("/metrics", methods=["GET"])
+def handle_metrics():
+    """
+    Métricas no formato texto do Prometheus: histogramas de latência por etapa,
+    por perfil e por modelo de IA, bytes enviados/recebidos e consultas ao cache de IA.
+    """
+    return Response(registro_metricas.exportar(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
 
 ####################################################
 ### SEÇÃO 4: EXECUÇÃO PRINCIPAL (Para rodar o servidor)
 ####################################################
 
+def encerrar():
+    """Desligamento gracioso: para a fila de jobs (os pendentes ficam no SQLite) e apaga os vídeos enviados à IA."""
+    fila_jobs.encerrar(esperar=False)
+    roteador_ia.encerrar()
+    gerenciador_videos.encerrar()
+
+# Servidor de desenvolvimento. Em produção use o gunicorn (ver gunicorn.conf.py e wsgi.py).
+# O modo debug (debugger interativo + reloader) só liga com FLASK_DEBUG=1.
 if __name__ == "__main__":
-    print(f"Iniciando o servidor Flask em http://127.0.0.1:5000")
-    app.run(debug=True)
+    debug = os.getenv("FLASK_DEBUG", "0").lower() in ("1", "true")
+    logger.info("Iniciando o servidor Flask em http://127.0.0.1:5000 (debug=%s)", 'ligado' if debug else 'desligado')
+    app.run(debug=debug, threaded=True)
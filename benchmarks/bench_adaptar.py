@@ -0,0 +1,323 @@
+"""
+Teste de carga do /adaptar.
+
+Sobe o servidor (app.run com threads) com o provedor de IA simulado, dispara
+requisições concorrentes para cada combinação de mistura de perfis x tamanho
+de página e mede:
+  - latência p50/p95/p99 e vazão (requisições/s);
+  - divisão do tempo no servidor entre parse, transformações, IA e serialização
+    (cabeçalho Server-Timing do /adaptar);
+  - pico de memória (RSS máximo) do processo do servidor.
+O resultado vai para um JSON, que pode ser comparado com o de outra rodada.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_adaptar.py --concorrencia 8 --requisicoes 40 \\
+        --misturas css,ia,todos --tamanhos antes,1mb --saida resultado.json
+    python benchmarks/bench_adaptar.py ... --comparar resultado_anterior.json
+    python benchmarks/bench_adaptar.py --url http://127.0.0.1:5000 ...   # servidor já rodando
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Misturas de perfis: cada requisição sorteia (em rodízio) um dos payloads da mistura
+MISTURAS = {
+    "css": [
+        [{"profile": "visual", "config": {"aumentar_escala": "moderada", "daltonismo_tipo": "protanopia"}}],
+        [{"profile": "cognitivo", "config": {"destaque_botoes": True, "diminuir_espacamento": True}}],
+        [{"profile": "visual", "config": {"hipersensibilidade_visual": True}},
+         {"profile": "cognitivo", "config": {"barra_progresso": True}}],
+    ],
+    "ia": [
+        [{"profile": "visual", "config": {"cegueira_total": True}}],
+        [{"profile": "cognitivo", "config": {"simplificar_texto": True}}],
+        [{"profile": "auditivo", "config": {"transcricao_surdez": True, "desativar_autoplay": True}}],
+    ],
+    "todos": [
+        [{"profile": "visual", "config": {"aumentar_escala": "leve", "cegueira_total": True}},
+         {"profile": "auditivo", "config": {"transcricao_surdez": True}},
+         {"profile": "cognitivo", "config": {"simplificar_texto": True, "barra_progresso": True}}],
+    ],
+}
+
+ETAPAS = ("cache", "parse", "transformacoes", "ia", "serializacao")
+
+
+####################################################
+### PÁGINAS
+####################################################
+
+def gerar_pagina(tamanho):
+    """'antes' = antes.html; '1mb', '500kb'... = antes.html com o <body> repetido até o tamanho."""
+    with open(os.path.join(RAIZ, "antes.html"), encoding="utf-8") as f:
+        html = f.read()
+    if tamanho == "antes":
+        return html
+
+    numero, unidade = re.fullmatch(r"(\d+(?:\.\d+)?)(kb|mb)", tamanho.lower()).groups()
+    alvo = int(float(numero) * (1024 if unidade == "kb" else 1024 * 1024))
+    inicio = html.index(">", html.index("<body")) + 1
+    fim = html.rindex("</body>")
+    corpo = html[inicio:fim]
+    repeticoes = max(1, (alvo - len(html)) // len(corpo) + 1)
+    return html[:fim] + corpo * repeticoes + html[fim:]
+
+def variar_pagina(html, indice, ia_sem_cache):
+    """
+    Torna cada requisição única para não cair no cache de respostas.
+    Com ia_sem_cache, também muda as imagens, vídeos e o texto simplificado (cache de IA).
+    """
+    html = html.replace("</body>", f"<!-- bench {indice} --></body>", 1)
+    if ia_sem_cache:
+        html = re.sub(r'(<(?:img|source)[^>]*\ssrc="[^"?]*)', rf'\1?bench={indice}', html)
+        html = html.replace('class="lead">', f'class="lead">[{indice}] ')
+    return html
+
+
+####################################################
+### SERVIDOR
+####################################################
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def subir_servidor(porta, ambiente_extra):
+    """Sobe o app.py num processo próprio (threads, sem debug) e espera ele responder."""
+    diretorio = tempfile.mkdtemp(prefix="bench_adaptar_")
+    ambiente = dict(os.environ, PYTHONPATH=RAIZ, FLASK_DEBUG="0",
+                    IA_CACHE_CAMINHO=os.path.join(diretorio, "cache_ia.sqlite3"),
+                    JOBS_CAMINHO=os.path.join(diretorio, "jobs.sqlite3"),
+                    ESTATICOS_DIR=os.path.join(diretorio, "estaticos"))
+    ambiente.update(ambiente_extra)
+    codigo = f"from app import app; app.run(host='127.0.0.1', port={porta}, threaded=True)"
+    processo = subprocess.Popen([sys.executable, "-c", codigo], cwd=RAIZ, env=ambiente,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{porta}"
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        try:
+            requests.get(f"{url}/adaptar/cache", timeout=1)
+            return processo, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    processo.kill()
+    raise RuntimeError("O servidor não subiu em 30s")
+
+def memoria_atual_kb(pid):
+    """Pico de RSS (VmHWM) do processo, em KB. Só no Linux; None nos outros sistemas."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linha in f:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1])
+    except OSError:
+        return None
+
+def derrubar_servidor(processo):
+    """Encerra o servidor e retorna o pico de memória dele em KB (via wait4, quando disponível)."""
+    pico = memoria_atual_kb(processo.pid)
+    processo.terminate()
+    if hasattr(os, "wait4"):
+        _, _, uso = os.wait4(processo.pid, 0)
+        processo.returncode = 0
+        # ru_maxrss é em KB no Linux e em bytes no macOS
+        maximo = uso.ru_maxrss // 1024 if sys.platform == "darwin" else uso.ru_maxrss
+        pico = max(pico or 0, maximo)
+    else:
+        processo.wait()
+    return pico
+
+
+####################################################
+### CARGA
+####################################################
+
+def ler_server_timing(cabecalho):
+    """'parse;dur=12.3, ia;dur=40' -> {'parse': 12.3, 'ia': 40.0} (ms)."""
+    tempos = {}
+    for item in (cabecalho or "").split(","):
+        achado = re.match(r"\s*([\w-]+);dur=([\d.]+)", item)
+        if achado:
+            tempos[achado.group(1)] = float(achado.group(2))
+    return tempos
+
+def percentil(valores, p):
+    """Percentil por posição mais próxima (valores já ordenados)."""
+    if not valores:
+        return None
+    posicao = max(0, min(len(valores) - 1, int(round(p / 100 * len(valores) + 0.5)) - 1))
+    return valores[posicao]
+
+def executar_cenario(url, mistura, html, concorrencia, requisicoes, ia_sem_cache, deslocamento, prazo_ms=None):
+    local = threading.local()  # uma Session (conexão keep-alive) por thread
+
+    def enviar(indice):
+        if not hasattr(local, "sessao"):
+            local.sessao = requests.Session()
+        sessao = local.sessao
+        payload = {"html_content": variar_pagina(html, deslocamento + indice, ia_sem_cache),
+                   "profiles": MISTURAS[mistura][indice % len(MISTURAS[mistura])]}
+        if prazo_ms:
+            payload["deadline_ms"] = prazo_ms
+        inicio = time.perf_counter()
+        try:
+            resposta = sessao.post(f"{url}/adaptar", json=payload, timeout=300)
+            ok = resposta.status_code == 200
+            tempos = ler_server_timing(resposta.headers.get("Server-Timing"))
+            adiada = ok and bool(resposta.json().get("ia_adiada"))
+        except requests.RequestException:
+            ok, tempos, adiada = False, {}, False
+        return time.perf_counter() - inicio, ok, tempos, adiada
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        resultados = list(executor.map(enviar, range(requisicoes)))
+    duracao = time.perf_counter() - inicio
+
+    latencias = sorted(r[0] * 1000 for r in resultados if r[1])
+    erros = sum(1 for r in resultados if not r[1])
+    # Respostas que saíram no prazo sem parte das correções de IA
+    adiadas = sum(1 for r in resultados if r[3])
+    etapas = {}
+    for etapa in ETAPAS:
+        valores = [r[2][etapa] for r in resultados if r[1] and etapa in r[2]]
+        if valores:
+            etapas[etapa] = round(statistics.mean(valores), 2)
+
+    return {
+        "requisicoes": requisicoes,
+        "erros": erros,
+        "com_ia_adiada": adiadas,
+        "vazao_rps": round(len(latencias) / duracao, 2),
+        "latencia_ms": {
+            "p50": _arredondar(percentil(latencias, 50)),
+            "p95": _arredondar(percentil(latencias, 95)),
+            "p99": _arredondar(percentil(latencias, 99)),
+            "media": _arredondar(statistics.mean(latencias)) if latencias else None,
+        },
+        "servidor_ms_medio": etapas,
+    }
+
+def _arredondar(valor):
+    return None if valor is None else round(valor, 2)
+
+
+####################################################
+### RELATÓRIO
+####################################################
+
+def imprimir(resultado):
+    print(f"\nConcorrência {resultado['parametros']['concorrencia']}, "
+          f"{resultado['parametros']['requisicoes']} requisições por cenário")
+    print(f"{'cenário':<18} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'erros':>6} {'adiadas':>8}  etapas no servidor (ms)")
+    for nome, cenario in resultado["cenarios"].items():
+        lat = cenario["latencia_ms"]
+        etapas = " ".join(f"{k}={v}" for k, v in cenario["servidor_ms_medio"].items())
+        print(f"{nome:<18} {lat['p50'] or 0:>8.1f} {lat['p95'] or 0:>8.1f} {lat['p99'] or 0:>8.1f} "
+              f"{cenario['vazao_rps']:>8.1f} {cenario['erros']:>6} {cenario.get('com_ia_adiada', 0):>8}  {etapas}")
+    if resultado.get("memoria_pico_kb"):
+        print(f"Pico de memória do servidor: {resultado['memoria_pico_kb'] / 1024:.1f} MB")
+
+def comparar(atual, anterior):
+    """Variação percentual de p50/p95/vazão em relação a uma rodada anterior."""
+    print("\nComparação com a rodada anterior (positivo = mais lento / menos vazão):")
+    for nome, cenario in atual["cenarios"].items():
+        base = anterior.get("cenarios", {}).get(nome)
+        if not base:
+            continue
+        partes = []
+        for chave in ("p50", "p95"):
+            novo, velho = cenario["latencia_ms"][chave], base["latencia_ms"][chave]
+            if novo and velho:
+                partes.append(f"{chave} {100 * (novo - velho) / velho:+.1f}%")
+        if base["vazao_rps"]:
+            partes.append(f"req/s {100 * (cenario['vazao_rps'] - base['vazao_rps']) / base['vazao_rps']:+.1f}%")
+        print(f"  {nome:<18} " + ", ".join(partes))
+    if atual.get("memoria_pico_kb") and anterior.get("memoria_pico_kb"):
+        variacao = 100 * (atual["memoria_pico_kb"] - anterior["memoria_pico_kb"]) / anterior["memoria_pico_kb"]
+        print(f"  memória pico       {variacao:+.1f}%")
+
+def versao_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="servidor já rodando (sem isso, um é iniciado com o provedor simulado)")
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--requisicoes", type=int, default=40, help="requisições por cenário")
+    parser.add_argument("--misturas", default="css,ia,todos", help=f"opções: {', '.join(MISTURAS)}")
+    parser.add_argument("--tamanhos", default="antes,1mb", help="'antes' ou tamanhos como 500kb, 1mb, 4mb")
+    parser.add_argument("--ia-sem-cache", action="store_true",
+                        help="imagens/vídeos/textos únicos por requisição: toda chamada de IA é nova")
+    parser.add_argument("--latencia-ia-ms", type=float, default=300, help="latência do provedor simulado")
+    parser.add_argument("--taxa-falha-ia", type=float, default=0.0, help="falhas injetadas no provedor simulado")
+    parser.add_argument("--prazo-ms", type=int, help="prazo enviado em cada requisição (deadline_ms)")
+    parser.add_argument("--saida", help="arquivo JSON com o resultado")
+    parser.add_argument("--comparar", help="JSON de uma rodada anterior para comparar")
+    args = parser.parse_args()
+
+    misturas = args.misturas.split(",")
+    tamanhos = args.tamanhos.split(",")
+    for mistura in misturas:
+        if mistura not in MISTURAS:
+            parser.error(f"mistura '{mistura}' desconhecida")
+
+    processo = None
+    url = args.url
+    if url is None:
+        processo, url = subir_servidor(porta_livre(), {
+            "IA_PROVEDOR": "simulado",
+            "IA_SIMULADO_LATENCIA_MS": str(args.latencia_ia_ms),
+            "IA_SIMULADO_TAXA_FALHA": str(args.taxa_falha_ia),
+            # O limitador de taxa existe para a cota do Gemini; aqui mediria só a espera
+            "IA_REQUISICOES_POR_MINUTO": "1000000",
+        })
+
+    resultado = {
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git": versao_git(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("saida", "comparar")},
+        "cenarios": {},
+    }
+    try:
+        deslocamento = int(time.time())
+        for tamanho in tamanhos:
+            html = gerar_pagina(tamanho)
+            for mistura in misturas:
+                nome = f"{mistura}/{tamanho}"
+                print(f"Rodando {nome} ({len(html) / 1024:.0f} KB)...", flush=True)
+                resultado["cenarios"][nome] = executar_cenario(
+                    url, mistura, html, args.concorrencia, args.requisicoes, args.ia_sem_cache, deslocamento,
+                    args.prazo_ms)
+                deslocamento += args.requisicoes
+    finally:
+        if processo is not None:
+            resultado["memoria_pico_kb"] = derrubar_servidor(processo)
+
+    imprimir(resultado)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultado, json.load(f))
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nResultado salvo em {args.saida}")
@@ -0,0 +1,81 @@
+"""
+Benchmark de inicialização do servidor.
+
+Mede, em processos novos (sem cache de import aquecido entre rodadas):
+  - import_app: tempo para importar o app.py (o que o gunicorn faz ao subir um worker);
+  - primeira_css: import + primeira resposta do /adaptar com um perfil só de CSS;
+  - sdk_carregado: se o SDK do Gemini foi importado nesse caminho (deve ser "não").
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_inicializacao.py [--rodadas 5] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Roda num processo novo e imprime uma linha JSON com os tempos
+SCRIPT_MEDICAO = r"""
+import json, sys, time
+inicio = time.perf_counter()
+import app
+import_app = time.perf_counter() - inicio
+
+cliente = app.app.test_client()
+resposta = cliente.post("/adaptar", json={
+    "html_content": "<html><head></head><body><button>OK</button></body></html>",
+    "profiles": [
+        {"profile": "visual", "config": {"aumentar_escala": "moderada"}},
+        {"profile": "cognitivo", "config": {"destaque_botoes": True}},
+    ],
+})
+primeira_css = time.perf_counter() - inicio
+assert resposta.status_code == 200, resposta.status_code
+
+print(json.dumps({
+    "import_app": import_app,
+    "primeira_css": primeira_css,
+    "sdk_carregado": "google.generativeai" in sys.modules,
+}))
+"""
+
+
+def medir(rodadas):
+    ambiente = dict(os.environ, PYTHONPATH=RAIZ, PYTHONDONTWRITEBYTECODE="0")
+    medicoes = []
+    for _ in range(rodadas):
+        saida = subprocess.run([sys.executable, "-c", SCRIPT_MEDICAO], cwd=RAIZ, env=ambiente,
+                               capture_output=True, text=True, check=True).stdout
+        medicoes.append(json.loads(saida.strip().splitlines()[-1]))
+    return medicoes
+
+
+def resumir(medicoes):
+    resumo = {"rodadas": len(medicoes)}
+    for campo in ("import_app", "primeira_css"):
+        valores = [m[campo] * 1000 for m in medicoes]
+        resumo[campo] = {"mediana_ms": round(statistics.median(valores), 1),
+                         "min_ms": round(min(valores), 1), "max_ms": round(max(valores), 1)}
+    resumo["sdk_carregado"] = any(m["sdk_carregado"] for m in medicoes)
+    return resumo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rodadas", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="imprime o resumo em JSON")
+    args = parser.parse_args()
+
+    resumo = resumir(medir(args.rodadas))
+    if args.json:
+        print(json.dumps(resumo, indent=2))
+    else:
+        print(f"Rodadas: {resumo['rodadas']}")
+        for campo in ("import_app", "primeira_css"):
+            r = resumo[campo]
+            print(f"{campo:>14}: mediana {r['mediana_ms']:.1f} ms (min {r['min_ms']:.1f}, max {r['max_ms']:.1f})")
+        print(f"{'SDK do Gemini':>14}: {'carregado' if resumo['sdk_carregado'] else 'não carregado'}")
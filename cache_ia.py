@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from provedores_ia import IA_PROVEDOR
+from metricas import CONSULTAS_CACHE_IA, span
+from singleflight import GrupoSingleFlight
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuração pelo .env
+IA_CACHE_CAMINHO = os.getenv("IA_CACHE_CAMINHO", "cache_ia.sqlite3")
+IA_CACHE_MAX_ITENS = int(os.getenv("IA_CACHE_MAX_ITENS", "1024"))
+IA_CACHE_TTL_MEMORIA = int(os.getenv("IA_CACHE_TTL_MEMORIA", "3600"))           # 1 hora
+IA_CACHE_TTL_DISCO = int(os.getenv("IA_CACHE_TTL_DISCO", str(30 * 24 * 3600)))  # 30 dias
+IA_CACHE_MAX_LINHAS = int(os.getenv("IA_CACHE_MAX_LINHAS", "100000"))           # 0 = sem limite
+
+####################################################
+### SEÇÃO 1: CHAVE ENDEREÇADA POR CONTEÚDO
+####################################################
+
+def gerar_chave(modelo, prompt, conteudo):
+    """
+    Gera a chave do cache: hash SHA-256 de (modelo + prompt + conteúdo).
+    O conteúdo pode ser texto (str) ou bytes de mídia (imagem, vídeo).
+    Com outro provedor que não o Gemini (ex: o simulado), o nome dele também
+    entra na chave, para as respostas de teste não se misturarem com as reais.
+    """
+    h = hashlib.sha256()
+    if IA_PROVEDOR != "gemini":
+        h.update(IA_PROVEDOR.encode('utf-8'))
+        h.update(b'\0')
+    for parte in (modelo, prompt):
+        h.update(parte.encode('utf-8'))
+        h.update(b'\0')
+    if isinstance(conteudo, str):
+        conteudo = conteudo.encode('utf-8')
+    h.update(conteudo)
+    return h.hexdigest()
+
+####################################################
+### SEÇÃO 2: CACHE EM DUAS CAMADAS (MEMÓRIA + SQLITE)
+####################################################
+
+class CacheIA:
+    """
+    Cache das respostas da IA.
+    - Camada 1: LRU em memória com expiração (TTL), via cachetools.
+    - Camada 2: SQLite em disco, para o cache sobreviver a reinícios do servidor.
+      Entradas vencidas (IA_CACHE_TTL_DISCO) são apagadas e o número de linhas tem
+      limite (IA_CACHE_MAX_LINHAS): a poda roda na inicialização e depois a cada
+      10% do limite em gravações, não a cada gravação.
+    """
+
+    def __init__(self, caminho=IA_CACHE_CAMINHO, max_itens=IA_CACHE_MAX_ITENS,
+                 ttl_memoria=IA_CACHE_TTL_MEMORIA, ttl_disco=IA_CACHE_TTL_DISCO, max_linhas=IA_CACHE_MAX_LINHAS):
+        self.caminho = caminho
+        self.ttl_disco = ttl_disco
+        self.max_linhas = max_linhas
+        self._memoria = TTLCache(maxsize=max_itens, ttl=ttl_memoria)
+        self._lock = threading.Lock()
+        self._em_andamento = GrupoSingleFlight()
+        self._intervalo_poda = max(1, max_linhas // 10) if max_linhas else 1000
+        self._desde_poda = 0
+
+        with self._conectar() as conexao:
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS respostas_ia ("
+                " chave TEXT PRIMARY KEY, valor TEXT NOT NULL, criado_em REAL NOT NULL)"
+            )
+            conexao.execute("CREATE INDEX IF NOT EXISTS respostas_ia_criado_em ON respostas_ia (criado_em)")
+        self._podar()
+
+    def _conectar(self):
+        # Uma conexão por operação: o sqlite3 não compartilha conexões entre threads
+        return sqlite3.connect(self.caminho, timeout=5)
+
+    def obter(self, chave):
+        """Procura a chave na memória e depois no disco. Retorna None se não houver."""
+        with self._lock:
+            valor = self._memoria.get(chave)
+        if valor is not None:
+            CONSULTAS_CACHE_IA.incrementar(camada="memoria")
+            return valor
+
+        with self._conectar() as conexao:
+            linha = conexao.execute(
+                "SELECT valor FROM respostas_ia WHERE chave = ? AND criado_em >= ?",
+                (chave, time.time() - self.ttl_disco),
+            ).fetchone()
+        if linha is None:
+            CONSULTAS_CACHE_IA.incrementar(camada="ausente")
+            return None
+
+        CONSULTAS_CACHE_IA.incrementar(camada="disco")
+        # Promove para a memória: a próxima leitura não toca no disco
+        with self._lock:
+            self._memoria[chave] = linha[0]
+        return linha[0]
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._memoria[chave] = valor
+        with self._conectar() as conexao:
+            conexao.execute(
+                "INSERT OR REPLACE INTO respostas_ia (chave, valor, criado_em) VALUES (?, ?, ?)",
+                (chave, valor, time.time()),
+            )
+        with self._lock:
+            self._desde_poda += 1
+            podar = self._desde_poda >= self._intervalo_poda
+            if podar:
+                self._desde_poda = 0
+        if podar:
+            self._podar()
+
+    def _podar(self, alvo=0.9):
+        """
+        Apaga do disco as entradas vencidas e, se passar de max_linhas, as mais
+        antigas até ficar em 'alvo' do limite. Retorna quantas linhas apagou.
+        """
+        with self._conectar() as conexao:
+            apagadas = conexao.execute(
+                "DELETE FROM respostas_ia WHERE criado_em < ?", (time.time() - self.ttl_disco,)
+            ).rowcount
+            if self.max_linhas:
+                total = conexao.execute("SELECT COUNT(*) FROM respostas_ia").fetchone()[0]
+                if total > self.max_linhas:
+                    apagadas += conexao.execute(
+                        "DELETE FROM respostas_ia WHERE chave IN"
+                        " (SELECT chave FROM respostas_ia ORDER BY criado_em LIMIT ?)",
+                        (total - int(self.max_linhas * alvo),),
+                    ).rowcount
+        if apagadas:
+            logger.info("Poda do cache de IA: %d entradas apagadas do disco.", apagadas)
+        return apagadas
+
+    def chamar(self, modelo, prompt, conteudo, funcao, timeout=None):
+        """
+        Retorna a resposta em cache para (modelo, prompt, conteudo) ou executa `funcao()`.
+        Pedidos iguais ao mesmo tempo (ex: a mesma imagem em várias requisições)
+        dividem uma única chamada (single-flight); cada um espera no máximo
+        `timeout` segundos (padrão IA_SINGLEFLIGHT_ESPERA) e recebe EsperaEsgotada.
+        Se `funcao` lançar exceção, nada é guardado: falhas não ficam no cache.
+        """
+        chave = gerar_chave(modelo, prompt, conteudo)
+        with span("cache_ia", modelo=modelo) as atributos:
+            valor = self.obter(chave)
+            atributos["resultado"] = "hit" if valor is not None else "miss"
+        if valor is not None:
+            logger.debug("Cache IA: HIT (%s)", modelo)
+            return valor
+        return self._em_andamento.executar(chave, lambda: self._gerar_e_guardar(chave, funcao), timeout)
+
+    def chamar_varios(self, modelo, prompt, conteudos, funcao_lote, timeout=None):
+        """
+        Versão em lote de chamar(): cada conteúdo tem a mesma chave do pedido
+        individual. `funcao_lote(indices)` gera, num único pedido, as respostas dos
+        conteudos[i] que não estão no cache nem em andamento em outra requisição.
+        Retorna as respostas na ordem de `conteudos`.
+        """
+        chaves = [gerar_chave(modelo, prompt, conteudo) for conteudo in conteudos]
+        valores = [self.obter(chave) for chave in chaves]
+        faltando = [i for i, valor in enumerate(valores) if valor is None]
+        if not faltando:
+            return valores
+
+        posicao = {}
+        for i in faltando:
+            posicao.setdefault(chaves[i], i)
+
+        def _gerar(chaves_livres):
+            novos = funcao_lote([posicao[chave] for chave in chaves_livres])
+            for chave, valor in zip(chaves_livres, novos):
+                self.guardar(chave, valor)
+            return novos
+
+        novos = self._em_andamento.executar_varios([chaves[i] for i in faltando], _gerar, timeout)
+        for i, valor in zip(faltando, novos):
+            valores[i] = valor
+        return valores
+
+    def _gerar_e_guardar(self, chave, funcao):
+        # Outra requisição pode ter guardado a resposta entre a consulta e o início da chamada
+        with self._lock:
+            valor = self._memoria.get(chave)
+        if valor is None:
+            valor = funcao()
+            self.guardar(chave, valor)
+        return valor
+
+
+# Instância única do processo, usada por app.py e adaptador.py
+cache_ia = CacheIA()
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import threading
+from cachetools import LRUCache
+from dotenv import load_dotenv
+from estaticos import repositorio_estatico
+
+load_dotenv()
+
+# Limite total do cache, medido pelo tamanho do HTML guardado
+RESPOSTAS_CACHE_MAX_BYTES = int(os.getenv("RESPOSTAS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+def normalizar_config(config):
+    """
+    Canoniza o 'config' de um perfil para a chave do cache.
+    Opções desligadas (None, False, "") equivalem a opções ausentes,
+    e as chaves são ordenadas para que a ordem no JSON não importe.
+    """
+    config_limpo = {k: v for k, v in (config or {}).items() if v not in (None, False, "")}
+    return json.dumps(config_limpo, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+def gerar_chave_resposta(html_content, perfis, formato="html"):
+    """
+    Digest de (hash do HTML, [(perfil, config normalizado), ...], formato). Também serve de ETag.
+    A ordem dos perfis faz parte da chave, pois define a ordem do CSS injetado.
+    """
+    h = hashlib.sha256()
+    h.update(hashlib.sha256(html_content.encode('utf-8')).digest())
+    for perfil, config in perfis:
+        h.update(json.dumps(perfil).encode('utf-8'))
+        h.update(normalizar_config(config).encode('utf-8'))
+    if formato != "html":
+        h.update(formato.encode('utf-8'))
+    return h.hexdigest()
+
+
+class CacheRespostas:
+    """
+    Cache LRU das respostas do /adaptar (HTML corrigido ou lista de patches em JSON),
+    limitado pelo total de bytes.
+    Com 'validar', uma entrada só é servida se validar(html) for verdadeiro; senão
+    é descartada e conta como falha (ex: o CSS ou a faixa WebVTT citados saíram na poda).
+    Conta acertos (hits) e falhas (misses) para diagnóstico.
+    """
+
+    def __init__(self, max_bytes=RESPOSTAS_CACHE_MAX_BYTES, validar=None):
+        self._itens = LRUCache(maxsize=max_bytes, getsizeof=lambda html: len(html.encode('utf-8')))
+        self._lock = threading.Lock()
+        self._validar = validar
+        self.hits = 0
+        self.misses = 0
+
+    def _valido(self, chave, html):
+        """Confere a entrada fora do lock (toca o disco) e a descarta se não valer mais."""
+        if html is None or self._validar is None or self._validar(html):
+            return html
+        with self._lock:
+            if self._itens.get(chave) is html:
+                del self._itens[chave]
+        return None
+
+    def obter(self, chave):
+        with self._lock:
+            html = self._itens.get(chave)
+        html = self._valido(chave, html)
+        with self._lock:
+            if html is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return html
+
+    def contem(self, chave):
+        with self._lock:
+            html = self._itens.get(chave)
+        return self._valido(chave, html) is not None
+
+    def guardar(self, chave, html):
+        with self._lock:
+            try:
+                self._itens[chave] = html
+            except ValueError:
+                # Resposta maior que o cache inteiro: não é guardada
+                pass
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "itens": len(self._itens),
+                "bytes": self._itens.currsize,
+                "max_bytes": self._itens.maxsize,
+            }
+
+
+# Instância única do processo
+cache_respostas = CacheRespostas(validar=repositorio_estatico.referencias_presentes)
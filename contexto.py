@@ -0,0 +1,188 @@
+import functools
+from paralelo import executar_em_paralelo
+from lotes_ia import agrupar_em_lotes, executar_lote
+from regras import MotorRegras
+from patches import gerar_seletor, indexar_seletores, patch_folha_estilo
+from pacotes_css import CSS_MODO, compilar_css, registro_css
+from metricas import span
+from prazo import PrazoEsgotado, prazo_atual
+
+
+class TarefaIA:
+    """
+    Uma correção que depende da IA, separada do resto do perfil para poder
+    rodar em paralelo com as demais (ou depois, no modo streaming).
+    - gerar(): faz a chamada à IA e retorna o texto.
+    - aplicar(resultado): escreve o resultado no soup e retorna o patch equivalente
+      (ou uma lista de (elemento, patch), se mexer em mais de um elemento).
+      Não é chamado se gerar() retornar None (a IA falhou) ou lançar PrazoEsgotado (adiada).
+    - gerar_lote(entradas) (opcional): gera os resultados de várias tarefas do mesmo
+      tipo num único pedido. Tarefas com o mesmo gerar_lote são agrupadas.
+    """
+
+    def __init__(self, tipo, elemento, gerar, aplicar, entrada=None, gerar_lote=None):
+        self.tipo = tipo
+        self.elemento = elemento
+        self.gerar = gerar
+        self.aplicar = aplicar
+        self.entrada = entrada
+        self.gerar_lote = gerar_lote
+
+
+class ContextoAdaptacao:
+    """
+    Estado compartilhado de uma adaptação com vários perfis.
+    Todos os perfis trabalham sobre o mesmo soup (um único parse), e o CSS que
+    cada um gera é acumulado aqui para virar uma única folha de estilo no final
+    (um <link> para o pacote CSS estático ou, com CSS_MODO=inline, uma <style>).
+    As correções de DOM são regras no 'motor_regras' (uma única varredura para
+    todos os perfis) e as correções com IA ficam pendentes em 'tarefas_ia' até executar_tarefas_ia().
+    Com os patches ativados, cada mudança no soup também é registrada como uma
+    operação de DOM em 'patches', para o cliente aplicar sem recarregar a página.
+    Tarefas de IA que falharam ficam em 'falhas_ia' (pelo tipo) e as que não couberam
+    no prazo da requisição (ver prazo.py) em 'adiadas_ia': a página sai sem elas e
+    não deve ir para o cache de respostas.
+    """
+
+    def __init__(self, soup):
+        self.soup = soup
+        self.estilos = []
+        self.tarefas_ia = []
+        self.motor_regras = MotorRegras()
+        self.correcoes_base_aplicadas = False
+        self.patches = []
+        self.falhas_ia = []
+        self.adiadas_ia = []
+        self._seletores = None
+
+    def indexar_seletores(self):
+        """
+        Ativa o registro de patches. Os seletores passam a se referir ao soup
+        como ele está agora (o cliente deve resolver todos antes de aplicar).
+        """
+        self._seletores = indexar_seletores(self.soup)
+
+    def registrar_patch(self, elemento, patch):
+        """Registra a operação feita em 'elemento' (se os patches estiverem ativos)."""
+        if self._seletores is None:
+            return patch
+        if elemento is not None:
+            patch["selector"] = self._seletores.get(id(elemento)) or gerar_seletor(elemento)
+        self.patches.append(patch)
+        return patch
+
+    def adicionar_estilos(self, css):
+        """Acumula CSS de um perfil. Blocos idênticos só entram uma vez."""
+        if css and css not in self.estilos:
+            self.estilos.append(css)
+
+    def registrar_regra(self, nome, tags, acao, condicao=None, limite=None):
+        """Registra uma correção de DOM para a varredura única (ver regras.MotorRegras)."""
+        return self.motor_regras.registrar(nome, tags, acao, condicao, limite)
+
+    def aplicar_regras(self):
+        """Percorre o documento uma vez aplicando todas as regras registradas."""
+        return self.motor_regras.aplicar(self.soup)
+
+    def agendar_ia(self, tarefa):
+        self.tarefas_ia.append(tarefa)
+
+    def executar_tarefas_ia(self):
+        """
+        Roda todas as tarefas de IA pendentes em paralelo e aplica cada resultado
+        no soup assim que chega. Tarefas que aceitam lote (ex: alt text) são
+        agrupadas em pedidos com várias entradas. Gera (tarefa, patch) na ordem de conclusão
+        (uma tarefa que mexe em vários elementos gera um par para cada patch).
+        Com prazo, as tarefas que não terminarem a tempo vão para 'adiadas_ia'.
+        """
+        tarefas, self.tarefas_ia = self.tarefas_ia, []
+
+        unidades, grupos = [], {}
+        for tarefa in tarefas:
+            if tarefa.gerar_lote is None:
+                unidades.append([tarefa])
+            else:
+                grupos.setdefault(tarefa.gerar_lote, []).append(tarefa)
+        for grupo in grupos.values():
+            unidades.extend(agrupar_em_lotes(grupo))
+
+        prazo = prazo_atual()
+        timeout = prazo.restante_ia() if prazo is not None else None
+        pendentes = {id(unidade): unidade for unidade in unidades}
+        for unidade, resultados in executar_em_paralelo(unidades, _executar_unidade, timeout=timeout):
+            del pendentes[id(unidade)]
+            for tarefa, resultado in zip(unidade, resultados):
+                if resultado is _ADIADA:
+                    self.adiadas_ia.append(tarefa.tipo)
+                    continue
+                if resultado is None:
+                    self.falhas_ia.append(tarefa.tipo)
+                    continue
+                aplicado = tarefa.aplicar(resultado)
+                operacoes = aplicado if isinstance(aplicado, list) else [(tarefa.elemento, aplicado)]
+                for elemento, patch in operacoes:
+                    yield tarefa, self.registrar_patch(elemento, patch)
+        # Unidades que não voltaram: cortadas pelo prazo (adiadas) ou que lançaram exceção
+        sem_tempo = prazo is not None and prazo.esgotado()
+        for unidade in pendentes.values():
+            for tarefa in unidade:
+                (self.adiadas_ia if sem_tempo else self.falhas_ia).append(tarefa.tipo)
+
+    def finalizar(self):
+        """
+        Injeta todo o CSS acumulado no <head>: um <link> para o pacote da combinação
+        de perfis (compilado uma vez e servido como imutável) ou uma única <style>.
+        """
+        head = self.soup.find('head')
+        if head and self.estilos:
+            if CSS_MODO == "inline":
+                style_tag = self.soup.new_tag('style')
+                style_tag.string = compilar_css(*self.estilos)
+                head.append(style_tag)
+                self.registrar_patch(None, patch_folha_estilo(css=style_tag.string))
+            else:
+                url = registro_css.publicar(self.estilos)
+                head.append(self.soup.new_tag('link', rel='stylesheet', href=url))
+                self.registrar_patch(None, patch_folha_estilo(href=url))
+        self.estilos = []
+        return self.soup
+
+    def concluir(self):
+        """Aplica as regras, executa a IA pendente e injeta o CSS: o soup fica pronto para serializar."""
+        self.aplicar_regras()
+        for _ in self.executar_tarefas_ia():
+            pass
+        return self.finalizar()
+
+
+# Resultado de uma tarefa que não coube no prazo da requisição
+_ADIADA = object()
+
+def _executar_unidade(unidade):
+    """Executa uma tarefa sozinha ou um lote de tarefas do mesmo tipo."""
+    with span("tarefa_ia", tipo=unidade[0].tipo, itens=len(unidade)) as atributos:
+        try:
+            return executar_lote(
+                unidade,
+                lambda lote: lote[0].gerar_lote([tarefa.entrada for tarefa in lote]),
+                lambda tarefa: tarefa.gerar(),
+            )
+        except PrazoEsgotado:
+            atributos["adiada"] = True
+            return [_ADIADA] * len(unidade)
+
+
+def estagio_de_perfil(perfil):
+    """
+    Decorador dos perfis (soup, config, ctx=None).
+    Dentro de um pipeline, o perfil só acumula CSS e agenda a IA no contexto.
+    Chamado isolado (sem ctx), cria o próprio contexto e conclui a adaptação.
+    """
+    @functools.wraps(perfil)
+    def executar(soup, config, ctx=None):
+        if ctx is not None:
+            return perfil(soup, config, ctx)
+        ctx = ContextoAdaptacao(soup)
+        perfil(soup, config, ctx)
+        return ctx.concluir()
+    return executar
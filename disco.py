@@ -0,0 +1,76 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Arquivos temporários de gravação (tempfile.mkstemp) ficam fora da poda
+PREFIXO_TEMPORARIO = "tmp"
+
+
+def tocar(caminho):
+    """Atualiza o mtime de um arquivo lido: a poda apaga primeiro os usados há mais tempo."""
+    try:
+        os.utime(caminho)
+    except OSError:
+        pass
+
+def podar_diretorio(diretorio, max_bytes, alvo=0.9):
+    """
+    Se o diretório passar de 'max_bytes', apaga os arquivos com o mtime mais
+    antigo (LRU, com tocar() a cada leitura) até ficar em 'alvo' do limite.
+    Retorna quantos arquivos apagou.
+    """
+    arquivos, total = [], 0
+    try:
+        with os.scandir(diretorio) as entradas:
+            for entrada in entradas:
+                if not entrada.is_file() or entrada.name.startswith(PREFIXO_TEMPORARIO):
+                    continue
+                try:
+                    info = entrada.stat()
+                except OSError:
+                    continue
+                arquivos.append((info.st_mtime, info.st_size, entrada.path))
+                total += info.st_size
+    except FileNotFoundError:
+        return 0
+    if total <= max_bytes:
+        return 0
+
+    apagados = 0
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= max_bytes * alvo:
+            break
+        try:
+            os.remove(caminho)
+        except OSError:
+            continue
+        total -= tamanho
+        apagados += 1
+    logger.info("Poda de %s: %d arquivos apagados (%.1f MB restantes).", diretorio, apagados, total / 1024 / 1024)
+    return apagados
+
+
+class LimiteDiretorio:
+    """
+    Limite de bytes de um diretório de cache. Quem grava chama gravou(tamanho);
+    a varredura (podar_diretorio) só roda na primeira gravação e depois a cada
+    10% do limite gravado, não a cada arquivo. max_bytes=0 desliga o limite.
+    """
+
+    def __init__(self, diretorio, max_bytes):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self._desde_poda = max_bytes  # a primeira gravação já confere o que ficou de antes
+        self._lock = threading.Lock()
+
+    def gravou(self, tamanho):
+        if not self.max_bytes:
+            return
+        with self._lock:
+            self._desde_poda += tamanho
+            if self._desde_poda < self.max_bytes / 10:
+                return
+            self._desde_poda = 0
+        podar_diretorio(self.diretorio, self.max_bytes)
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import re
+import tempfile
+from dotenv import load_dotenv
+from disco import LimiteDiretorio, tocar
+
+load_dotenv()
+
+# Configuração pelo .env
+ESTATICOS_DIR = os.getenv("ESTATICOS_DIR", "estaticos")
+# Prefixo das URLs geradas. O padrão é relativo à raiz ('/estaticos/...'). Se a página
+# adaptada for exibida em outra origem (ex: pela extensão), use a URL completa:
+# https://api.exemplo.com/estaticos (nunca é montada a partir do cabeçalho Host)
+ESTATICOS_URL_BASE = os.getenv("ESTATICOS_URL_BASE", "/estaticos").rstrip("/")
+# Os arquivos nunca mudam (o nome é o hash do conteúdo): o navegador pode guardar por 1 ano
+ESTATICOS_MAX_AGE = int(os.getenv("ESTATICOS_MAX_AGE", str(365 * 24 * 3600)))
+# Tamanho máximo do diretório: passando disso, saem os arquivos usados há mais tempo (0 = sem limite)
+ESTATICOS_MAX_BYTES = int(os.getenv("ESTATICOS_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_NOME_VALIDO = re.compile(r'^[0-9a-f]{16,64}\.[a-z0-9]+$')
+
+TIPOS_MIME = {
+    "vtt": "text/vtt",
+    "css": "text/css",
+}
+
+
+class RepositorioEstatico:
+    """
+    Arquivos gerados pelo servidor (faixas WebVTT, CSS...) endereçados pelo conteúdo:
+    o nome é o SHA-256 dos bytes, então o mesmo conteúdo vira sempre a mesma URL
+    e pode ser servido como imutável (Cache-Control de longa duração).
+    O diretório tem limite de bytes (ESTATICOS_MAX_BYTES): faixas provisórias e
+    combinações de CSS que ninguém mais pede saem primeiro (cada gravação e cada
+    leitura renovam o mtime). Um arquivo apagado volta na próxima publicação;
+    respostas em cache que apontam para ele são descartadas (referencias_presentes).
+    """
+
+    def __init__(self, diretorio=ESTATICOS_DIR, url_base=ESTATICOS_URL_BASE, max_bytes=ESTATICOS_MAX_BYTES):
+        self.diretorio = diretorio
+        self.url_base = url_base
+        self._limite = LimiteDiretorio(diretorio, max_bytes)
+        self._referencia = re.compile(re.escape(url_base) + r'/([0-9a-f]{16,64}\.[a-z0-9]+)')
+
+    def guardar(self, conteudo, extensao):
+        """Grava o conteúdo (se ainda não existir) e retorna o nome do arquivo."""
+        if isinstance(conteudo, str):
+            conteudo = conteudo.encode('utf-8')
+        nome = f"{hashlib.sha256(conteudo).hexdigest()[:32]}.{extensao}"
+        caminho = os.path.join(self.diretorio, nome)
+        if os.path.exists(caminho):
+            tocar(caminho)
+        else:
+            os.makedirs(self.diretorio, exist_ok=True)
+            # Grava em arquivo temporário e troca de uma vez: nunca se serve arquivo pela metade
+            fd, temporario = tempfile.mkstemp(dir=self.diretorio)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(conteudo)
+            os.replace(temporario, caminho)
+            self._limite.gravou(len(conteudo))
+        return nome
+
+    def url(self, nome):
+        """
+        URL pública do arquivo: sempre ESTATICOS_URL_BASE + nome. Não depende da
+        requisição (Host), então /adaptar e os jobs geram a mesma página para a
+        mesma chave do cache de respostas.
+        """
+        return f"{self.url_base}/{nome}"
+
+    def publicar(self, conteudo, extensao):
+        """guardar() + url(): retorna a URL pública do conteúdo."""
+        return self.url(self.guardar(conteudo, extensao))
+
+    def caminho(self, nome):
+        """Caminho local de um arquivo, ou None se o nome for inválido ou não existir."""
+        if not _NOME_VALIDO.match(nome):
+            return None
+        caminho = os.path.join(self.diretorio, nome)
+        if not os.path.isfile(caminho):
+            return None
+        tocar(caminho)
+        return caminho
+
+    def referencias_presentes(self, texto):
+        """
+        True se todos os arquivos deste repositório citados em 'texto' (uma página
+        ou patches do cache de respostas) ainda existem. Renova o mtime deles, então
+        os arquivos de páginas servidas do cache não saem na poda.
+        """
+        return all(self.caminho(nome) is not None for nome in set(self._referencia.findall(texto)))
+
+
+# Instância única do processo
+repositorio_estatico = RepositorioEstatico()
@@ -0,0 +1,39 @@
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuração do gunicorn (lida automaticamente pelo `gunicorn wsgi:app`).
+# Cada worker é um processo (usa um núcleo para o parse do HTML); dentro dele,
+# as threads atendem várias requisições ao mesmo tempo enquanto outras esperam a IA.
+
+bind = os.getenv("SERVIDOR_ENDERECO", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv("SERVIDOR_WORKERS", str(multiprocessing.cpu_count())))
+worker_class = "gthread"
+threads = int(os.getenv("SERVIDOR_THREADS", "8"))
+
+# Um worker que não responde por 'timeout' segundos é reiniciado. O /adaptar com
+# vídeo pode levar minutos: para esses casos use /adaptar/jobs ou /adaptar/stream.
+timeout = int(os.getenv("SERVIDOR_TIMEOUT", "180"))
+# No desligamento (SIGTERM), os workers têm este tempo para terminar as requisições em andamento
+graceful_timeout = int(os.getenv("SERVIDOR_TIMEOUT_DESLIGAMENTO", "30"))
+keepalive = int(os.getenv("SERVIDOR_KEEPALIVE", "5"))
+
+# Reinicia cada worker depois de N requisições (com variação, para não reiniciarem juntos):
+# limita o crescimento de memória dos caches e do parser. 0 desliga.
+max_requests = int(os.getenv("SERVIDOR_MAX_REQUISICOES", "1000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("SERVIDOR_LOG", "info")
+
+
+def worker_exit(server, worker):
+    """Desligamento gracioso do worker: fila de jobs e vídeos na IA."""
+    try:
+        from app import encerrar
+        encerrar()
+    except Exception as e:
+        server.log.warning(f"Falha ao encerrar o worker {worker.pid}: {e}")
@@ -0,0 +1,152 @@
+import hashlib
+import io
+import logging
+import os
+from dotenv import load_dotenv
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow é opcional: sem ele, as imagens seguem como vieram
+    Image = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuração pelo .env
+IMAGEM_MAX_DIMENSAO = int(os.getenv("IMAGEM_MAX_DIMENSAO", "768"))
+IMAGEM_QUALIDADE = int(os.getenv("IMAGEM_QUALIDADE", "80"))
+# Distância de Hamming máxima (em 64 bits) para duas imagens contarem como a mesma
+IMAGEM_DISTANCIA_MAX = int(os.getenv("IMAGEM_DISTANCIA_MAX", "4"))
+# Diferença máxima (0-255, por canal) entre as miniaturas em cores de duas imagens da mesma página
+IMAGEM_COR_TOLERANCIA = int(os.getenv("IMAGEM_COR_TOLERANCIA", "8"))
+
+
+class ImagemPreparada:
+    """
+    Imagem pronta para a IA: bytes reduzidos, tipo MIME, 'hash' e 'chave_cache'.
+    O hash é perceptual ("dhash:...") quando o Pillow está disponível, então
+    a mesma foto em tamanhos diferentes (srcset, ?w=500 / ?w=700) tem o mesmo hash.
+    Sozinho ele não basta: imagens lisas, em branco ou com degradês simples têm
+    dHash 0...0. Por isso a imagem leva também uma miniatura 8x8 em cores e a
+    proporção: a página só junta imagens com miniaturas parecidas (mesma_imagem),
+    e o cache de IA persistente usa a 'chave_cache' (dHash + assinatura da miniatura).
+    """
+
+    def __init__(self, dados, mime_type, hash_imagem, miniatura=None, proporcao=None):
+        self.dados = dados
+        self.mime_type = mime_type
+        self.hash = hash_imagem
+        self.miniatura = miniatura
+        self.proporcao = proporcao
+        self.chave_cache = hash_imagem
+        if miniatura is not None:
+            self.chave_cache = f"{hash_imagem}:{calcular_assinatura(miniatura, proporcao)}"
+
+    def como_part(self):
+        """Formato de 'part' do Gemini."""
+        return {"mime_type": self.mime_type, "data": self.dados}
+
+
+def calcular_dhash(imagem, tamanho=8):
+    """
+    Hash perceptual por diferença (dHash) de 64 bits: reduz a imagem para
+    9x8 em tons de cinza e compara cada pixel com o vizinho da direita.
+    """
+    pequena = imagem.convert('L').resize((tamanho + 1, tamanho), Image.Resampling.LANCZOS)
+    pixels = list(pequena.getdata())
+    bits = 0
+    for linha in range(tamanho):
+        for coluna in range(tamanho):
+            esquerda = pixels[linha * (tamanho + 1) + coluna]
+            direita = pixels[linha * (tamanho + 1) + coluna + 1]
+            bits = (bits << 1) | (esquerda > direita)
+    return f"{bits:016x}"
+
+def calcular_miniatura(imagem, tamanho=8):
+    """Miniatura 8x8 em cores (bytes RGB) e proporção da imagem, com uma casa decimal."""
+    largura, altura = imagem.size
+    miniatura = imagem.convert('RGB').resize((tamanho, tamanho), Image.Resampling.BOX)
+    return miniatura.tobytes(), f"{largura / max(altura, 1):.1f}"
+
+def calcular_assinatura(miniatura, proporcao):
+    """
+    Assinatura do conteúdo para o cache de IA: a miniatura com 4 bits por
+    canal, mais a proporção. Variantes de tamanho da mesma foto costumam ter
+    a mesma assinatura; imagens lisas de cores ou formatos diferentes, não.
+    """
+    cores = bytes(canal >> 4 for canal in miniatura)
+    return hashlib.sha256(cores + proporcao.encode()).hexdigest()[:16]
+
+def distancia_hash(hash_a, hash_b):
+    """Distância de Hamming entre dois dHash. Hashes de outro tipo só são iguais ou não."""
+    if not (hash_a.startswith("dhash:") and hash_b.startswith("dhash:")):
+        return 0 if hash_a == hash_b else 64
+    return bin(int(hash_a[6:], 16) ^ int(hash_b[6:], 16)).count("1")
+
+def mesma_imagem(a, b, distancia_max=IMAGEM_DISTANCIA_MAX, tolerancia=IMAGEM_COR_TOLERANCIA):
+    """
+    Duas ImagemPreparada são a mesma imagem (em tamanhos ou compressões diferentes)
+    se os dHash estão a até 'distancia_max' bits, a proporção é a mesma e nenhum
+    canal das miniaturas difere mais que 'tolerancia'.
+    """
+    if distancia_hash(a.hash, b.hash) > distancia_max:
+        return False
+    if a.miniatura is None or b.miniatura is None:
+        return a.miniatura is None and b.miniatura is None
+    if a.proporcao != b.proporcao:
+        return False
+    return max(abs(x - y) for x, y in zip(a.miniatura, b.miniatura)) <= tolerancia
+
+def preparar_imagem(dados, mime_type, max_dimensao=IMAGEM_MAX_DIMENSAO):
+    """
+    Decodifica, corrige a orientação, reduz para no máximo 'max_dimensao' pixels
+    no maior lado e recodifica em JPEG. Se o Pillow não estiver instalado ou
+    a imagem não puder ser lida, devolve os bytes originais com hash SHA-256.
+    """
+    if Image is None:
+        return ImagemPreparada(dados, mime_type, "sha256:" + hashlib.sha256(dados).hexdigest())
+
+    try:
+        imagem = Image.open(io.BytesIO(dados))
+        imagem.draft('RGB', (max_dimensao, max_dimensao))  # JPEG: decodifica já reduzido
+        imagem = ImageOps.exif_transpose(imagem)
+        hash_imagem = "dhash:" + calcular_dhash(imagem)
+        miniatura, proporcao = calcular_miniatura(imagem)
+
+        if imagem.mode in ('RGBA', 'LA', 'P'):
+            imagem = imagem.convert('RGBA')
+            fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+            fundo.paste(imagem, mask=imagem.getchannel('A'))
+            imagem = fundo
+        else:
+            imagem = imagem.convert('RGB')
+        imagem.thumbnail((max_dimensao, max_dimensao), Image.Resampling.LANCZOS)
+
+        saida = io.BytesIO()
+        imagem.save(saida, 'JPEG', quality=IMAGEM_QUALIDADE, optimize=True)
+        reduzida = saida.getvalue()
+    except Exception as e:
+        logger.warning("Não foi possível reduzir a imagem (%s). Enviando a original.", e)
+        return ImagemPreparada(dados, mime_type, "sha256:" + hashlib.sha256(dados).hexdigest())
+
+    # Se a recodificação não ajudou (imagem já pequena), manda a original
+    if len(reduzida) >= len(dados):
+        return ImagemPreparada(dados, mime_type, hash_imagem, miniatura, proporcao)
+    return ImagemPreparada(reduzida, 'image/jpeg', hash_imagem, miniatura, proporcao)
+
+def agrupar_semelhantes(itens, imagem_de):
+    """
+    Agrupa itens com imagens quase idênticas (ver mesma_imagem).
+    Retorna uma lista de grupos; o primeiro item de cada grupo é o representante.
+    """
+    grupos = []
+    for item in itens:
+        imagem = imagem_de(item)
+        for grupo in grupos:
+            if mesma_imagem(imagem_de(grupo[0]), imagem):
+                grupo.append(item)
+                break
+        else:
+            grupos.append([item])
+    return grupos
@@ -0,0 +1,252 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuração pelo .env
+JOBS_CAMINHO = os.getenv("JOBS_CAMINHO", "jobs.sqlite3")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_RETENCAO = int(os.getenv("JOBS_RETENCAO", str(24 * 3600)))  # jobs finalizados ficam 1 dia
+JOBS_CALLBACK_TIMEOUT = float(os.getenv("JOBS_CALLBACK_TIMEOUT", "10"))
+# Hosts aceitos no callback_url, separados por vírgula (vazio = qualquer host)
+JOBS_CALLBACK_HOSTS = {h.strip().lower() for h in os.getenv("JOBS_CALLBACK_HOSTS", "").split(",") if h.strip()}
+# Jobs em execução têm o 'atualizado_em' renovado a cada JOBS_BATIMENTO segundos;
+# um job 'processando' sem batimento há JOBS_ABANDONO segundos é de um processo que morreu
+JOBS_BATIMENTO = float(os.getenv("JOBS_BATIMENTO", "30"))
+JOBS_ABANDONO = float(os.getenv("JOBS_ABANDONO", str(4 * JOBS_BATIMENTO)))
+
+def validar_callback_url(url, hosts=None):
+    """
+    Aceita só URLs http(s) e, se houver lista (JOBS_CALLBACK_HOSTS), só esses hosts:
+    o servidor não pode ser usado para fazer POST em endereços internos quaisquer.
+    Lança ValueError se a URL não for aceita.
+    """
+    hosts = JOBS_CALLBACK_HOSTS if hosts is None else hosts
+    partes = urlsplit(url) if isinstance(url, str) else None
+    if partes is None or partes.scheme not in ("http", "https") or not partes.hostname:
+        raise ValueError("'callback_url' deve ser uma URL http(s)")
+    if hosts and partes.hostname.lower() not in hosts:
+        raise ValueError(f"Host '{partes.hostname}' não está liberado para callbacks")
+    return url
+
+# Estados possíveis de um job
+PENDENTE = "pendente"
+PROCESSANDO = "processando"
+CONCLUIDO = "concluido"
+ERRO = "erro"
+
+
+class FilaJobs:
+    """
+    Fila de jobs persistida em SQLite e executada por um pool de threads.
+    Usada pelos perfis lentos (vídeo, IA) para não prender um worker do Flask.
+    Jobs pendentes ou interrompidos são retomados quando o servidor reinicia.
+    Com vários processos (gunicorn), cada um tem a sua fila sobre o mesmo SQLite:
+    um job só roda no processo que conseguir marcá-lo como 'processando', e o
+    processo renova o 'atualizado_em' dos seus jobs enquanto eles rodam. Só jobs
+    sem batimento há JOBS_ABANDONO segundos (o processo morreu) voltam para a fila;
+    os de workers vivos (ex: reiniciados pelo max_requests do gunicorn) não.
+    """
+
+    def __init__(self, executar, caminho=JOBS_CAMINHO, workers=JOBS_WORKERS):
+        # `executar(payload) -> html_corrigido` é a mesma lógica do /adaptar
+        self.executar = executar
+        self.caminho = caminho
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._agendados = set()    # na fila deste processo ou rodando nele
+        self._em_execucao = set()  # reservados e rodando neste processo (recebem batimento)
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+
+        with self._conectar() as conexao:
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL,"
+                " resultado TEXT, erro TEXT, callback_url TEXT,"
+                " criado_em REAL NOT NULL, atualizado_em REAL NOT NULL)"
+            )
+        self._retomar_jobs()
+        self._batimento = threading.Thread(target=self._bater, name="job-batimento", daemon=True)
+        self._batimento.start()
+
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, timeout=5)
+
+    def _retomar_jobs(self):
+        """
+        Limpa jobs antigos, recoloca na fila os abandonados (processo morto, sem
+        batimento) e agenda os pendentes. Outro processo pode agendar os mesmos
+        pendentes: o _reservar garante que cada um roda uma vez só.
+        """
+        agora = time.time()
+        with self._conectar() as conexao:
+            conexao.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND atualizado_em < ?",
+                (CONCLUIDO, ERRO, agora - JOBS_RETENCAO),
+            )
+            conexao.execute(
+                "UPDATE jobs SET status = ?, atualizado_em = ? WHERE status = ? AND atualizado_em < ?",
+                (PENDENTE, agora, PROCESSANDO, agora - JOBS_ABANDONO),
+            )
+            pendentes = conexao.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY criado_em", (PENDENTE,)
+            ).fetchall()
+
+        for (job_id,) in pendentes:
+            if self._agendar(job_id):
+                logger.info("Job %s retomado.", job_id)
+
+    def _agendar(self, job_id):
+        """Coloca o job na fila deste processo (uma vez só). Retorna False se já estava."""
+        with self._lock:
+            if job_id in self._agendados:
+                return False
+            self._agendados.add(job_id)
+        try:
+            self._executor.submit(self._processar, job_id)
+        except RuntimeError:
+            # Fila encerrada: o job continua pendente para o próximo processo
+            with self._lock:
+                self._agendados.discard(job_id)
+            return False
+        return True
+
+    def _bater(self):
+        """
+        Renova o 'atualizado_em' dos jobs deste processo e retoma os abandonados por outros.
+        Depois do encerrar(), não retoma mais nada, mas continua batendo até os jobs
+        que já estavam rodando terminarem: senão outro processo os pegaria de novo.
+        """
+        parando = False
+        while True:
+            if parando:
+                time.sleep(JOBS_BATIMENTO)
+            else:
+                parando = self._parar.wait(JOBS_BATIMENTO)
+            with self._lock:
+                em_execucao = list(self._em_execucao)
+            if parando and not em_execucao:
+                return
+            try:
+                if em_execucao:
+                    with self._conectar() as conexao:
+                        conexao.executemany(
+                            "UPDATE jobs SET atualizado_em = ? WHERE id = ? AND status = ?",
+                            [(time.time(), job_id, PROCESSANDO) for job_id in em_execucao],
+                        )
+                if not parando:
+                    self._retomar_jobs()
+            except sqlite3.Error as e:
+                logger.error("ERRO no batimento da fila de jobs: %s", e)
+
+    def _atualizar(self, job_id, status, resultado=None, erro=None):
+        with self._conectar() as conexao:
+            conexao.execute(
+                "UPDATE jobs SET status = ?, resultado = ?, erro = ?, atualizado_em = ? WHERE id = ?",
+                (status, resultado, erro, time.time(), job_id),
+            )
+
+    def enviar(self, payload, callback_url=None):
+        """Grava o job como pendente, agenda a execução e retorna o id na hora."""
+        job_id = uuid.uuid4().hex
+        agora = time.time()
+        with self._conectar() as conexao:
+            conexao.execute(
+                "INSERT INTO jobs (id, status, payload, callback_url, criado_em, atualizado_em)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, PENDENTE, json.dumps(payload), callback_url, agora, agora),
+            )
+        self._agendar(job_id)
+        return job_id
+
+    def consultar(self, job_id):
+        """Retorna o estado do job como dict, ou None se o id não existir."""
+        with self._conectar() as conexao:
+            linha = conexao.execute(
+                "SELECT status, resultado, erro FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if linha is None:
+            return None
+
+        status, resultado, erro = linha
+        estado = {"job_id": job_id, "status": status}
+        if status == CONCLUIDO:
+            estado["html_corrigido"] = resultado
+        elif status == ERRO:
+            estado["erro"] = erro
+        return estado
+
+    def _reservar(self, job_id):
+        """Passa o job de pendente para processando. Retorna False se outro processo chegou antes."""
+        with self._conectar() as conexao:
+            cursor = conexao.execute(
+                "UPDATE jobs SET status = ?, atualizado_em = ? WHERE id = ? AND status = ?",
+                (PROCESSANDO, time.time(), job_id, PENDENTE),
+            )
+            return cursor.rowcount == 1
+
+    def _processar(self, job_id):
+        # Entra no batimento antes de reservar: depois do encerrar(), nenhum job reservado fica sem ele
+        with self._lock:
+            self._em_execucao.add(job_id)
+        try:
+            if not self._reservar(job_id):
+                return
+            self._executar_job(job_id)
+        finally:
+            with self._lock:
+                self._em_execucao.discard(job_id)
+                self._agendados.discard(job_id)
+
+    def _executar_job(self, job_id):
+        with self._conectar() as conexao:
+            linha = conexao.execute(
+                "SELECT payload, callback_url FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        payload, callback_url = json.loads(linha[0]), linha[1]
+
+        perfis = "+".join(item.get("profile", "?") for item in payload.get("profiles", []))
+        logger.info("--- JOB %s INICIADO (Perfil: %s) ---", job_id, perfis)
+        try:
+            html_corrigido = self.executar(payload)
+            self._atualizar(job_id, CONCLUIDO, resultado=html_corrigido)
+            logger.info("--- JOB %s CONCLUÍDO ---", job_id)
+        except Exception as e:
+            self._atualizar(job_id, ERRO, erro=str(e))
+            logger.error("ERRO no job %s: %s", job_id, e)
+
+        if callback_url:
+            self._notificar(job_id, callback_url)
+
+    def _notificar(self, job_id, callback_url):
+        """Webhook: envia o estado final do job para a URL informada pelo cliente."""
+        try:
+            # Validada de novo (a lista de hosts pode ter mudado desde que o job entrou);
+            # sem seguir redirecionamentos, que levariam para fora da lista
+            validar_callback_url(callback_url)
+            requests.post(callback_url, json=self.consultar(job_id), timeout=JOBS_CALLBACK_TIMEOUT,
+                          allow_redirects=False)
+            logger.info("Callback do job %s enviado para %s", job_id, callback_url)
+        except Exception as e:
+            logger.error("ERRO ao enviar callback do job %s para %s: %s", job_id, callback_url, e)
+
+    def encerrar(self, esperar=True):
+        """
+        Para a fila. Jobs que ainda não começaram continuam 'pendente' no SQLite
+        e são retomados na próxima inicialização. Os que já estão rodando terminam
+        neste processo (o interpretador espera as threads do pool antes de sair) e
+        seguem com batimento até lá, então nenhum outro processo os executa de novo.
+        """
+        self._parar.set()
+        self._executor.shutdown(wait=esperar, cancel_futures=True)
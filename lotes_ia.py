@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+from dotenv import load_dotenv
+from prazo import PrazoEsgotado
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Quantas imagens (e quantos bytes) cabem num único pedido multimodal.
+# IA_LOTE_MAX_IMAGENS=1 desliga o modo em lote.
+IA_LOTE_MAX_IMAGENS = int(os.getenv("IA_LOTE_MAX_IMAGENS", "4"))
+IA_LOTE_MAX_BYTES = int(os.getenv("IA_LOTE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+PROMPT_LOTE = """Você vai receber {quantidade} imagens, numeradas na ordem em que aparecem.
+                 Responda APENAS com uma lista JSON de {quantidade} strings, uma descrição por imagem,
+                 na mesma ordem. Instruções para cada descrição: {instrucoes}"""
+
+def agrupar_em_lotes(itens, max_itens=None, max_bytes=None, tamanho=None):
+    """
+    Divide os itens em lotes de até 'max_itens' e, se 'tamanho(item)' for
+    informado, até 'max_bytes' somados. Um item maior que o orçamento vai sozinho.
+    """
+    max_itens = max(1, max_itens or IA_LOTE_MAX_IMAGENS)
+    max_bytes = max_bytes or IA_LOTE_MAX_BYTES
+
+    lotes, atual, bytes_atual = [], [], 0
+    for item in itens:
+        bytes_item = tamanho(item) if tamanho else 0
+        if atual and (len(atual) >= max_itens or bytes_atual + bytes_item > max_bytes):
+            lotes.append(atual)
+            atual, bytes_atual = [], 0
+        atual.append(item)
+        bytes_atual += bytes_item
+    if atual:
+        lotes.append(atual)
+    return lotes
+
+def ler_lista_json(texto, quantidade):
+    """
+    Lê a resposta do modelo como uma lista JSON com 'quantidade' strings.
+    Lança ValueError se a resposta não puder ser usada.
+    """
+    texto = texto.strip()
+    if texto.startswith("```"):
+        texto = texto.strip("`")
+        texto = texto[texto.index("\n") + 1:] if "\n" in texto else texto
+
+    dados = json.loads(texto)
+    if not isinstance(dados, list) or len(dados) != quantidade:
+        raise ValueError(f"Esperava uma lista JSON com {quantidade} descrições")
+    if not all(isinstance(descricao, str) and descricao.strip() for descricao in dados):
+        raise ValueError("Lista JSON com descrição vazia ou que não é texto")
+    return [descricao.strip() for descricao in dados]
+
+def executar_lote(lote, gerar_lote, gerar_individual):
+    """
+    Gera os resultados de um lote com um único pedido ('gerar_lote').
+    Se o pedido em lote falhar ou a resposta não puder ser lida, volta para
+    um pedido por item ('gerar_individual'), cada um passando pelo agendador_ia.
+    """
+    if len(lote) == 1:
+        return [gerar_individual(lote[0])]
+
+    try:
+        return gerar_lote(lote)
+    except PrazoEsgotado:
+        # Sem tempo para o lote, também não há para os pedidos individuais
+        raise
+    except Exception as e:
+        logger.warning("Lote de %s itens falhou (%s). Usando um pedido por item.", len(lote), e)
+
+    return [gerar_individual(item) for item in lote]
@@ -0,0 +1,260 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuração pelo .env
+# Limites (em segundos) dos baldes dos histogramas de latência
+METRICAS_BALDES = tuple(float(b) for b in os.getenv(
+    "METRICAS_BALDES", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60").split(","))
+
+####################################################
+### SEÇÃO 1: MÉTRICAS NO FORMATO DO PROMETHEUS
+####################################################
+
+def _escapar_rotulo(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores)) + ([extra] if extra else [])
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar_rotulo(valor)}"' for nome, valor in pares) + "}"
+
+def _formatar_numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador só de subida, com rótulos (ex: bytes enviados por modelo)."""
+
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos):
+        return tuple(str(rotulos.get(nome, "")) for nome in self.rotulos)
+
+    def incrementar(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def exportar(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for chave, valor in valores:
+            yield f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}"
+
+
+class Histograma(Contador):
+    """
+    Histograma de latências com rótulos (ex: por perfil, por modelo).
+    Exporta os baldes acumulados, a soma e a contagem, como o Prometheus espera.
+    """
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), baldes=METRICAS_BALDES):
+        super().__init__(nome, ajuda, rotulos)
+        self.baldes = tuple(sorted(baldes))
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        indice = bisect.bisect_left(self.baldes, valor)
+        with self._lock:
+            serie = self._valores.get(chave)
+            if serie is None:
+                # [contagem por balde..., +Inf], soma
+                serie = self._valores[chave] = [[0] * (len(self.baldes) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    def exportar(self):
+        with self._lock:
+            valores = sorted((chave, (list(serie[0]), serie[1])) for chave, serie in self._valores.items())
+        for chave, (contagens, soma) in valores:
+            acumulado = 0
+            for limite, contagem in zip(self.baldes + (float("inf"),), contagens):
+                acumulado += contagem
+                rotulos = _formatar_rotulos(self.rotulos, chave, ("le", _formatar_numero(limite)))
+                yield f"{self.nome}_bucket{rotulos} {acumulado}"
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            yield f"{self.nome}_sum{rotulos} {_formatar_numero(soma)}"
+            yield f"{self.nome}_count{rotulos} {acumulado}"
+
+
+class RegistroMetricas:
+    """Todas as métricas do processo, exportadas juntas no GET /metrics."""
+
+    def __init__(self):
+        self._metricas = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def exportar(self):
+        linhas = []
+        for metrica in self._metricas:
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.exportar())
+        return "\n".join(linhas) + "\n"
+
+
+# Instância única do processo. Com vários workers do gunicorn, cada um tem o seu
+# (o /metrics mostra os números do worker que atendeu a coleta).
+registro_metricas = RegistroMetricas()
+
+DURACAO_REQUISICAO = registro_metricas.registrar(Histograma(
+    "adaptar_requisicao_segundos", "Duração total do /adaptar.", ("formato", "cache")))
+DURACAO_ETAPA = registro_metricas.registrar(Histograma(
+    "adaptar_etapa_segundos", "Tempo de cada etapa da adaptação (parse, transformacoes, ia, serializacao).", ("etapa",)))
+DURACAO_PERFIL = registro_metricas.registrar(Histograma(
+    "adaptar_perfil_segundos", "Tempo de cada perfil aplicado (sem a IA, que roda depois em paralelo).", ("perfil",)))
+DURACAO_IA = registro_metricas.registrar(Histograma(
+    "ia_chamada_segundos", "Latência das chamadas ao provedor de IA.", ("modelo", "operacao")))
+ERROS_IA = registro_metricas.registrar(Contador(
+    "ia_erros_total", "Chamadas ao provedor de IA que lançaram exceção.", ("modelo", "operacao")))
+BYTES_IA_ENVIADOS = registro_metricas.registrar(Contador(
+    "ia_bytes_enviados_total", "Bytes enviados ao provedor de IA (prompt + mídia).", ("modelo", "operacao")))
+BYTES_IA_RECEBIDOS = registro_metricas.registrar(Contador(
+    "ia_bytes_recebidos_total", "Bytes de texto recebidos do provedor de IA.", ("modelo", "operacao")))
+CONSULTAS_CACHE_IA = registro_metricas.registrar(Contador(
+    "ia_cache_consultas_total", "Consultas ao cache de IA por resultado (memoria, disco ou ausente).", ("camada",)))
+NOVAS_TENTATIVAS_IA = registro_metricas.registrar(Contador(
+    "ia_novas_tentativas_total", "Chamadas de IA repetidas após um erro transitório (429, timeout, 5xx).", ("modelo",)))
+CIRCUITO_REJEITADAS = registro_metricas.registrar(Contador(
+    "ia_circuito_rejeitadas_total", "Chamadas de IA recusadas porque o circuito do modelo estava aberto.", ("modelo",)))
+CHAMADAS_COMPARTILHADAS = registro_metricas.registrar(Contador(
+    "ia_chamadas_compartilhadas_total", "Pedidos de IA que esperaram uma chamada idêntica já em andamento (single-flight)."))
+
+####################################################
+### SEÇÃO 2: RASTRO POR REQUISIÇÃO (SPANS)
+####################################################
+
+class Rastro:
+    """
+    Spans de uma requisição: nome, início e duração relativos ao começo da
+    requisição e atributos (perfil, modelo, bytes, cache...). Os spans das
+    threads de IA entram no mesmo rastro (ver paralelo.executar_em_paralelo).
+    """
+
+    def __init__(self, nome, **atributos):
+        self.id = uuid.uuid4().hex[:16]
+        self.nome = nome
+        self.atributos = atributos
+        self.inicio = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def registrar(self, nome, inicio, duracao, atributos):
+        with self._lock:
+            self.spans.append({
+                "nome": nome,
+                "inicio_ms": round((inicio - self.inicio) * 1000, 2),
+                "duracao_ms": round(duracao * 1000, 2),
+                **atributos,
+            })
+
+    def resumo(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["inicio_ms"])
+        return {"rastro": self.id, "nome": self.nome, **self.atributos,
+                "duracao_ms": round((time.perf_counter() - self.inicio) * 1000, 2), "spans": spans}
+
+
+_rastro_atual = ContextVar("rastro_atual", default=None)
+
+def rastro_atual():
+    return _rastro_atual.get()
+
+@contextmanager
+def rastrear(nome, **atributos):
+    """Abre o rastro de uma requisição. No fim, o rastro completo vai para o log (nível DEBUG)."""
+    rastro = Rastro(nome, **atributos)
+    token = _rastro_atual.set(rastro)
+    try:
+        yield rastro
+    finally:
+        _rastro_atual.reset(token)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("rastro %s", json.dumps(rastro.resumo(), ensure_ascii=False, default=str))
+
+@contextmanager
+def span(nome, histograma=None, **atributos):
+    """
+    Mede o bloco e o registra no rastro atual (se houver). Com 'histograma',
+    também observa a duração, usando os atributos de mesmo nome como rótulos.
+    O bloco recebe o dict de atributos e pode completá-lo (ex: bytes recebidos).
+    """
+    inicio = time.perf_counter()
+    try:
+        yield atributos
+    except Exception as e:
+        atributos["erro"] = type(e).__name__
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        if histograma is not None:
+            histograma.observar(duracao, **atributos)
+        rastro = _rastro_atual.get()
+        if rastro is not None:
+            rastro.registrar(nome, inicio, duracao, atributos)
+
+####################################################
+### SEÇÃO 3: CHAMADAS DE IA
+####################################################
+
+def tamanho_em_bytes(conteudo):
+    """Bytes de um prompt, 'part' de mídia ({'data': ...}) ou lista deles. Arquivos já enviados contam 0."""
+    if isinstance(conteudo, str):
+        return len(conteudo.encode("utf-8"))
+    if isinstance(conteudo, (bytes, bytearray)):
+        return len(conteudo)
+    if isinstance(conteudo, dict):
+        return len(conteudo.get("data") or b"")
+    if isinstance(conteudo, (list, tuple)):
+        return sum(tamanho_em_bytes(item) for item in conteudo)
+    return 0
+
+@contextmanager
+def medir_chamada_ia(modelo, operacao, entrada):
+    """
+    Span de uma chamada ao provedor: latência por modelo, bytes enviados e
+    recebidos e erros. O bloco guarda a resposta em atributos["resposta"].
+    """
+    enviados = tamanho_em_bytes(entrada)
+    BYTES_IA_ENVIADOS.incrementar(enviados, modelo=modelo, operacao=operacao)
+    try:
+        with span("chamada_ia", DURACAO_IA, modelo=modelo, operacao=operacao, bytes_enviados=enviados) as atributos:
+            yield atributos
+            recebidos = tamanho_em_bytes(atributos.pop("resposta", ""))
+            atributos["bytes_recebidos"] = recebidos
+            BYTES_IA_RECEBIDOS.incrementar(recebidos, modelo=modelo, operacao=operacao)
+    except Exception:
+        ERROS_IA.incrementar(modelo=modelo, operacao=operacao)
+        raise
+
+def observar_etapas(tempos):
+    """Observa no histograma de etapas os tempos de uma adaptação ({'parse': segundos, ...})."""
+    for etapa, segundos in tempos.items():
+        DURACAO_ETAPA.observar(segundos, etapa=etapa)
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+from disco import LimiteDiretorio, tocar
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuração pelo .env
+MIDIA_TIMEOUT_CONEXAO = float(os.getenv("MIDIA_TIMEOUT_CONEXAO", "5"))
+MIDIA_TIMEOUT_LEITURA = float(os.getenv("MIDIA_TIMEOUT_LEITURA", "30"))
+MIDIA_CONEXOES_POR_HOST = int(os.getenv("MIDIA_CONEXOES_POR_HOST", "10"))
+MIDIA_MAX_BYTES_IMAGEM = int(os.getenv("MIDIA_MAX_BYTES_IMAGEM", str(20 * 1024 * 1024)))
+MIDIA_MAX_BYTES_VIDEO = int(os.getenv("MIDIA_MAX_BYTES_VIDEO", str(200 * 1024 * 1024)))
+MIDIA_CACHE_DIR = os.getenv("MIDIA_CACHE_DIR", "cache_midia")
+# Tamanho máximo do cache de mídia em disco: passando disso, saem as menos usadas (0 = sem limite)
+MIDIA_CACHE_MAX_BYTES = int(os.getenv("MIDIA_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+TAMANHO_BLOCO = 64 * 1024
+
+
+class MidiaGrandeDemais(Exception):
+    """A mídia passou do limite de bytes permitido."""
+
+
+class Midia:
+    """Conteúdo baixado: bytes, tipo MIME e URL de origem."""
+
+    def __init__(self, url, dados, mime_type):
+        self.url = url
+        self.dados = dados
+        self.mime_type = mime_type
+
+
+class BuscadorMidia:
+    """
+    Busca imagens e vídeos das páginas adaptadas.
+    - Uma sessão HTTP compartilhada: pool de conexões por host e keep-alive
+      (os CDNs, como o do pexels, não refazem o handshake TLS a cada imagem).
+    - Timeouts de conexão e leitura, e limite máximo de bytes por download.
+    - Cache local com revalidação condicional (ETag / Last-Modified): se a mídia
+      não mudou, o servidor responde 304 e os bytes saem do disco. O cache tem
+      limite de bytes (MIDIA_CACHE_MAX_BYTES): as mídias usadas há mais tempo saem primeiro.
+    """
+
+    def __init__(self, cache_dir=MIDIA_CACHE_DIR, conexoes_por_host=MIDIA_CONEXOES_POR_HOST,
+                 cache_max_bytes=MIDIA_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self._limite_cache = LimiteDiretorio(cache_dir, cache_max_bytes)
+        self.timeout = (MIDIA_TIMEOUT_CONEXAO, MIDIA_TIMEOUT_LEITURA)
+
+        self._sessao = requests.Session()
+        adaptador_http = HTTPAdapter(
+            pool_connections=conexoes_por_host,
+            pool_maxsize=conexoes_por_host,
+            max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504],
+                              allowed_methods=["GET"]),
+        )
+        self._sessao.mount("http://", adaptador_http)
+        self._sessao.mount("https://", adaptador_http)
+
+    def _caminhos_cache(self, url):
+        nome = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, nome)
+        return base + ".json", base + ".bin"
+
+    def _ler_cache(self, url):
+        caminho_meta, caminho_dados = self._caminhos_cache(url)
+        try:
+            with open(caminho_meta, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(caminho_dados, 'rb') as f:
+                dados = f.read()
+        except (OSError, ValueError):
+            return None, None
+        tocar(caminho_meta)
+        tocar(caminho_dados)
+        return meta, dados
+
+    def _gravar_cache(self, url, meta, dados):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        caminho_meta, caminho_dados = self._caminhos_cache(url)
+        # Grava em arquivo temporário e troca de uma vez: leitores nunca veem arquivo pela metade
+        for caminho, conteudo, modo in ((caminho_dados, dados, 'wb'),
+                                        (caminho_meta, json.dumps(meta), 'w')):
+            fd, temporario = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, modo) as f:
+                f.write(conteudo)
+            os.replace(temporario, caminho)
+        self._limite_cache.gravou(len(dados))
+
+    def _abrir(self, url, max_bytes, cabecalhos=None):
+        resposta = self._sessao.get(url, stream=True, timeout=self.timeout, headers=cabecalhos or {})
+        if resposta.status_code != 304:
+            resposta.raise_for_status()
+            tamanho = resposta.headers.get('Content-Length')
+            if tamanho and tamanho.isdigit() and int(tamanho) > max_bytes:
+                resposta.close()
+                raise MidiaGrandeDemais(f"{url} tem {tamanho} bytes (limite: {max_bytes})")
+        return resposta
+
+    def _ler_blocos(self, resposta, url, max_bytes):
+        total = 0
+        for bloco in resposta.iter_content(chunk_size=TAMANHO_BLOCO):
+            total += len(bloco)
+            if total > max_bytes:
+                resposta.close()
+                raise MidiaGrandeDemais(f"{url} passou do limite de {max_bytes} bytes")
+            yield bloco
+
+    def baixar(self, url, max_bytes=MIDIA_MAX_BYTES_IMAGEM):
+        """Baixa a mídia inteira para a memória (imagens). Retorna um objeto Midia."""
+        meta, dados_em_cache = self._ler_cache(url)
+        cabecalhos = {}
+        if meta:
+            if meta.get("etag"):
+                cabecalhos['If-None-Match'] = meta["etag"]
+            if meta.get("last_modified"):
+                cabecalhos['If-Modified-Since'] = meta["last_modified"]
+
+        with self._abrir(url, max_bytes, cabecalhos) as resposta:
+            if resposta.status_code == 304 and dados_em_cache is not None:
+                if len(dados_em_cache) > max_bytes:
+                    raise MidiaGrandeDemais(f"{url} passou do limite de {max_bytes} bytes")
+                return Midia(url, dados_em_cache, meta["mime_type"])
+
+            dados = b"".join(self._ler_blocos(resposta, url, max_bytes))
+            mime_type = resposta.headers.get('Content-Type', 'application/octet-stream')
+            etag = resposta.headers.get('ETag')
+            last_modified = resposta.headers.get('Last-Modified')
+
+        # Só vale guardar o que pode ser revalidado depois
+        if etag or last_modified:
+            meta = {"mime_type": mime_type, "etag": etag, "last_modified": last_modified}
+            try:
+                self._gravar_cache(url, meta, dados)
+            except OSError as e:
+                logger.warning("Não foi possível gravar %s no cache de mídia: %s", url, e)
+
+        return Midia(url, dados, mime_type)
+
+    def baixar_para_arquivo(self, url, arquivo, max_bytes=MIDIA_MAX_BYTES_VIDEO):
+        """
+        Baixa a mídia em streaming direto para um arquivo aberto (vídeos),
+        sem carregar tudo na memória. Retorna o tipo MIME.
+        """
+        with self._abrir(url, max_bytes) as resposta:
+            for bloco in self._ler_blocos(resposta, url, max_bytes):
+                arquivo.write(bloco)
+            return resposta.headers.get('Content-Type', 'application/octet-stream')
+
+
+# Instância única do processo: todas as requisições dividem o mesmo pool de conexões
+buscador_midia = BuscadorMidia()
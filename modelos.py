@@ -0,0 +1,38 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Modelos usados pelos perfis
+MODELO_PRO = 'models/gemini-2.5-pro'
+MODELO_FLASH = 'models/gemini-2.5-flash'
+
+# O SDK do Gemini (google-generativeai + grpc) leva quase um segundo para importar.
+# Ele só é carregado no primeiro uso da IA: perfis só de CSS nunca pagam esse custo.
+_genai = None
+_modelos = {}
+_lock = threading.Lock()
+
+
+def obter_genai():
+    """Importa e configura o SDK do Gemini uma única vez por processo."""
+    global _genai
+    if _genai is None:
+        with _lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                _genai = genai
+    return _genai
+
+def obter_modelo(nome):
+    """Cliente do modelo 'nome', criado no primeiro uso e reaproveitado por todas as threads."""
+    modelo = _modelos.get(nome)
+    if modelo is None:
+        genai = obter_genai()
+        with _lock:
+            modelo = _modelos.get(nome)
+            if modelo is None:
+                modelo = _modelos[nome] = genai.GenerativeModel(nome)
+    return modelo
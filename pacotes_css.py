@@ -0,0 +1,91 @@
+import functools
+import os
+import re
+import threading
+from cachetools import LRUCache
+from dotenv import load_dotenv
+from estaticos import repositorio_estatico
+
+load_dotenv()
+
+# Configuração pelo .env
+# "link": o CSS dos perfis vira um arquivo estático (imutável) e a página leva só um <link>.
+# "inline": o CSS vai numa <style> dentro da página (útil se o HTML for aberto sem acesso ao servidor).
+CSS_MODO = os.getenv("CSS_MODO", "link")
+CSS_MAX_PACOTES = int(os.getenv("CSS_MAX_PACOTES", "256"))
+
+_COMENTARIOS = re.compile(r'/\*.*?\*/', re.S)
+_ESPACOS = re.compile(r'\s+')
+_ESPACO_EM_VOLTA = re.compile(r'\s*([{};,>])\s*')
+# Só o espaço depois de ':' sai: antes dele, 'div :hover' e 'div:hover' são seletores diferentes
+_ESPACO_DEPOIS_DOIS_PONTOS = re.compile(r':\s+')
+
+@functools.lru_cache(maxsize=CSS_MAX_PACOTES)
+def minificar_css(css):
+    """Remove comentários e espaços desnecessários. O resultado é memoizado por texto."""
+    css = _COMENTARIOS.sub('', css)
+    css = _ESPACOS.sub(' ', css)
+    css = _ESPACO_EM_VOLTA.sub(r'\1', css)
+    css = _ESPACO_DEPOIS_DOIS_PONTOS.sub(':', css)
+    return css.replace(';}', '}').strip()
+
+def dividir_regras(css):
+    """Divide CSS minificado nas regras de primeiro nível (um @media inteiro conta como uma; @import também)."""
+    regras, profundidade, inicio = [], 0, 0
+    for posicao, caractere in enumerate(css):
+        if caractere == '{':
+            profundidade += 1
+        elif caractere == '}':
+            profundidade -= 1
+            if profundidade == 0:
+                regras.append(css[inicio:posicao + 1])
+                inicio = posicao + 1
+        elif caractere == ';' and profundidade == 0:  # ex: @import ...;
+            regras.append(css[inicio:posicao + 1])
+            inicio = posicao + 1
+    return regras
+
+def compilar_css(*blocos):
+    """
+    Junta os blocos de CSS num só, minificado e sem regras repetidas.
+    Das regras idênticas fica a última, que é a que vale na cascata.
+    """
+    regras = []
+    for bloco in blocos:
+        regras.extend(dividir_regras(minificar_css(bloco)))
+    vistas, unicas = set(), []
+    for regra in reversed(regras):
+        if regra not in vistas:
+            vistas.add(regra)
+            unicas.append(regra)
+    return ''.join(reversed(unicas))
+
+
+class RegistroPacotesCSS:
+    """
+    Pacotes de CSS por combinação de perfis/config. Cada combinação é compilada
+    uma única vez e publicada no repositório estático (nome = hash do conteúdo),
+    então páginas diferentes com a mesma configuração apontam para o mesmo
+    arquivo e o navegador reaproveita a folha de estilo do cache.
+    """
+
+    def __init__(self, repositorio=repositorio_estatico, max_pacotes=CSS_MAX_PACOTES):
+        self.repositorio = repositorio
+        self._nomes = LRUCache(maxsize=max_pacotes)
+        self._lock = threading.Lock()
+
+    def publicar(self, blocos):
+        """Retorna a URL do pacote com os blocos de CSS (compila e grava só na primeira vez)."""
+        chave = tuple(blocos)
+        with self._lock:
+            nome = self._nomes.get(chave)
+        # O arquivo pode ter saído na poda do repositório: aí é gravado de novo
+        if nome is None or self.repositorio.caminho(nome) is None:
+            nome = self.repositorio.guardar(compilar_css(*blocos), "css")
+            with self._lock:
+                self._nomes[chave] = nome
+        return self.repositorio.url(nome)
+
+
+# Instância única do processo
+registro_css = RegistroPacotesCSS()
@@ -0,0 +1,100 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Limites configuráveis pelo .env (mesmo padrão da GOOGLE_API_KEY)
+IA_MAX_CONCORRENCIA = int(os.getenv("IA_MAX_CONCORRENCIA", "4"))
+IA_REQUISICOES_POR_MINUTO = float(os.getenv("IA_REQUISICOES_POR_MINUTO", "60"))
+IA_RAJADA = int(os.getenv("IA_RAJADA", str(IA_MAX_CONCORRENCIA)))
+
+####################################################
+### SEÇÃO 1: LIMITADOR DE TAXA (TOKEN BUCKET)
+####################################################
+
+class TokenBucket:
+    """
+    Limitador de taxa compartilhado entre threads.
+    Reabastece `taxa_por_segundo` tokens por segundo, até `capacidade` (rajada).
+    (Base dos limitadores por modelo do agendador_ia.py.)
+    """
+
+    def __init__(self, taxa_por_segundo, capacidade):
+        self.taxa_por_segundo = taxa_por_segundo
+        self.capacidade = capacidade
+        self._tokens = float(capacidade)
+        self._ultimo_reabastecimento = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reabastecer(self):
+        agora = time.monotonic()
+        decorrido = agora - self._ultimo_reabastecimento
+        self._tokens = min(self.capacidade, self._tokens + decorrido * self.taxa_por_segundo)
+        self._ultimo_reabastecimento = agora
+
+    def adquirir(self, tokens=1, timeout=None):
+        """
+        Bloqueia até haver `tokens` disponíveis.
+        Retorna False se o `timeout` (em segundos) estourar antes disso.
+        """
+        inicio = time.monotonic()
+        while True:
+            with self._lock:
+                self._reabastecer()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                espera = (tokens - self._tokens) / self.taxa_por_segundo
+
+            if timeout is not None and (time.monotonic() - inicio) + espera > timeout:
+                return False
+            time.sleep(espera)
+
+
+####################################################
+### SEÇÃO 2: EXECUÇÃO DE CHAMADAS DE IA EM PARALELO
+####################################################
+
+def executar_em_paralelo(itens, funcao, max_concorrencia=None, timeout=None):
+    """
+    Roda `funcao(item)` para até `max_concorrencia` itens ao mesmo tempo. Gera
+    (item, resultado) na ordem em que terminam. A taxa de chamadas à IA é
+    controlada pelo agendador_ia, chamada a chamada (respostas em cache não gastam cota).
+    Itens cuja chamada lança exceção são registrados e pulados.
+    Cada chamada roda com uma cópia do contexto de quem chamou: os spans das
+    threads entram no rastro da requisição (ver metricas.py).
+    Com `timeout` (segundos), para de esperar quando ele estoura: os itens na fila
+    são cancelados e os que já estão rodando terminam sozinhos, sem ninguém esperar
+    (o resultado ainda vai para o cache de IA). Quem chama vê quais itens não vieram.
+    """
+    if not itens:
+        return
+
+    max_concorrencia = max_concorrencia or IA_MAX_CONCORRENCIA
+
+    executor = ThreadPoolExecutor(max_workers=min(max_concorrencia, len(itens)), thread_name_prefix="ia")
+    esgotado = False
+    try:
+        futuros = {executor.submit(contextvars.copy_context().run, funcao, item): item for item in itens}
+        try:
+            for futuro in as_completed(futuros, timeout=timeout):
+                item = futuros[futuro]
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    logger.error("ERRO em chamada paralela de IA: %s", e)
+                    continue
+                yield item, resultado
+        except FuturesTimeoutError:
+            esgotado = True
+            logger.warning("Prazo de %.2fs esgotado: %d de %d chamadas de IA ficaram para depois.",
+                           timeout, sum(not futuro.done() for futuro in futuros), len(futuros))
+    finally:
+        executor.shutdown(wait=not esgotado, cancel_futures=esgotado)
@@ -0,0 +1,48 @@
+import copy
+import logging
+import os
+from bs4 import BeautifulSoup, FeatureNotFound
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Backend do BeautifulSoup: "auto" (lxml se estiver instalado), "lxml",
+# "html.parser" (puro Python, mais lento) ou "html5lib".
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")
+
+def _escolher_backend(nome):
+    if nome != "auto":
+        return nome
+    try:
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+BACKEND = _escolher_backend(HTML_PARSER)
+
+def criar_soup(html):
+    """Faz o parse de uma página inteira com o backend configurado."""
+    global BACKEND
+    try:
+        return BeautifulSoup(html, BACKEND)
+    except FeatureNotFound:
+        logger.warning("Parser '%s' não está instalado. Usando 'html.parser'.", BACKEND)
+        BACKEND = "html.parser"
+        return BeautifulSoup(html, BACKEND)
+
+def criar_fragmento(html):
+    """
+    Faz o parse de um trecho de HTML gerado pelos perfis (barra, transcrição...).
+    Sempre com 'html.parser', que não envolve o trecho em <html><body>.
+    """
+    return BeautifulSoup(html, 'html.parser')
+
+def clonar_soup(soup):
+    """
+    Cópia profunda de uma árvore já parseada, sem serializar e parsear de novo.
+    Útil para rodar vários perfis a partir do mesmo documento original.
+    """
+    return copy.copy(soup)
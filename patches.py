@@ -0,0 +1,87 @@
+import re
+
+# IDs que podem virar seletor '#id' sem precisar de escape de CSS
+_ID_SIMPLES = re.compile(r'^[A-Za-z][\w-]*$')
+
+def gerar_seletor(tag):
+    """
+    Gera um seletor CSS que identifica a tag no documento.
+    Usa o 'id' quando existe; senão, o caminho com :nth-of-type a partir do <html>.
+    """
+    partes = []
+    while tag is not None and tag.name != '[document]':
+        tag_id = tag.get('id')
+        if tag_id and _ID_SIMPLES.match(tag_id):
+            partes.append(f"#{tag_id}")
+            break
+
+        if tag.parent is not None:
+            irmaos = tag.parent.find_all(tag.name, recursive=False)
+            indice = next(i for i, irmao in enumerate(irmaos, 1) if irmao is tag)
+            partes.append(f"{tag.name}:nth-of-type({indice})")
+        else:
+            partes.append(tag.name)
+        tag = tag.parent
+
+    return " > ".join(reversed(partes))
+
+def indexar_seletores(soup):
+    """
+    Calcula, numa única passada, o seletor de todas as tags do documento.
+    Retorna {id(tag): seletor}. Serve para os patches apontarem para o
+    documento original mesmo depois que os perfis inserirem ou removerem nós.
+    """
+    seletores = {}
+    pilha = [(soup, "")]
+    while pilha:
+        pai, seletor_pai = pilha.pop()
+        contagem = {}
+        for filho in pai.children:
+            if filho.name is None:
+                continue
+            contagem[filho.name] = contagem.get(filho.name, 0) + 1
+
+            filho_id = filho.get('id')
+            if filho_id and _ID_SIMPLES.match(filho_id):
+                seletor = f"#{filho_id}"
+            else:
+                passo = f"{filho.name}:nth-of-type({contagem[filho.name]})"
+                seletor = f"{seletor_pai} > {passo}" if seletor_pai else passo
+
+            seletores[id(filho)] = seletor
+            pilha.append((filho, seletor))
+    return seletores
+
+####################################################
+### OPERAÇÕES DE PATCH (aplicadas pelo cliente no DOM)
+####################################################
+
+def patch_atributo(nome, valor):
+    """Define um atributo no elemento (ex: alt da <img>)."""
+    return {"op": "set_attr", "name": nome, "value": valor}
+
+def patch_texto(texto):
+    """Troca o texto do elemento (ex: parágrafo simplificado)."""
+    return {"op": "set_text", "text": texto}
+
+def patch_anexar_html(html):
+    """Anexa um trecho de HTML ao final do elemento (ex: caixa de transcrição)."""
+    return {"op": "append_html", "html": html}
+
+def patch_inserir_html_inicio(html):
+    """Insere um trecho de HTML no início do elemento (ex: barra de progresso no <body>)."""
+    return {"op": "prepend_html", "html": html}
+
+def patch_remover():
+    """Remove o elemento (ex: <style> com 'outline: none')."""
+    return {"op": "remove"}
+
+def patch_remover_atributo(nome):
+    """Remove um atributo do elemento (ex: autoplay do <video>)."""
+    return {"op": "remove_attr", "name": nome}
+
+def patch_folha_estilo(css=None, href=None):
+    """Anexa uma folha de estilos ao <head> (todo o CSS dos perfis): inline ('css') ou por <link> ('href')."""
+    if href is not None:
+        return {"op": "append_stylesheet", "href": href}
+    return {"op": "append_stylesheet", "css": css}
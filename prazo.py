@@ -0,0 +1,99 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuração pelo .env
+# PRAZO_PADRAO_MS: prazo das requisições que não mandam um (0 = sem prazo)
+# PRAZO_MAXIMO_MS: teto para o prazo pedido pelo cliente
+# PRAZO_RESERVA_MS: parte do prazo guardada para injetar o CSS e serializar a página
+PRAZO_PADRAO_MS = int(os.getenv("PRAZO_PADRAO_MS", "0"))
+PRAZO_MAXIMO_MS = int(os.getenv("PRAZO_MAXIMO_MS", "120000"))
+PRAZO_RESERVA_MS = int(os.getenv("PRAZO_RESERVA_MS", "100"))
+
+
+class PrazoEsgotado(Exception):
+    """A chamada de IA não cabe no prazo da requisição: fica para depois (não é erro do provedor)."""
+
+
+class Prazo:
+    """
+    Prazo de uma requisição, contado a partir da chegada. As etapas
+    determinísticas (parse, CSS, ARIA) rodam sempre; a IA usa o que sobra,
+    menos a reserva do fim (injetar o CSS e serializar).
+    """
+
+    def __init__(self, milissegundos, reserva_ms=PRAZO_RESERVA_MS):
+        self.milissegundos = milissegundos
+        self.fim = time.monotonic() + milissegundos / 1000.0
+        # A reserva nunca passa de metade do prazo (prazos curtos ainda dão tempo ao cache de IA)
+        self.reserva = min(reserva_ms, milissegundos / 2) / 1000.0
+
+    def restante(self):
+        """Segundos até o fim do prazo (0 se já passou)."""
+        return max(0.0, self.fim - time.monotonic())
+
+    def restante_ia(self):
+        """Segundos que a IA ainda pode usar, já descontada a reserva do fim."""
+        return max(0.0, self.fim - self.reserva - time.monotonic())
+
+    def esgotado(self):
+        return self.restante_ia() <= 0
+
+
+def ler_prazo_ms(valor):
+    """
+    Valida o prazo pedido ('X-Deadline-Ms' ou 'deadline_ms'), em milissegundos.
+    Sem valor, vale PRAZO_PADRAO_MS (None se 0). Lança ValueError se inválido.
+    """
+    if valor in (None, ""):
+        return PRAZO_PADRAO_MS or None
+    try:
+        milissegundos = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"Prazo '{valor}' inválido (use milissegundos, ex: 8000)")
+    if milissegundos <= 0:
+        raise ValueError("O prazo deve ser maior que zero")
+    return min(milissegundos, PRAZO_MAXIMO_MS)
+
+####################################################
+### SEÇÃO 1: PRAZO DA REQUISIÇÃO ATUAL
+####################################################
+
+_prazo_atual = ContextVar("prazo_atual", default=None)
+
+def prazo_atual():
+    return _prazo_atual.get()
+
+@contextmanager
+def com_prazo(milissegundos):
+    """
+    Tudo o que roda dentro do bloco (inclusive nas threads de IA, ver
+    paralelo.executar_em_paralelo) respeita o prazo. Com None, não há prazo.
+    """
+    prazo = Prazo(milissegundos) if milissegundos else None
+    token = _prazo_atual.set(prazo)
+    try:
+        yield prazo
+    finally:
+        _prazo_atual.reset(token)
+
+def tempo_restante_ia():
+    """Segundos que a IA ainda tem na requisição atual, ou None sem prazo."""
+    prazo = _prazo_atual.get()
+    return None if prazo is None else prazo.restante_ia()
+
+def limitar_ao_prazo(timeout):
+    """O menor entre 'timeout' (None = sem limite) e o tempo que a IA ainda tem."""
+    restante = tempo_restante_ia()
+    if restante is None:
+        return timeout
+    return restante if timeout is None else min(timeout, restante)
+
+def verificar_prazo(o_que="Chamada de IA"):
+    """Lança PrazoEsgotado se o tempo da IA na requisição atual acabou."""
+    if tempo_restante_ia() == 0:
+        raise PrazoEsgotado(f"{o_que} adiada: o prazo da requisição acabou")
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from dotenv import load_dotenv
+from lotes_ia import ler_lista_json
+from metricas import medir_chamada_ia
+from agendador_ia import agendador_ia
+from modelos import obter_modelo
+
+load_dotenv()
+
+# Configuração pelo .env
+# "gemini" (padrão) chama a API de verdade; "simulado" responde localmente, sem rede nem cota,
+# para testes de carga e para rodar o test_client.py / testa-tudo.py offline.
+IA_PROVEDOR = os.getenv("IA_PROVEDOR", "gemini")
+IA_SIMULADO_LATENCIA_MS = float(os.getenv("IA_SIMULADO_LATENCIA_MS", "300"))
+IA_SIMULADO_VARIACAO_MS = float(os.getenv("IA_SIMULADO_VARIACAO_MS", "100"))
+IA_SIMULADO_TAXA_FALHA = float(os.getenv("IA_SIMULADO_TAXA_FALHA", "0"))
+IA_SIMULADO_SEMENTE = os.getenv("IA_SIMULADO_SEMENTE", "0")
+
+RESPOSTA_JSON = {"response_mime_type": "application/json"}
+
+
+class ProvedorIA:
+    """
+    Interface dos backends de IA. Cada método faz um pedido e retorna o texto
+    da resposta (ou lança exceção). Prompts e cache ficam com quem chama.
+    'imagem' e 'video' são o que o chamador tem: uma URL (str), uma 'part'
+    com bytes ou um arquivo já enviado ao provedor.
+    """
+
+    nome = None
+
+    def descrever_imagem(self, modelo, prompt, imagem):
+        """Alt text de uma imagem."""
+        raise NotImplementedError
+
+    def descrever_imagens(self, modelo, prompt, imagens):
+        """Alt text de várias imagens num único pedido. Retorna uma lista na mesma ordem."""
+        raise NotImplementedError
+
+    def simplificar_texto(self, modelo, prompt, texto):
+        """Versão simplificada de 'texto' ('prompt' já contém o texto)."""
+        raise NotImplementedError
+
+    def analisar_video(self, modelo, prompt, video):
+        """Análise combinada do vídeo (transcrição, sons e narração) em JSON (ver analise_video.py)."""
+        raise NotImplementedError
+
+
+class ProvedorGemini(ProvedorIA):
+    """Backend de produção: Google Gemini (SDK carregado só no primeiro uso, ver modelos.py)."""
+
+    nome = "gemini"
+
+    def _gerar(self, modelo, conteudo, generation_config=None):
+        resposta = obter_modelo(modelo).generate_content(conteudo, generation_config=generation_config)
+        return resposta.text.strip()
+
+    def _conteudo_video(self, prompt, video):
+        # Uma URL vai como texto, dentro do próprio prompt; um arquivo enviado vai como 'part'
+        return prompt if isinstance(video, str) else [prompt, video]
+
+    def descrever_imagem(self, modelo, prompt, imagem):
+        return self._gerar(modelo, [prompt, imagem])
+
+    def descrever_imagens(self, modelo, prompt, imagens):
+        texto = self._gerar(modelo, [prompt] + list(imagens), RESPOSTA_JSON)
+        return ler_lista_json(texto, len(imagens))
+
+    def simplificar_texto(self, modelo, prompt, texto):
+        return self._gerar(modelo, prompt)
+
+    def analisar_video(self, modelo, prompt, video):
+        return self._gerar(modelo, self._conteudo_video(prompt, video), RESPOSTA_JSON)
+
+
+class FalhaSimulada(Exception):
+    """Erro injetado pelo ProvedorSimulado (IA_SIMULADO_TAXA_FALHA), tratado como um 503 do serviço."""
+
+    code = 503
+
+
+class ProvedorSimulado(ProvedorIA):
+    """
+    Backend local e determinístico para testes de carga e de concorrência.
+    - Latência: 'latencia_ms' ± 'variacao_ms' por pedido (time.sleep, libera o GIL
+      como uma chamada de rede).
+    - Falhas: cada pedido falha com probabilidade 'taxa_falha'.
+    O sorteio da latência e da falha depende só da semente e da entrada do pedido,
+    então a mesma carga se repete igual em rodadas diferentes.
+    """
+
+    nome = "simulado"
+
+    def __init__(self, latencia_ms=IA_SIMULADO_LATENCIA_MS, variacao_ms=IA_SIMULADO_VARIACAO_MS,
+                 taxa_falha=IA_SIMULADO_TAXA_FALHA, semente=IA_SIMULADO_SEMENTE):
+        self.latencia_ms = latencia_ms
+        self.variacao_ms = variacao_ms
+        self.taxa_falha = taxa_falha
+        self.semente = semente
+
+    def _simular(self, operacao, entrada):
+        """Espera a latência sorteada e, se for o caso, lança a falha injetada."""
+        sorteio = random.Random(f"{self.semente}:{operacao}:{entrada}")
+        latencia = self.latencia_ms + sorteio.uniform(-self.variacao_ms, self.variacao_ms)
+        time.sleep(max(0.0, latencia) / 1000)
+        if sorteio.random() < self.taxa_falha:
+            raise FalhaSimulada(f"Falha simulada em {operacao}")
+
+    def _identificar(self, conteudo):
+        if isinstance(conteudo, str):
+            return conteudo
+        if isinstance(conteudo, dict) and "data" in conteudo:
+            return hashlib.sha256(conteudo["data"]).hexdigest()[:16]
+        return getattr(conteudo, "name", None) or repr(conteudo)
+
+    def _descricao(self, imagem):
+        nome = os.path.basename(self._identificar(imagem).split("?")[0]) or "imagem"
+        return f"Imagem simulada ({nome})."
+
+    def descrever_imagem(self, modelo, prompt, imagem):
+        self._simular("imagem", self._identificar(imagem))
+        return self._descricao(imagem)
+
+    def descrever_imagens(self, modelo, prompt, imagens):
+        self._simular("imagens", "|".join(self._identificar(imagem) for imagem in imagens))
+        return [self._descricao(imagem) for imagem in imagens]
+
+    def simplificar_texto(self, modelo, prompt, texto):
+        self._simular("texto", texto)
+        primeira_frase = re.split(r'(?<=[.!?])\s', texto.strip(), maxsplit=1)[0]
+        return f"{primeira_frase} (texto simplificado simulado)"
+
+    def analisar_video(self, modelo, prompt, video):
+        self._simular("video", self._identificar(video))
+        return json.dumps({
+            "transcricao": [{"inicio": 0.0, "fim": 4.0, "texto": "Fala simulada do vídeo."}],
+            "sons": [{"inicio": 4.0, "fim": 6.0, "texto": "música simulada"}],
+            "narracao": [{"inicio": 0.0, "fim": 6.0, "texto": "Cena simulada do vídeo."}],
+        }, ensure_ascii=False)
+
+
+class ProvedorMedido(ProvedorIA):
+    """
+    Envolve outro provedor: cada chamada passa pelo agendador_ia (limite de taxa
+    por modelo, novas tentativas e circuit breaker) e cada tentativa é medida
+    (ver metricas.medir_chamada_ia): latência por modelo, bytes enviados e
+    recebidos e erros, no /metrics e no rastro da requisição.
+    """
+
+    def __init__(self, provedor):
+        self.provedor = provedor
+        self.nome = provedor.nome
+
+    def _chamar(self, operacao, modelo, entrada, *argumentos):
+        metodo = getattr(self.provedor, operacao)
+        def _tentativa():
+            with medir_chamada_ia(modelo, operacao, entrada) as atributos:
+                atributos["resposta"] = resposta = metodo(modelo, *argumentos)
+            return resposta
+        return agendador_ia.executar(modelo, _tentativa)
+
+    def descrever_imagem(self, modelo, prompt, imagem):
+        return self._chamar("descrever_imagem", modelo, [prompt, imagem], prompt, imagem)
+
+    def descrever_imagens(self, modelo, prompt, imagens):
+        imagens = list(imagens)
+        return self._chamar("descrever_imagens", modelo, [prompt, imagens], prompt, imagens)
+
+    def simplificar_texto(self, modelo, prompt, texto):
+        # 'texto' já está dentro do prompt: só o prompt conta nos bytes enviados
+        return self._chamar("simplificar_texto", modelo, prompt, prompt, texto)
+
+    def analisar_video(self, modelo, prompt, video):
+        return self._chamar("analisar_video", modelo, [prompt, video], prompt, video)
+
+
+PROVEDORES = {
+    ProvedorGemini.nome: ProvedorGemini,
+    ProvedorSimulado.nome: ProvedorSimulado,
+}
+
+def criar_provedor(nome=IA_PROVEDOR):
+    """
+    Cria o backend pelo nome (IA_PROVEDOR), já medido (ver ProvedorMedido).
+    Lança ValueError se o nome for desconhecido.
+    """
+    if nome not in PROVEDORES:
+        raise ValueError(f"IA_PROVEDOR '{nome}' desconhecido (opções: {', '.join(PROVEDORES)})")
+    return ProvedorMedido(PROVEDORES[nome]())
+
+
+# Instância única do processo
+provedor_ia = criar_provedor()
@@ -0,0 +1,78 @@
+from collections import defaultdict
+
+
+class Regra:
+    """
+    Uma correção de DOM: em quais tags ela olha, quando se aplica e o que faz.
+    - tags: nomes das tags (ex: ('img',)); None para qualquer tag.
+    - condicao(tag) -> bool: filtro extra (ex: img sem 'alt').
+    - acao(tag): a correção em si.
+    - limite: aplica só nas N primeiras tags encontradas (None = todas).
+    """
+
+    def __init__(self, nome, tags, acao, condicao=None, limite=None):
+        self.nome = nome
+        self.tags = tuple(tags) if tags else None
+        self.acao = acao
+        self.condicao = condicao
+        self.limite = limite
+
+
+class MotorRegras:
+    """
+    Motor de regras de uma única passada.
+    Cada perfil registra as suas regras; aplicar() percorre o documento uma vez
+    e entrega cada tag a todas as regras que casam com ela.
+    """
+
+    def __init__(self):
+        self._regras = []
+        self._por_tag = defaultdict(list)
+        self._qualquer_tag = []
+
+    def registrar(self, nome, tags, acao, condicao=None, limite=None):
+        """Registra uma nova regra. Retorna a Regra criada."""
+        regra = Regra(nome, tags, acao, condicao, limite)
+        self._regras.append(regra)
+        if regra.tags is None:
+            self._qualquer_tag.append(regra)
+        else:
+            for tag_name in regra.tags:
+                self._por_tag[tag_name].append(regra)
+        return regra
+
+    def __len__(self):
+        return len(self._regras)
+
+    def aplicar(self, soup):
+        """
+        Percorre o documento uma única vez. As ações só rodam depois da
+        passada, na ordem do documento, para que remoções e inserções feitas
+        por uma regra não atrapalhem a varredura. As regras são consumidas:
+        cada uma roda uma vez. Retorna o nº de ações aplicadas.
+        """
+        if not len(self):
+            return 0
+
+        contagem = defaultdict(int)
+        encontrados = []
+        for tag in soup.descendants:
+            if tag.name is None:
+                continue
+            regras = self._por_tag.get(tag.name, [])
+            if self._qualquer_tag:
+                regras = regras + self._qualquer_tag
+            for regra in regras:
+                if regra.limite is not None and contagem[regra] >= regra.limite:
+                    continue
+                if regra.condicao is None or regra.condicao(tag):
+                    contagem[regra] += 1
+                    encontrados.append((regra, tag))
+
+        for regra, tag in encontrados:
+            regra.acao(tag)
+
+        self._regras = []
+        self._por_tag.clear()
+        self._qualquer_tag = []
+        return len(encontrados)
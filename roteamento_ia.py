@@ -0,0 +1,221 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from cache_ia import cache_ia, gerar_chave
+from agendador_ia import PRIORIDADE_FUNDO, prioridade, prioridade_atual
+from modelos import MODELO_FLASH, MODELO_PRO
+from prazo import PrazoEsgotado
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Rotas de cada tarefa de IA:
+# - "pro": só o modelo Pro (melhor qualidade, mais lento);
+# - "flash": só o modelo Flash (rápido);
+# - "escalonado": responde com o Flash e, em segundo plano, gera com o Pro e
+#   guarda no cache; os próximos visitantes recebem a versão do Pro.
+ROTAS = ("pro", "flash", "escalonado")
+MODELO_DA_ROTA = {"pro": MODELO_PRO, "flash": MODELO_FLASH}
+ROTAS_PADRAO = {"alt_text": "pro", "video": "escalonado", "simplificacao": "flash"}
+
+# Configuração pelo .env
+# IA_ROTAS="alt_text=escalonado,video=flash" substitui as rotas padrão de cada tarefa
+# (o escalonado gasta a cota dos dois modelos: no alt text, só se for pedido)
+IA_ROTAS = os.getenv("IA_ROTAS", "")
+IA_MELHORIA_WORKERS = int(os.getenv("IA_MELHORIA_WORKERS", "2"))
+
+
+def validar_rota(rota):
+    if rota not in ROTAS:
+        raise ValueError(f"Rota de IA '{rota}' desconhecida (opções: {', '.join(ROTAS)})")
+    return rota
+
+def ler_rotas(texto):
+    """'alt_text=pro,video=flash' -> {'alt_text': 'pro', 'video': 'flash'}. Lança ValueError se inválido."""
+    rotas = {}
+    for item in filter(None, (parte.strip() for parte in texto.split(","))):
+        tarefa, _, rota = item.partition("=")
+        rotas[tarefa.strip()] = validar_rota(rota.strip())
+    return rotas
+
+def validar_roteamento(roteamento):
+    """
+    Valida o 'roteamento_ia' da config de um perfil: uma rota para todas as
+    tarefas do perfil ("pro") ou uma rota por tarefa ({"alt_text": "flash"}).
+    Lança ValueError se inválido.
+    """
+    if roteamento is None:
+        return
+    if isinstance(roteamento, str):
+        validar_rota(roteamento)
+    elif isinstance(roteamento, dict):
+        for rota in roteamento.values():
+            validar_rota(rota)
+    else:
+        raise ValueError("'roteamento_ia' deve ser uma rota ou um objeto {tarefa: rota}")
+
+####################################################
+### SEÇÃO 1: RESULTADOS PROVISÓRIOS
+####################################################
+
+_provisorios = ContextVar("resultados_provisorios", default=None)
+
+@contextmanager
+def registrar_provisorios():
+    """
+    Coleta as tarefas respondidas pelo modelo rápido enquanto a versão do Pro
+    ainda está sendo gerada. Uma página com resultados provisórios não deve ir
+    para o cache de respostas (a próxima visita já pega a versão melhor).
+    """
+    provisorios = []
+    token = _provisorios.set(provisorios)
+    try:
+        yield provisorios
+    finally:
+        _provisorios.reset(token)
+
+def _marcar_provisorio(tarefa):
+    provisorios = _provisorios.get()
+    if provisorios is not None:
+        provisorios.append(tarefa)
+
+####################################################
+### SEÇÃO 2: ROTEADOR
+####################################################
+
+class RoteadorIA:
+    """
+    Escolhe o modelo de cada chamada de IA pela rota da tarefa (ver ROTAS).
+    Na rota "escalonado", o cache é consultado primeiro com a chave do Pro; sem
+    ela, a resposta do Flash vai para a página e a geração com o Pro fica numa
+    fila de fundo (prioridade baixa no agendador_ia, uma vez por conteúdo).
+    Jobs (prioridade de fundo) não têm pressa: usam o Pro direto.
+    """
+
+    def __init__(self, rotas=None, workers=IA_MELHORIA_WORKERS):
+        self.rotas = dict(ROTAS_PADRAO, **(ler_rotas(IA_ROTAS) if rotas is None else rotas))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ia-melhoria")
+        self._pendentes = set()
+        self._lock = threading.Lock()
+
+    def rota(self, tarefa, config=None):
+        """Rota da tarefa: 'roteamento_ia' da config do perfil, senão IA_ROTAS, senão o padrão."""
+        roteamento = (config or {}).get("roteamento_ia")
+        if isinstance(roteamento, dict):
+            roteamento = roteamento.get(tarefa)
+        return roteamento or self.rotas.get(tarefa, "pro")
+
+    def _efetiva(self, rota):
+        if rota == "escalonado" and prioridade_atual() == PRIORIDADE_FUNDO:
+            return "pro"
+        return rota
+
+    def chamar(self, tarefa, rota, prompt, conteudo, gerar):
+        """
+        Resposta para (prompt, conteudo) pela rota. 'gerar(modelo)' faz a chamada
+        com o modelo escolhido. Lança exceção se a IA falhar.
+        """
+        rota = self._efetiva(rota)
+        if rota != "escalonado":
+            modelo = MODELO_DA_ROTA[rota]
+            return cache_ia.chamar(modelo, prompt, conteudo, lambda: gerar(modelo))
+
+        melhor = cache_ia.obter(gerar_chave(MODELO_PRO, prompt, conteudo))
+        if melhor is not None:
+            return melhor
+        try:
+            rapida = cache_ia.chamar(MODELO_FLASH, prompt, conteudo, lambda: gerar(MODELO_FLASH))
+        except PrazoEsgotado:
+            raise
+        except Exception as e:
+            logger.warning("Modelo rápido falhou para '%s' (%s). Usando o Pro.", tarefa, e)
+            return cache_ia.chamar(MODELO_PRO, prompt, conteudo, lambda: gerar(MODELO_PRO))
+        self._agendar_melhoria(tarefa, prompt, conteudo, gerar)
+        return rapida
+
+    def chamar_varios(self, tarefa, rota, prompt, conteudos, gerar_lote):
+        """
+        Versão em lote: 'gerar_lote(modelo, indices)' gera as respostas de
+        conteudos[i] num único pedido, tanto no Flash quanto na melhoria com o Pro
+        (um pedido por lote).
+        """
+        rota = self._efetiva(rota)
+        if rota != "escalonado":
+            modelo = MODELO_DA_ROTA[rota]
+            return cache_ia.chamar_varios(modelo, prompt, conteudos, lambda indices: gerar_lote(modelo, indices))
+
+        respostas = [cache_ia.obter(gerar_chave(MODELO_PRO, prompt, conteudo)) for conteudo in conteudos]
+        faltando = [i for i, resposta in enumerate(respostas) if resposta is None]
+        if not faltando:
+            return respostas
+
+        def _gerar_lote_rapido(indices):
+            return gerar_lote(MODELO_FLASH, [faltando[i] for i in indices])
+        rapidas = cache_ia.chamar_varios(MODELO_FLASH, prompt, [conteudos[i] for i in faltando], _gerar_lote_rapido)
+        for i, resposta in zip(faltando, rapidas):
+            respostas[i] = resposta
+        self._agendar_melhoria_lote(tarefa, prompt, conteudos, faltando, gerar_lote)
+        return respostas
+
+    def _agendar_melhoria(self, tarefa, prompt, conteudo, gerar):
+        """Gera a versão do Pro em segundo plano (uma vez por conteúdo) e guarda no cache."""
+        _marcar_provisorio(tarefa)
+        chaves = self._reservar_melhorias(prompt, [conteudo])
+        if chaves:
+            self._melhorar_em_fundo(tarefa, chaves, lambda: cache_ia.chamar(
+                MODELO_PRO, prompt, conteudo, lambda: gerar(MODELO_PRO)))
+
+    def _agendar_melhoria_lote(self, tarefa, prompt, conteudos, indices, gerar_lote):
+        """Como _agendar_melhoria, mas os conteudos[i] vão juntos num único pedido ao Pro."""
+        for _ in indices:
+            _marcar_provisorio(tarefa)
+        chaves = self._reservar_melhorias(prompt, [conteudos[i] for i in indices])
+        livres = [i for i in indices if gerar_chave(MODELO_PRO, prompt, conteudos[i]) in chaves]
+        if not livres:
+            return
+
+        def _gerar_lote_pro(posicoes):
+            return gerar_lote(MODELO_PRO, [livres[p] for p in posicoes])
+        self._melhorar_em_fundo(tarefa, chaves, lambda: cache_ia.chamar_varios(
+            MODELO_PRO, prompt, [conteudos[i] for i in livres], _gerar_lote_pro))
+
+    def _reservar_melhorias(self, prompt, conteudos):
+        """Chaves do Pro destes conteúdos que ainda não têm melhoria na fila (e passam a ter)."""
+        chaves = {gerar_chave(MODELO_PRO, prompt, conteudo) for conteudo in conteudos}
+        with self._lock:
+            chaves -= self._pendentes
+            self._pendentes |= chaves
+        return chaves
+
+    def _melhorar_em_fundo(self, tarefa, chaves, funcao):
+        def _melhorar():
+            try:
+                with prioridade(PRIORIDADE_FUNDO):
+                    funcao()
+                logger.info("Melhoria em segundo plano: %d '%s' gerados com o Pro e guardados no cache.",
+                            len(chaves), tarefa)
+            except Exception as e:
+                logger.warning("Melhoria em segundo plano de '%s' falhou: %s", tarefa, e)
+            finally:
+                with self._lock:
+                    self._pendentes -= chaves
+
+        try:
+            self._executor.submit(_melhorar)
+        except RuntimeError:
+            # Servidor desligando: a melhoria fica para a próxima visita
+            with self._lock:
+                self._pendentes -= chaves
+
+    def encerrar(self):
+        """Descarta as melhorias que ainda não começaram (as em andamento terminam)."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Instância única do processo
+roteador_ia = RoteadorIA()
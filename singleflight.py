@@ -0,0 +1,106 @@
+import os
+import threading
+from dotenv import load_dotenv
+from metricas import CHAMADAS_COMPARTILHADAS, span
+from prazo import PrazoEsgotado, limitar_ao_prazo
+
+load_dotenv()
+
+# Configuração pelo .env
+# Quanto cada requisição espera, no máximo, por uma chamada de IA iniciada por outra
+IA_SINGLEFLIGHT_ESPERA = float(os.getenv("IA_SINGLEFLIGHT_ESPERA", "120"))
+
+
+class EsperaEsgotada(TimeoutError):
+    """A chamada compartilhada não terminou dentro do tempo de espera de quem aguardava."""
+
+
+class _Chamada:
+    def __init__(self):
+        self.concluida = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class GrupoSingleFlight:
+    """
+    Junta chamadas simultâneas com a mesma chave numa só: a primeira thread
+    (a "líder") executa e as que chegam enquanto ela está em andamento esperam e
+    recebem o mesmo resultado (ou a mesma exceção). Depois que a líder termina,
+    a chave sai do grupo: a próxima chamada executa de novo (o cache fica com quem chama).
+    Cada thread que espera tem o próprio timeout (nunca além do prazo da
+    requisição, ver prazo.py); desistir não cancela a líder. O prazo da líder
+    também é só dela: se ela desistir com PrazoEsgotado, quem esperava tenta de
+    novo (e pode virar a líder, sob o próprio prazo) em vez de herdar o erro.
+    """
+
+    def __init__(self, espera=IA_SINGLEFLIGHT_ESPERA):
+        self.espera = espera
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+
+    def executar(self, chave, funcao, timeout=None):
+        """Executa funcao() uma vez por chave em andamento e retorna o resultado."""
+        return self.executar_varios([chave], lambda _: [funcao()], timeout)[0]
+
+    def executar_varios(self, chaves, funcao, timeout=None):
+        """
+        Versão em lote: funcao(chaves_livres) recebe só as chaves que ninguém está
+        executando e retorna a lista de resultados na mesma ordem. As demais são
+        esperadas. Retorna os resultados na ordem de 'chaves'.
+        Lança EsperaEsgotada se alguma espera passar de 'timeout' (padrão: IA_SINGLEFLIGHT_ESPERA),
+        ou PrazoEsgotado se o prazo da requisição acabar antes.
+        """
+        livres, ocupadas = [], {}
+        with self._lock:
+            for chave in dict.fromkeys(chaves):
+                chamada = self._em_andamento.get(chave)
+                if chamada is None:
+                    chamada = self._em_andamento[chave] = _Chamada()
+                    livres.append((chave, chamada))
+                else:
+                    ocupadas[chave] = chamada
+
+        resultados = {}
+        if livres:
+            try:
+                valores = funcao([chave for chave, _ in livres])
+                if len(valores) != len(livres):
+                    raise ValueError(f"Esperava {len(livres)} resultados, recebi {len(valores)}")
+                for (chave, chamada), valor in zip(livres, valores):
+                    chamada.resultado = resultados[chave] = valor
+            except BaseException as e:
+                for _, chamada in livres:
+                    chamada.erro = e
+                raise
+            finally:
+                with self._lock:
+                    for chave, _ in livres:
+                        del self._em_andamento[chave]
+                for _, chamada in livres:
+                    chamada.concluida.set()
+
+        repetir = []
+        for chave, chamada in ocupadas.items():
+            self._esperar(chamada, timeout)
+            if isinstance(chamada.erro, PrazoEsgotado):
+                repetir.append(chave)
+            elif chamada.erro is not None:
+                raise chamada.erro
+            else:
+                resultados[chave] = chamada.resultado
+        if repetir:
+            resultados.update(zip(repetir, self.executar_varios(repetir, funcao, timeout)))
+        return [resultados[chave] for chave in chaves]
+
+    def _esperar(self, chamada, timeout):
+        """Espera a líder terminar; o resultado (ou o erro) fica na própria chamada."""
+        CHAMADAS_COMPARTILHADAS.incrementar()
+        espera = self.espera if timeout is None else timeout
+        timeout = limitar_ao_prazo(espera)
+        with span("espera_singleflight"):
+            if not chamada.concluida.wait(timeout):
+                if timeout < espera:
+                    # Quem cortou a espera foi o prazo da requisição: a tarefa fica adiada
+                    raise PrazoEsgotado(f"Chamada compartilhada não terminou dentro do prazo ({timeout:.2f}s)")
+                raise EsperaEsgotada(f"Chamada compartilhada não terminou em {timeout:g}s")
@@ -0,0 +1,229 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from midia import MIDIA_MAX_BYTES_VIDEO, buscador_midia
+from modelos import obter_genai
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuração pelo .env
+# Vídeos até este tamanho ficam só na memória; acima disso vão para um arquivo temporário único
+VIDEO_SPOOL_MAX_BYTES = int(os.getenv("VIDEO_SPOOL_MAX_BYTES", str(32 * 1024 * 1024)))
+# Espera pelo processamento do arquivo na IA: intervalo inicial, máximo e tempo total
+VIDEO_ESPERA_INICIAL = float(os.getenv("VIDEO_ESPERA_INICIAL", "1"))
+VIDEO_ESPERA_MAXIMA = float(os.getenv("VIDEO_ESPERA_MAXIMA", "16"))
+VIDEO_TIMEOUT_PROCESSAMENTO = float(os.getenv("VIDEO_TIMEOUT_PROCESSAMENTO", "600"))
+# Arquivos remotos sem uso há mais de VIDEO_TTL_REMOTO segundos são apagados
+# pela coleta, que roda a cada VIDEO_COLETA_INTERVALO segundos
+VIDEO_TTL_REMOTO = float(os.getenv("VIDEO_TTL_REMOTO", "1800"))
+VIDEO_COLETA_INTERVALO = float(os.getenv("VIDEO_COLETA_INTERVALO", "300"))
+
+
+class _ArquivoComHash:
+    """Repassa as escritas para o arquivo e calcula o SHA-256 no caminho."""
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.sha256 = hashlib.sha256()
+
+    def write(self, bloco):
+        self.sha256.update(bloco)
+        return self.arquivo.write(bloco)
+
+
+class _ArquivoRemoto:
+    def __init__(self, nome):
+        self.nome = nome
+        self.em_uso = 0
+        self.ultimo_uso = time.time()
+
+
+class GerenciadorVideos:
+    """
+    Envia vídeos para a IA uma única vez e reaproveita o arquivo remoto.
+    - O download vai para um SpooledTemporaryFile (memória, ou arquivo temporário
+      único quando passa de VIDEO_SPOOL_MAX_BYTES): nada de nomes fixos no diretório atual.
+    - O arquivo remoto é identificado pelo SHA-256 do conteúdo, então transcrição
+      e audiodescrição do mesmo vídeo (ou a mesma mídia em URLs diferentes) usam um único upload.
+    - A espera pelo processamento usa recuo exponencial.
+    - Os arquivos remotos são apagados por uma coleta periódica, não a cada chamada.
+    """
+
+    def __init__(self, ttl=VIDEO_TTL_REMOTO, intervalo_coleta=VIDEO_COLETA_INTERVALO):
+        self.ttl = ttl
+        self.intervalo_coleta = intervalo_coleta
+        self._lock = threading.Lock()
+        self._locks = {}  # chave -> [lock, quantos usam]; sai do dict quando ninguém mais usa
+        self._por_hash = {}
+        self._hash_por_url = {}
+        self._coleta = None
+
+    @contextmanager
+    def _lock_de(self, chave):
+        """Exclusão mútua por chave (URL ou hash). O lock é descartado quando ninguém mais o usa."""
+        with self._lock:
+            entrada = self._locks.setdefault(chave, [threading.Lock(), 0])
+            entrada[1] += 1
+        try:
+            with entrada[0]:
+                yield
+        finally:
+            with self._lock:
+                entrada[1] -= 1
+                if entrada[1] == 0:
+                    del self._locks[chave]
+
+    def _reservar(self, hash_video):
+        """Marca o arquivo remoto como em uso (a coleta não o apaga). Retorna o nome ou None."""
+        with self._lock:
+            remoto = self._por_hash.get(hash_video)
+            if remoto is None:
+                return None
+            remoto.em_uso += 1
+            remoto.ultimo_uso = time.time()
+            return remoto.nome
+
+    def _arquivo_reservado(self, hash_video):
+        """Reserva e busca o arquivo remoto já enviado. Se ele sumiu do servidor, esquece o registro."""
+        nome = self._reservar(hash_video)
+        if nome is None:
+            return None
+        try:
+            return obter_genai().get_file(nome)
+        except Exception as e:
+            logger.warning("Arquivo remoto %s não está mais disponível (%s). Enviando de novo.", nome, e)
+            with self._lock:
+                self._por_hash.pop(hash_video, None)
+            return None
+
+    def liberar(self, nome):
+        with self._lock:
+            for remoto in self._por_hash.values():
+                if remoto.nome == nome:
+                    remoto.em_uso = max(0, remoto.em_uso - 1)
+                    remoto.ultimo_uso = time.time()
+
+    def obter_arquivo(self, video_url):
+        """
+        Retorna o arquivo da IA (estado ACTIVE) com o vídeo da URL, enviando-o se preciso.
+        O arquivo fica reservado: chame liberar(arquivo.name) depois de usá-lo.
+        """
+        # Um download por URL de cada vez: a segunda tarefa do mesmo vídeo espera e reaproveita
+        with self._lock_de(("url", video_url)):
+            with self._lock:
+                hash_video = self._hash_por_url.get(video_url)
+            video_file = self._arquivo_reservado(hash_video) if hash_video else None
+            if video_file is not None:
+                logger.info("Reaproveitando o vídeo já enviado: %s", video_file.name)
+                return video_file
+
+            with tempfile.SpooledTemporaryFile(max_size=VIDEO_SPOOL_MAX_BYTES) as arquivo:
+                logger.info("Baixando vídeo: %s ...", video_url)
+                destino = _ArquivoComHash(arquivo)
+                mime_type = buscador_midia.baixar_para_arquivo(video_url, destino, MIDIA_MAX_BYTES_VIDEO)
+                hash_video = destino.sha256.hexdigest()
+                with self._lock:
+                    self._hash_por_url[video_url] = hash_video
+                logger.info("Download concluído.")
+                return self._enviar(arquivo, mime_type, hash_video)
+
+    def _enviar(self, arquivo, mime_type, hash_video):
+        """Envia o conteúdo e espera o processamento, a menos que o mesmo conteúdo já esteja na IA."""
+        # Um upload por conteúdo de cada vez: URLs diferentes com o mesmo vídeo dividem o arquivo
+        with self._lock_de(("hash", hash_video)):
+            video_file = self._arquivo_reservado(hash_video)
+            if video_file is not None:
+                logger.info("Mesmo conteúdo já enviado: %s", video_file.name)
+                return video_file
+
+            if not mime_type.startswith("video/"):
+                mime_type = "video/mp4"
+            arquivo.seek(0)
+            logger.info("Enviando vídeo para a IA...")
+            video_file = obter_genai().upload_file(path=arquivo, mime_type=mime_type,
+                                           display_name=f"video-{hash_video[:16]}")
+            try:
+                video_file = self._aguardar_processamento(video_file)
+            except Exception:
+                _apagar_remoto(video_file.name)
+                raise
+
+            with self._lock:
+                remoto = _ArquivoRemoto(video_file.name)
+                remoto.em_uso = 1
+                self._por_hash[hash_video] = remoto
+        self._iniciar_coleta()
+        return video_file
+
+    def _aguardar_processamento(self, video_file):
+        """Espera o arquivo sair de PROCESSING com recuo exponencial (1s, 2s, 4s... até o máximo)."""
+        logger.info("Upload iniciado. ID: %s. Aguardando processamento...", video_file.name)
+        espera = VIDEO_ESPERA_INICIAL
+        limite = time.monotonic() + VIDEO_TIMEOUT_PROCESSAMENTO
+        while video_file.state.name == "PROCESSING":
+            if time.monotonic() + espera > limite:
+                raise TimeoutError(f"Vídeo {video_file.name} não ficou pronto em {VIDEO_TIMEOUT_PROCESSAMENTO:.0f}s")
+            logger.info("Vídeo ainda está processando... aguardando %.0f segundos.", espera)
+            time.sleep(espera)
+            espera = min(espera * 2, VIDEO_ESPERA_MAXIMA)
+            video_file = obter_genai().get_file(video_file.name)
+
+        if video_file.state.name != "ACTIVE":
+            raise Exception(f"Processamento do arquivo falhou no servidor. Estado: {video_file.state.name}")
+        return video_file
+
+    def coletar(self, agora=None):
+        """
+        Apaga da IA os arquivos sem uso há mais de 'ttl' segundos e esquece as
+        URLs que apontavam para arquivos que não existem mais. Retorna quantos apagou.
+        """
+        agora = agora if agora is not None else time.time()
+        with self._lock:
+            vencidos = [(hash_video, remoto) for hash_video, remoto in self._por_hash.items()
+                        if remoto.em_uso == 0 and agora - remoto.ultimo_uso > self.ttl]
+            for hash_video, _ in vencidos:
+                del self._por_hash[hash_video]
+            self._hash_por_url = {url: hash_video for url, hash_video in self._hash_por_url.items()
+                                  if hash_video in self._por_hash}
+        for _, remoto in vencidos:
+            _apagar_remoto(remoto.nome)
+        if vencidos:
+            logger.info("Coleta de vídeos: %s arquivos remotos apagados.", len(vencidos))
+        return len(vencidos)
+
+    def _iniciar_coleta(self):
+        with self._lock:
+            if self._coleta is not None:
+                return
+            self._coleta = threading.Thread(target=self._laco_coleta, name="coleta-videos", daemon=True)
+        self._coleta.start()
+
+    def _laco_coleta(self):
+        while True:
+            time.sleep(self.intervalo_coleta)
+            try:
+                self.coletar()
+            except Exception as e:
+                logger.warning("Coleta de vídeos falhou: %s", e)
+
+    def encerrar(self):
+        """Apaga todos os arquivos remotos que não estão em uso (ex: ao desligar o servidor)."""
+        return self.coletar(agora=float("inf"))
+
+
+def _apagar_remoto(nome):
+    try:
+        obter_genai().delete_file(nome)
+    except Exception as e:
+        logger.warning("Não foi possível apagar o arquivo remoto %s: %s", nome, e)
+
+
+# Instância única do processo: todas as tarefas de vídeo dividem os uploads
+gerenciador_videos = GerenciadorVideos()
@@ -0,0 +1,6 @@
+# Ponto de entrada WSGI para produção:
+#   gunicorn wsgi:app
+# As opções (workers, threads, timeouts) ficam em gunicorn.conf.py.
+from app import app
+
+application = app